@@ -1,45 +1,267 @@
 """
-Эндпоинты API: /calculate и /pdf
-- /calculate возвращает детализированный CalcResponse (positions + total)
-- /pdf формирует коммерческое предложение в фирменном стиле
+Эндпоинты API: /calculate, /pdf и /products/search
+- /calculate возвращает детализированный CalcResponse (positions + total; с price_by_sheets — и waste)
+- /calculate/delta — инкрементальный пересчёт изменённых изделий (живой итог в форме менеджера, без price_by_sheets)
+- /nesting — раскрой изделий на листы (core.nesting): листы, выход годного, отход, схема раскроя
+- /pdf формирует коммерческое предложение в фирменном стиле (идемпотентно с заголовком Idempotency-Key)
+- /products/search — поиск товаров по каталогу для формы менеджера (top-N)
+- /delivery/zone — зона доставки и её цена по координатам точки (core.delivery_zones)
+- /prices/snapshots — сохранённые снимки цен (для пересчёта: /calculate?price_snapshot_id=...)
+- /metrics/pdf — очередь генерации PDF (core.render_queue): глубина, ожидание, отказы
+- /admin/data/version, /admin/data/publish — версия данных каталога и публикация новой (core.data_version)
 Ошибки и успешные расчёты логируются.
 """
-from fastapi import APIRouter, HTTPException
+import hmac
+import json
 
-from app.core.schemas import CalcRequest
-from app.core.calculator import calc, response_to_pdf_data
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, Response
+
+from app.core.schemas import (
+    CalcRequest,
+    CalcResponse,
+    CalcDeltaRequest,
+    CalcDeltaResponse,
+    ProductSearchResponse,
+    ProductInfo,
+)
+from app.core.calculator import calc, calc_delta, calc_records, load_products, response_to_pdf_data
+from app.config import settings
+from app.core import data_version, fastjson, idempotency, prices
+from app.core.catalog import get_catalog_index
+from app.core.delivery_zones import resolve_zone
+from app.core.numbering import next_proposal_number_async
 from app.core.pdf_generator import generate_pdf
+from app.core.render_queue import QueueRejected, client_key, pdf_queue
+from app.core.nesting import nest_items
+from app.core.validators import RequestValidationError, validate_request
+from app.db import AsyncSessionLocal
 from app.logging_config import get_logger
 
 router = APIRouter(tags=["Calculator"])
 logger = get_logger(__name__)
 
 
-@router.post("/calculate")
-async def api_calculate(request: CalcRequest):
-    """Возвращает JSON расчёта без PDF"""
+def _invalid_items(e: RequestValidationError) -> JSONResponse:
+    """400 со всеми ошибками изделий: detail — текстом, errors — [{item_index, field, code, message}]."""
+    return JSONResponse(status_code=400, content={"detail": str(e), "errors": e.as_dicts()})
+
+
+@router.post("/calculate", response_model=CalcResponse)
+async def api_calculate(request: CalcRequest, price_snapshot_id: str | None = None):
+    """
+    Возвращает JSON расчёта без PDF. price_snapshot_id — пересчёт по сохранённому снимку цен.
+    Ответ сериализуется напрямую из лёгких записей (core.fastjson), без повторной валидации CalcResponse.
+    С price_by_sheets расчёт (раскрой на листы) выполняется в пуле потоков, не занимая цикл событий.
+    """
+    snapshot = None
+    if price_snapshot_id:
+        async with AsyncSessionLocal() as db:
+            snapshot = await prices.get_snapshot_async(db, price_snapshot_id)
+        if snapshot is None:
+            raise HTTPException(status_code=404, detail=f"Unknown price snapshot: {price_snapshot_id}")
     try:
-        result = calc(request)
+        if request.price_by_sheets:
+            result = await run_in_threadpool(calc_records, request, snapshot)
+        else:
+            result = calc_records(request, snapshot)
         logger.info("api_calculate | success | total=%.2f | items_count=%s", result.total, len(request.items))
-        return result
+        return Response(content=fastjson.calc_result_json(result), media_type="application/json")
+    except RequestValidationError as e:
+        return _invalid_items(e)
     except Exception as e:
         logger.error("api_calculate | error | %s", str(e), exc_info=True)
         raise HTTPException(status_code=400, detail=str(e))
 
 
+@router.post("/calculate/delta", response_model=CalcDeltaResponse)
+async def api_calculate_delta(request: CalcDeltaRequest):
+    """
+    Пересчёт только изменённых изделий: итоги остальных берутся из запроса, заново — доставка и округление.
+    409 — итоги посчитаны по другому снимку цен (цены обновились): клиент пересчитывает все изделия.
+    Цены по листам (price_by_sheets) здесь нет — только в /calculate и /pdf.
+    """
+    snapshot = prices.current_snapshot()
+    if request.price_snapshot_id and request.price_snapshot_id != snapshot.id:
+        logger.info("api_calculate_delta | stale_snapshot | got=%s | current=%s", request.price_snapshot_id, snapshot.id)
+        raise HTTPException(status_code=409, detail="Price snapshot changed, recalculate all items")
+    try:
+        result = calc_delta(request, snapshot)
+        return Response(content=fastjson.dumps(result.model_dump()), media_type="application/json")
+    except RequestValidationError as e:
+        return _invalid_items(e)
+    except Exception as e:
+        logger.error("api_calculate_delta | error | %s", str(e), exc_info=True)
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.post("/nesting")
+async def api_nesting(
+    request: CalcRequest,
+    layout: bool = False,
+    time_budget_ms: int | None = Query(None, ge=1, le=5000),
+):
+    """
+    Раскрой изделий КП на стандартные листы по товарам: листы, нижняя граница, выход годного (%), отход (м²).
+    layout=true — координаты деталей на листах. Раскрой выполняется в пуле потоков, в пределах бюджета времени.
+    """
+    products = load_products()
+    try:
+        validate_request(enumerate(request.items), products, prices.current_snapshot(), settings.NESTING_MAX_PIECES)
+    except RequestValidationError as e:
+        return _invalid_items(e)
+    results = await run_in_threadpool(nest_items, request.items, products, time_budget_ms)
+    report = []
+    for r in results:
+        entry = {
+            "product_key": r.product_key,
+            "sheet_width_mm": r.sheet.width,
+            "sheet_height_mm": r.sheet.height,
+            "sheets": r.sheets,
+            "lower_bound": r.lower_bound,
+            "pieces": r.pieces,
+            "used_m2": r.used_m2,
+            "sheets_m2": r.sheets_m2,
+            "waste_m2": r.waste_m2,
+            "yield_pct": r.yield_pct,
+            "unplaced": [p._asdict() for p in r.unplaced],
+            "strategy": r.strategy,
+            "strategies_tried": r.strategies_tried,
+            "elapsed_ms": r.elapsed_ms,
+        }
+        if layout:
+            entry["placements"] = [p._asdict() for p in r.placements]
+        report.append(entry)
+    return Response(content=fastjson.dumps({"products": report}), media_type="application/json")
+
+
 @router.post("/pdf")
-async def api_pdf(request: CalcRequest):
-    """Генерация PDF: расчёт + преобразование в items/deliveries и вызов generate_pdf."""
+async def api_pdf(request: CalcRequest, http_request: Request):
+    """
+    Генерация PDF: расчёт + преобразование в items/deliveries и вызов generate_pdf.
+    Рендеринг идёт через ограниченную очередь: при перегрузке — 429/503 с Retry-After.
+    С заголовком Idempotency-Key повтор того же запроса возвращает уже созданный PDF (core.idempotency).
+    """
     try:
-        result = calc(request)
-        data = response_to_pdf_data(result)
-        pdf_path = generate_pdf(
+        key = idempotency.normalize_key(http_request.headers.get("Idempotency-Key"))
+        if key:
+            digest = idempotency.fingerprint(json.dumps(request.model_dump(), sort_keys=True))
+            previous = await idempotency.acquire(key, "api_pdf", digest)
+            if previous is not None:
+                return previous
+    except idempotency.IdempotencyConflict as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+    try:
+        result = await run_in_threadpool(calc, request) if request.price_by_sheets else calc(request)
+        data = response_to_pdf_data(result, request)
+        proposal_number = await next_proposal_number_async()
+        pdf_path = await pdf_queue.run(
+            client_key(http_request),
+            generate_pdf,
             items=data["items"],
             deliveries=data["deliveries"],
+            waste=data["waste"],
             total=data["total"],
+            proposal_number=proposal_number,
         )
         logger.info("api_pdf | success | total=%.2f | file=%s", result.total, str(pdf_path))
-        return {"status": "ok", "file": str(pdf_path)}
+        response = {"status": "ok", "file": str(pdf_path), "proposal_number": proposal_number}
+        if key:
+            await idempotency.complete(key, response)
+        return response
+    except RequestValidationError as e:
+        if key:
+            await idempotency.release(key)
+        return _invalid_items(e)
+    except QueueRejected as e:
+        if key:
+            await idempotency.release(key)
+        return JSONResponse(
+            status_code=e.status_code,
+            content={"detail": f"PDF queue is busy ({e.reason}), retry later"},
+            headers={"Retry-After": str(e.retry_after)},
+        )
     except Exception as e:
+        if key:
+            await idempotency.release(key)
         logger.error("api_pdf | error | %s", str(e), exc_info=True)
-        raise HTTPException(status_code=400, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=400, detail=str(e))
+    except BaseException:
+        # Отмена (клиент отключился) — ключ освобождается сразу, повтор не ждёт IDEMPOTENCY_WAIT_S
+        if key:
+            await idempotency.release(key)
+        raise
+
+
+@router.get("/products/search", response_model=ProductSearchResponse)
+async def api_products_search(
+    q: str = Query("", max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    family: str | None = None,
+):
+    """Поиск товаров по префиксам слов (название, ключ, толщина, семейство), ранжированный top-N."""
+    entries, matched = get_catalog_index().search(q, limit=limit, family=family)
+    return ProductSearchResponse(
+        items=[ProductInfo(**e._asdict()) for e in entries],
+        total=matched,
+    )
+
+
+@router.get("/delivery/zone")
+async def api_delivery_zone(lat: float = Query(..., ge=-90, le=90), lon: float = Query(..., ge=-180, le=180)):
+    """Зона доставки для точки и цена доставки по текущему прайсу; 404 — точка вне зон (или зоны не заданы)."""
+    zone = resolve_zone(lat, lon)
+    if zone is None:
+        raise HTTPException(status_code=404, detail="Точка доставки вне зон доставки")
+    return {"zone": zone, "price": prices.current_snapshot().services["delivery"].get(zone)}
+
+
+@router.get("/prices/snapshots")
+async def api_price_snapshots(limit: int = Query(50, ge=1, le=500)):
+    """Список сохранённых снимков цен (новые первыми) и id текущего."""
+    async with AsyncSessionLocal() as db:
+        records = await db.run_sync(prices.list_snapshots, limit)
+    return {
+        "current": prices.current_snapshot().id,
+        "snapshots": [{"id": r.id, "created_at": r.created_at.isoformat()} for r in records],
+    }
+
+
+@router.get("/metrics/pdf")
+async def api_metrics_pdf():
+    """Метрики очереди генерации PDF: выполняется/ждёт, отказы, ожидание и время рендеринга (p50/p95/max, мс)."""
+    return pdf_queue.metrics()
+
+
+def _require_admin(http_request: Request) -> None:
+    """Админ-эндпоинты доступны только при заданном ADMIN_TOKEN и с верным заголовком X-Admin-Token."""
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    given = http_request.headers.get("X-Admin-Token", "").encode("utf-8")
+    if not hmac.compare_digest(given, settings.ADMIN_TOKEN.encode("utf-8")):
+        logger.warning("admin | forbidden | client=%s", client_key(http_request))
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+
+@router.get("/admin/data/version")
+async def api_admin_data_version(http_request: Request):
+    """Версия данных, которую видит этот воркер."""
+    _require_admin(http_request)
+    return {"version": data_version.current()}
+
+
+@router.post("/admin/data/publish")
+async def api_admin_data_publish(http_request: Request):
+    """
+    Проверка и публикация данных из DATA_STAGING_DIR: все воркеры переходят на новую версию
+    в течение DATA_VERSION_CHECK_S. 422 — данные не прошли проверку, текущая версия не изменилась.
+    """
+    _require_admin(http_request)
+    try:
+        version, warnings = await run_in_threadpool(data_version.publish, settings.DATA_STAGING_DIR)
+    except data_version.PublishError as e:
+        return JSONResponse(status_code=422, content={"detail": "Data validation failed", "errors": e.errors})
+    logger.info("admin | data_published | version=%s | warnings=%s", version, len(warnings))
+    return {"version": version, "warnings": warnings}
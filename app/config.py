@@ -5,7 +5,7 @@
 
 import json
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, List, Optional
 from pydantic_settings import BaseSettings
 
 
@@ -29,6 +29,10 @@ class Settings(BaseSettings):
     LOGO_DIR: Path = _APP_DIR / "assets" / "logo"
     WORKS_DIR: Path = _APP_DIR / "assets" / "works"
 
+    # Шаблоны: кэш байткода Jinja2 (общий для воркеров; None — без кэша) и проверка изменений файлов
+    TEMPLATES_CACHE_DIR: Optional[Path] = _PROJECT_ROOT / "cache" / "templates"
+    TEMPLATES_AUTO_RELOAD: bool = False     # True — для разработки: правки шаблонов без перезапуска
+
     # Ограничения размеров стекла (мм)
     MAX_HEIGHT_MM: int = 1605
     MAX_WIDTH_MM: int = 2750
@@ -36,6 +40,37 @@ class Settings(BaseSettings):
     # Минимальная сумма по позиции (руб)
     MIN_OPTION_PRICE: int = 100
 
+    # Хранилище PDF: через сколько дней файлы уходят в сжатые архивные бандлы
+    PDF_RETENTION_DAYS: int = 365
+
+    # Генерация PDF: потоков рендеринга на воркер, длина очереди ожидающих, запросов на клиента, ожидание в очереди
+    PDF_RENDER_CONCURRENCY: int = 2
+    PDF_QUEUE_MAX: int = 8
+    PDF_PER_CLIENT_LIMIT: int = 2
+    PDF_QUEUE_TIMEOUT_S: float = 30.0
+
+    # Номера КП выдаются блоками: один запрос к БД на столько номеров (неиспользованные при перезапуске пропадают)
+    PROPOSAL_NUMBER_BLOCK: int = 50
+    # Ключи идемпотентности создания КП: сколько хранить и сколько ждать, пока повтор дожидается первого запроса
+    IDEMPOTENCY_TTL_HOURS: int = 24
+    IDEMPOTENCY_WAIT_S: float = 60.0
+
+    # Раскрой на листы (core.nesting): бюджет времени на перебор стратегий раскроя одного КП (отчёт /api/nesting)
+    NESTING_TIME_BUDGET_MS: int = 150
+    # Деталей (изделия × количество) в одном КП для раскроя и цены по листам
+    NESTING_MAX_PIECES: int = 1000
+
+    # Данные каталога (data/): как часто воркер проверяет штамп версии (core.data_version), откуда публиковать
+    DATA_VERSION_CHECK_S: float = 1.0
+    DATA_STAGING_DIR: Path = _PROJECT_ROOT / "data" / "staging"
+    # Токен для /api/admin/* (заголовок X-Admin-Token); None — админ-эндпоинты отключены
+    ADMIN_TOKEN: Optional[str] = None
+
+    # Живой расчёт в форме менеджера (WebSocket /manager/live)
+    LIVE_DEBOUNCE_MS: int = 150     # пауза в правках, после которой запускается пересчёт
+    LIVE_MAX_WAIT_MS: int = 1000    # при непрерывном вводе пересчёт не реже, чем раз в столько мс
+    LIVE_MAX_ITEMS: int = 200       # изделий в одном КП
+
     class Config:
         env_file = ".env"
 
@@ -43,8 +78,22 @@ class Settings(BaseSettings):
 settings = Settings()
 
 
+# Кэши текстов и реквизитов (core.data_version.VersionedCache): создаются при первом обращении,
+# так как core.data_version сам импортирует config
+_texts_cache = None
+_company_info_cache = None
+
+
 def get_texts() -> dict:
-    """Загружает тексты из data/texts.json (ошибки, подписи позиций)."""
+    """Тексты из data/texts.json (ошибки, подписи позиций); файл перечитывается при смене версии данных."""
+    global _texts_cache
+    if _texts_cache is None:
+        from app.core.data_version import VersionedCache
+        _texts_cache = VersionedCache("texts", _read_texts)
+    return _texts_cache.get()
+
+
+def _read_texts() -> dict:
     path = settings.DATA_DIR / "texts.json"
     if not path.exists():
         return _default_texts()
@@ -63,6 +112,10 @@ def _default_texts() -> dict:
             "unknown_product": "Ошибка: неизвестный товар {product_key}",
             "no_material_price": "Ошибка: нет цены для {product_key}",
             "no_drill_price": "Ошибка: нет цены сверления для толщины {thickness} мм",
+            "delivery_point": "Ошибка: для точки доставки нужны широта и долгота",
+            "delivery_out_of_zone": "Ошибка: точка доставки вне зон доставки",
+            "no_delivery_price": "Ошибка: нет цены доставки для зоны {zone}",
+            "nesting_pieces_max": "Ошибка: для раскроя на листы не больше {max_pieces} деталей в КП",
         },
         "positions": {
             "edge": "Обработка кромки",
@@ -72,13 +125,22 @@ def _default_texts() -> dict:
             "mount": "Монтаж (ориентировочно)",
             "total_per_item": "Итого по изделию",
             "delivery": "Доставка ({city})",
+            "sheet_waste": "Отход при раскрое: {label} {thickness} мм, листов {sheets}",
         },
-        "units": {"piece": "шт"},
+        "units": {"piece": "шт", "m2": "м²"},
     }
 
 
 def get_company_info() -> Dict[str, str]:
-    """Реквизиты компании: из data/company_info.json или дефолт из кода."""
+    """Реквизиты компании: из data/company_info.json или дефолт из кода; кэшируются до смены версии данных."""
+    global _company_info_cache
+    if _company_info_cache is None:
+        from app.core.data_version import VersionedCache
+        _company_info_cache = VersionedCache("company_info", _read_company_info)
+    return _company_info_cache.get()
+
+
+def _read_company_info() -> Dict[str, str]:
     path = settings.DATA_DIR / "company_info.json"
     if path.exists():
         try:
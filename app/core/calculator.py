@@ -1,19 +1,30 @@
 """
 Расчёт стоимости изделий из стекла/зеркал: загрузка данных, calc(), response_to_pdf_data().
-Валидация — core.validators, тексты — config.get_texts(). Расчёты логируются.
+Валидация всего запроса до расчёта — core.validators, тексты — config.get_texts(), цены — снимки core.prices.
+Расчёты логируются.
 """
 
 import json
 import math
+from collections.abc import Mapping
 
 from app.config import settings, get_texts
-from app.core.schemas import CalcRequest, CalcResponse, CalcPosition
-from app.core.validators import (
-    validate_dimensions,
-    validate_product_key,
-    validate_material_price,
-    validate_drill_price,
+from app.core.catalog_bin import BinaryCatalog, parse_products_txt
+from app.core.data_version import VersionedCache
+from app.core.delivery_zones import delivery_key
+from app.core.nesting import PRICING_STRATEGIES, NestingResult, nest_items
+from app.core.prices import PriceSnapshot, current_snapshot
+from app.core.schemas import (
+    CalcDeltaRequest,
+    CalcDeltaResponse,
+    CalcItemFull,
+    CalcPosition,
+    CalcRequest,
+    CalcResponse,
+    CalcResult,
+    Position,
 )
+from app.core.validators import validate_request
 from app.logging_config import get_logger
 
 logger = get_logger(__name__)
@@ -43,18 +54,51 @@ def round_to_100_up(x: float) -> float:
     return math.ceil(x / 100) * 100
 
 
-def load_products() -> dict:
-    path = settings.DATA_DIR / "products.txt"
-    products = {}
-    with open(path, encoding="utf-8") as f:
-        for line in f:
-            line = line.strip()
-            if not line or line.startswith("#"):
-                continue
-            parts = line.split(";")[:3]
-            name, thickness, key = parts[0], float(parts[1]), parts[2]
-            products[key] = {"label": name, "thickness": thickness}
-    return products
+_CATALOG_SOURCES = ("products.txt", "prices_materials.json", "prices_services.json")
+
+
+def _open_binary_catalog() -> BinaryCatalog | None:
+    path = settings.DATA_DIR / "catalog.bin"
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return None
+    for name in _CATALOG_SOURCES:
+        src = settings.DATA_DIR / name
+        if src.exists() and src.stat().st_mtime_ns > st.st_mtime_ns:
+            logger.warning("catalog_bin_stale | source=%s | используются исходные файлы", name)
+            return None
+    try:
+        catalog = BinaryCatalog(path)
+    except (OSError, ValueError) as e:
+        logger.warning("catalog_bin_invalid | %s", str(e))
+        return None
+    logger.info("catalog_bin_loaded | version=%s | products=%s", catalog.version, len(catalog))
+    return catalog
+
+
+def _read_products() -> Mapping:
+    catalog = get_binary_catalog()
+    if catalog is not None:
+        return catalog
+    return parse_products_txt(settings.DATA_DIR / "products.txt")
+
+
+_binary_catalog: VersionedCache[BinaryCatalog | None] = VersionedCache("catalog_bin", _open_binary_catalog)
+_products: VersionedCache[Mapping] = VersionedCache("products", _read_products)
+
+
+def get_binary_catalog() -> BinaryCatalog | None:
+    """
+    Скомпилированный каталог data/catalog.bin (scripts/compile_catalog.py), если он есть и не старше исходников.
+    Открывается через mmap один раз на версию данных (core.data_version).
+    """
+    return _binary_catalog.get()
+
+
+def load_products() -> Mapping:
+    """Товары: catalog.bin или разобранный products.txt; кэшируются до смены версии данных."""
+    return _products.get()
 
 
 def load_json(name: str) -> dict:
@@ -62,142 +106,188 @@ def load_json(name: str) -> dict:
         return json.load(f)
 
 
-def calc(request: CalcRequest) -> CalcResponse:
-    products = load_products()
-    mat_prices = load_json("prices_materials.json")
-    srv_prices = load_json("prices_services.json")
-    unit = _unit()
-    min_price = settings.MIN_OPTION_PRICE
+def load_material_prices() -> Mapping:
+    catalog = get_binary_catalog()
+    if catalog is not None:
+        return catalog.material_prices
+    return load_json("prices_materials.json")
 
-    # Лог входных данных расчёта
-    items_summary = [
-        {"product_key": i.product_key, "width_mm": i.width_mm, "height_mm": i.height_mm, "quantity": i.quantity}
-        for i in request.items
-    ]
-    logger.info("calculation_start | items_count=%s | items=%s", len(request.items), items_summary)
 
-    positions: list[CalcPosition] = []
-    grand_total = 0.0
+def load_service_prices() -> dict:
+    catalog = get_binary_catalog()
+    if catalog is not None:
+        return catalog.services()
+    return load_json("prices_services.json")
 
-    for idx, item in enumerate(request.items):
-        validate_dimensions(item.height_mm, item.width_mm)
-        validate_product_key(item.product_key, products)
-        product = products[item.product_key]
-        validate_material_price(item.product_key, mat_prices)
 
-        area = calc_area(item.width_mm, item.height_mm)
-        perimeter = calc_perimeter(item.width_mm, item.height_mm)
-        mat_price = mat_prices[item.product_key]
-        base_price_single = round_to_100_up(area * mat_price)
-        total_item = base_price_single * item.quantity
+def _position(name: str, quantity, unit: str, unit_price, total, item_index: int | None) -> Position:
+    """Позиция без валидации: числа приводятся к float, как это сделал бы CalcPosition."""
+    return Position(name, float(quantity), unit, float(unit_price), float(total), item_index)
+
 
+def _to_model(position: Position) -> CalcPosition:
+    return CalcPosition.model_construct(**position._asdict())
+
+
+def calc_item(idx: int, item: CalcItemFull, products: Mapping, prices: PriceSnapshot,
+              unit: str | None = None) -> tuple[list[Position], float]:
+    """
+    Позиции одного изделия (товар, услуги, итог по изделию) и итог по изделию, округлённый до 100.
+    Изделие должно быть заранее проверено validators.validate_request (товар, цены, размеры).
+    """
+    unit = unit or _unit()
+    product = products[item.product_key]
+    mat_prices = prices.materials
+    srv_prices = prices.services
+    min_price = settings.MIN_OPTION_PRICE
+
+    positions: list[Position] = []
+    area = calc_area(item.width_mm, item.height_mm)
+    perimeter = calc_perimeter(item.width_mm, item.height_mm)
+    mat_price = mat_prices[item.product_key]
+    base_price_single = round_to_100_up(area * mat_price)
+    total_item = base_price_single * item.quantity
+
+    positions.append(
+        _position(
+            name=f"{product['label']} ({product['thickness']} мм) [{item.width_mm}×{item.height_mm} мм]",
+            quantity=item.quantity,
+            unit=unit,
+            unit_price=base_price_single,
+            total=total_item,
+            item_index=idx,
+        )
+    )
+
+    opts = item.options
+
+    if opts.edge:
+        edge_price = max(perimeter * srv_prices["edge"], min_price)
+        total_item += edge_price * item.quantity
         positions.append(
-            CalcPosition(
-                name=f"{product['label']} ({product['thickness']} мм) [{item.width_mm}×{item.height_mm} мм]",
+            _position(
+                name=_pos("edge"),
                 quantity=item.quantity,
                 unit=unit,
-                unit_price=base_price_single,
-                total=total_item,
+                unit_price=edge_price,
+                total=edge_price * item.quantity,
                 item_index=idx,
             )
         )
 
-        opts = item.options
-
-        if opts.edge:
-            edge_price = max(perimeter * srv_prices["edge"], min_price)
-            total_item += edge_price * item.quantity
-            positions.append(
-                CalcPosition(
-                    name=_pos("edge"),
-                    quantity=item.quantity,
-                    unit=unit,
-                    unit_price=edge_price,
-                    total=edge_price * item.quantity,
-                    item_index=idx,
-                )
+    if opts.film and "mirror" in item.product_key:
+        film_price = max(area * srv_prices["film"], min_price)
+        total_item += film_price * item.quantity
+        positions.append(
+            _position(
+                name=_pos("film"),
+                quantity=item.quantity,
+                unit=unit,
+                unit_price=film_price,
+                total=film_price * item.quantity,
+                item_index=idx,
             )
+        )
 
-        if opts.film and "mirror" in item.product_key:
-            film_price = max(area * srv_prices["film"], min_price)
-            total_item += film_price * item.quantity
-            positions.append(
-                CalcPosition(
-                    name=_pos("film"),
-                    quantity=item.quantity,
-                    unit=unit,
-                    unit_price=film_price,
-                    total=film_price * item.quantity,
-                    item_index=idx,
-                )
+    if opts.drill:
+        t = str(int(product["thickness"]))
+        drill_unit = srv_prices["drill"][t]
+        qty = (opts.drill_qty or 0) * item.quantity
+        drill_total = drill_unit * qty
+        total_item += drill_total
+        positions.append(
+            _position(
+                name=_pos("drill"),
+                quantity=qty,
+                unit=unit,
+                unit_price=drill_unit,
+                total=drill_total,
+                item_index=idx,
             )
+        )
 
-        if opts.drill:
-            t = str(int(product["thickness"]))
-            validate_drill_price(t, srv_prices["drill"])
-            drill_unit = srv_prices["drill"][t]
-            qty = (opts.drill_qty or 0) * item.quantity
-            drill_total = drill_unit * qty
-            total_item += drill_total
-            positions.append(
-                CalcPosition(
-                    name=_pos("drill"),
-                    quantity=qty,
-                    unit=unit,
-                    unit_price=drill_unit,
-                    total=drill_total,
-                    item_index=idx,
-                )
+    if opts.pack:
+        pack_price = max(area * srv_prices["pack"], min_price)
+        total_item += pack_price * item.quantity
+        positions.append(
+            _position(
+                name=_pos("pack"),
+                quantity=item.quantity,
+                unit=unit,
+                unit_price=pack_price,
+                total=pack_price * item.quantity,
+                item_index=idx,
             )
+        )
 
-        if opts.pack:
-            pack_price = max(area * srv_prices["pack"], min_price)
-            total_item += pack_price * item.quantity
-            positions.append(
-                CalcPosition(
-                    name=_pos("pack"),
-                    quantity=item.quantity,
-                    unit=unit,
-                    unit_price=pack_price,
-                    total=pack_price * item.quantity,
-                    item_index=idx,
-                )
+    if opts.mount:
+        m_price = srv_prices["mount"] * area
+        m_total = m_price * item.quantity
+        total_item += m_total
+        positions.append(
+            _position(
+                name=_pos("mount"),
+                quantity=item.quantity,
+                unit=unit,
+                unit_price=m_price,
+                total=m_total,
+                item_index=idx,
             )
+        )
+
+    total_item = round_to_100_up(total_item)
+    positions.append(
+        _position(
+            name=_pos("total_per_item"),
+            quantity=1,
+            unit=unit,
+            unit_price=total_item,
+            total=total_item,
+            item_index=idx,
+        )
+    )
+    return positions, float(total_item)
 
-        if opts.mount:
-            m_price = srv_prices["mount"] * area
-            m_total = m_price * item.quantity
-            total_item += m_total
-            positions.append(
-                CalcPosition(
-                    name=_pos("mount"),
-                    quantity=item.quantity,
-                    unit=unit,
-                    unit_price=m_price,
-                    total=m_total,
-                    item_index=idx,
-                )
-            )
 
-        total_item = round_to_100_up(total_item)
-        grand_total += total_item
+def waste_positions(results: list[NestingResult], products: Mapping, prices: PriceSnapshot) -> list[Position]:
+    """
+    Отход при раскрое по каждому товару: площадь израсходованных листов минус площадь деталей × цена м².
+    Позиции КП, а не изделий (item_index=None): в ответе и данных PDF — отдельный раздел waste.
+    """
+    unit = get_texts().get("units", {}).get("m2", "м²")
+    positions = []
+    for r in results:
+        if r.waste_m2 <= 0:
+            continue
+        product = products[r.product_key]
+        total = round_to_100_up(r.waste_m2 * prices.materials[r.product_key])
         positions.append(
-            CalcPosition(
-                name=_pos("total_per_item"),
-                quantity=1,
+            _position(
+                name=_pos("sheet_waste").format(label=product["label"], thickness=product["thickness"], sheets=r.sheets),
+                quantity=round(r.waste_m2, 3),
                 unit=unit,
-                unit_price=total_item,
-                total=total_item,
-                item_index=idx,
+                unit_price=prices.materials[r.product_key],
+                total=total,
+                item_index=None,
             )
         )
+    return positions
+
 
-    delivery_city = request.items[0].options.delivery_city if request.items else None
+def finalize_total(item_totals: list[float], delivery_city: str | None, prices: PriceSnapshot,
+                   unit: str | None = None) -> tuple[list[Position], float]:
+    """
+    Доставка (один раз на КП) и итог по КП, округлённый до 100. delivery_city — ключ цены доставки:
+    город из формы или зона точки доставки (core.delivery_zones). Возвращает (позиции доставки, итог).
+    """
+    unit = unit or _unit()
+    positions: list[Position] = []
+    grand_total = sum(item_totals)
     if delivery_city:
-        d_price = srv_prices["delivery"].get(delivery_city, 0)
+        d_price = prices.services["delivery"].get(delivery_city, 0)
         grand_total += d_price
         positions.append(
-            CalcPosition(
+            _position(
                 name=_pos("delivery").format(city=delivery_city),
                 quantity=1,
                 unit=unit,
@@ -206,15 +296,120 @@ def calc(request: CalcRequest) -> CalcResponse:
                 item_index=None,
             )
         )
+    return positions, float(round_to_100_up(grand_total))
+
+
+def calc_records(request: CalcRequest, prices: PriceSnapshot | None = None) -> CalcResult:
+    """
+    Расчёт без pydantic-моделей на выходе: позиции — лёгкие записи Position.
+    Используется там, где результат сразу сериализуется (API) или только читается.
+    """
+    prices = prices or current_snapshot()
+    products = load_products()
+    unit = _unit()
+
+    # Лог входных данных расчёта
+    items_summary = [
+        {"product_key": i.product_key, "width_mm": i.width_mm, "height_mm": i.height_mm, "quantity": i.quantity}
+        for i in request.items
+    ]
+    logger.info(
+        "calculation_start | items_count=%s | price_snapshot=%s | items=%s",
+        len(request.items), prices.id, items_summary,
+    )
+    max_pieces = settings.NESTING_MAX_PIECES if request.price_by_sheets else None
+    validate_request(enumerate(request.items), products, prices, max_pieces)
+
+    positions: list[Position] = []
+    item_totals: list[float] = []
+    for idx, item in enumerate(request.items):
+        item_positions, total_item = calc_item(idx, item, products, prices, unit)
+        positions.extend(item_positions)
+        item_totals.append(total_item)
+
+    order_totals = item_totals
+    waste: list[Position] = []
+    if request.price_by_sheets:
+        # Цена по израсходованным листам: изделия — по площади, отход — отдельными позициями на КП.
+        # Раскрой без бюджета времени: одно и то же КП всегда стоит одинаково (пересчёт по снимку цен)
+        waste = waste_positions(nest_items(request.items, products, strategies=PRICING_STRATEGIES), products, prices)
+        order_totals = item_totals + [p.total for p in waste]
+
+    delivery_city = delivery_key(request.items[0].options) if request.items else None
+    delivery_positions, grand_total = finalize_total(order_totals, delivery_city, prices, unit)
+    positions.extend(delivery_positions)
 
-    grand_total = round_to_100_up(grand_total)
-    logger.info("calculation_done | total=%.2f | positions_count=%s", grand_total, len(positions))
-    return CalcResponse(positions=positions, total=grand_total)
+    logger.info("calculation_done | total=%.2f | positions_count=%s", grand_total, len(positions) + len(waste))
+    return CalcResult(positions, float(grand_total), prices.id, tuple(waste))
 
 
-def response_to_pdf_data(response: CalcResponse) -> dict:
+def calc(request: CalcRequest, prices: PriceSnapshot | None = None) -> CalcResponse:
     """
-    Преобразует CalcResponse в структуру для PDF/превью: items, deliveries, total.
+    Расчёт по снимку цен prices (по умолчанию — текущие цены из data/).
+    Старые КП можно пересчитать по их снимку: calc(request, prices.get_snapshot(db, snapshot_id)).
+    Модели собираются без повторной валидации: данные порождены самим калькулятором.
+    """
+    result = calc_records(request, prices)
+    return CalcResponse.model_construct(
+        positions=[_to_model(p) for p in result.positions],
+        total=result.total,
+        price_snapshot_id=result.price_snapshot_id,
+        waste=[_to_model(p) for p in result.waste],
+    )
+
+
+def calc_delta(request: CalcDeltaRequest, prices: PriceSnapshot | None = None) -> CalcDeltaResponse:
+    """
+    Инкрементальный пересчёт: считаются только изделия из request.changed, итоги остальных берутся
+    из request.item_totals (получены прошлым расчётом по тому же снимку цен), заново применяются
+    только доставка и округление итога. Возвращает позиции изменённых изделий, доставку и новые итоги.
+    Цены по листам (price_by_sheets) здесь нет: отход зависит от всех изделий сразу, это только calc().
+    """
+    prices = prices or current_snapshot()
+    products = load_products()
+    unit = _unit()
+
+    item_totals = list(request.item_totals)
+    positions: list[Position] = []
+    delivery_city = request.delivery_city
+    seen: set[int] = set()
+    for change in request.changed:
+        if change.index in seen or not 0 <= change.index < len(item_totals):
+            raise ValueError(f"Некорректный индекс изделия: {change.index}")
+        seen.add(change.index)
+    validate_request(((c.index, c.item) for c in request.changed), products, prices)
+
+    for change in request.changed:
+        item_positions, item_totals[change.index] = calc_item(change.index, change.item, products, prices, unit)
+        positions.extend(item_positions)
+        if change.index == 0:
+            # Как и в calc(), город (зона) доставки задаётся опциями первого изделия
+            delivery_city = delivery_key(change.item.options)
+
+    missing = [i for i, t in enumerate(item_totals) if t is None]
+    if missing:
+        raise ValueError(f"Нет итога для изделий {missing}: передайте их в changed")
+
+    delivery_positions, grand_total = finalize_total(item_totals, delivery_city, prices, unit)
+    positions.extend(delivery_positions)
+    logger.info(
+        "calculation_delta | changed=%s | items_count=%s | total=%.2f",
+        sorted(seen), len(item_totals), grand_total,
+    )
+    return CalcDeltaResponse.model_construct(
+        positions=[_to_model(p) for p in positions],
+        item_totals=[float(t) for t in item_totals],
+        delivery_city=delivery_city,
+        total=float(grand_total),
+        price_snapshot_id=prices.id,
+    )
+
+
+def response_to_pdf_data(response: CalcResponse, request: CalcRequest | None = None) -> dict:
+    """
+    Преобразует CalcResponse в структуру для PDF/превью: items, deliveries, waste (отход при раскрое), total.
+    Если передан исходный request, к каждому item добавляются product_key и options —
+    по ним сохранённое КП можно точно пересчитать (core.repricing).
     """
     texts = get_texts()
     total_label = texts.get("positions", {}).get("total_per_item", "Итого по изделию")
@@ -252,11 +447,24 @@ def response_to_pdf_data(response: CalcResponse) -> dict:
         else:
             items_map[idx]["services"].append(pos.name)
 
+    if request is not None:
+        for idx, item in items_map.items():
+            if idx < len(request.items):
+                item["product_key"] = request.items[idx].product_key
+                item["options"] = request.items[idx].options.model_dump()
+
     items_list = [items_map[k] for k in sorted(items_map.keys())]
     deliveries = [
         {"label": pos.name, "price": pos.total}
         for pos in response.positions
         if getattr(pos, "item_index", None) is None
     ]
-
-    return {"items": items_list, "deliveries": deliveries, "total": response.total}
+    waste = [{"label": pos.name, "price": pos.total} for pos in response.waste]
+
+    return {
+        "items": items_list,
+        "deliveries": deliveries,
+        "waste": waste,
+        "total": response.total,
+        "price_snapshot_id": response.price_snapshot_id,
+    }
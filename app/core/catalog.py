@@ -0,0 +1,150 @@
+"""
+Индекс каталога товаров для поиска с подсказками (typeahead) в форме менеджера.
+Записи: key, label, thickness, family. Поиск по префиксам токенов, ранжирование, top-N.
+Индекс строится из load_products() и перестраивается при смене версии данных (core.data_version).
+catalog_version() — версия каталога для ETag страниц, зависящих от каталога.
+"""
+
+import heapq
+import re
+from bisect import bisect_left
+from typing import NamedTuple
+
+from app.core import data_version
+from app.core.calculator import load_products
+from app.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+class CatalogEntry(NamedTuple):
+    key: str
+    label: str
+    thickness: float
+    family: str
+
+
+def normalize(text: str) -> str:
+    return str(text).lower().replace("ё", "е")
+
+
+def tokenize(text: str) -> list[str]:
+    return _TOKEN_RE.findall(normalize(text))
+
+
+def _format_thickness(thickness: float) -> str:
+    return str(int(thickness)) if float(thickness).is_integer() else str(thickness)
+
+
+class CatalogIndex:
+    """
+    Инвертированный индекс по токенам: отсортированный словарь токенов (поиск префикса — bisect)
+    и списки id записей. Записи отсортированы по label, поэтому id — ещё и алфавитный порядок.
+    """
+
+    def __init__(self, products: dict):
+        entries = [
+            CatalogEntry(
+                key=key,
+                label=p["label"],
+                thickness=p["thickness"],
+                family=p.get("family") or key.split("_")[0],
+            )
+            for key, p in products.items()
+        ]
+        entries.sort(key=lambda e: (normalize(e.label), e.thickness, e.key))
+        self.entries: list[CatalogEntry] = entries
+        self._labels = [normalize(e.label) for e in entries]
+        self._families = [normalize(e.family) for e in entries]
+
+        postings: dict[str, list[int]] = {}
+        for i, e in enumerate(entries):
+            thickness = _format_thickness(e.thickness)
+            tokens = set(tokenize(e.label)) | set(tokenize(e.key.replace("_", " ")))
+            tokens |= {thickness, f"{thickness}мм", normalize(e.family)}
+            for tok in tokens:
+                postings.setdefault(tok, []).append(i)
+        self._tokens = sorted(postings)
+        self._postings = [postings[t] for t in self._tokens]
+        self._by_key = {e.key: i for i, e in enumerate(entries)}
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, key: str) -> CatalogEntry | None:
+        i = self._by_key.get(key)
+        return self.entries[i] if i is not None else None
+
+    def _match_token(self, qtok: str) -> tuple[set[int], set[int]]:
+        """Возвращает (id с точным совпадением токена, id с совпадением по префиксу)."""
+        exact: set[int] = set()
+        prefix: set[int] = set()
+        pos = bisect_left(self._tokens, qtok)
+        while pos < len(self._tokens) and self._tokens[pos].startswith(qtok):
+            if self._tokens[pos] == qtok:
+                exact.update(self._postings[pos])
+            else:
+                prefix.update(self._postings[pos])
+            pos += 1
+        return exact, prefix
+
+    def search(self, query: str, limit: int = 20, family: str | None = None) -> tuple[list[CatalogEntry], int]:
+        """
+        Ищет записи, у которых каждый токен запроса совпадает с префиксом какого-либо токена записи.
+        Возвращает (top-N записей, общее число совпадений).
+        Ранг: больше точных совпадений токенов → label начинается с запроса → алфавит.
+        """
+        qtokens = tokenize(query)
+        family_n = normalize(family) if family else None
+
+        if not qtokens:
+            ids = range(len(self.entries))
+            if family_n:
+                ids = [i for i in ids if self._families[i] == family_n]
+            matched = len(ids)
+            return [self.entries[i] for i in list(ids)[:limit]], matched
+
+        candidates: set[int] | None = None
+        exact_hits: dict[int, int] = {}
+        # Сначала самые редкие токены — пересечение сужается быстрее
+        per_token = [self._match_token(t) for t in qtokens]
+        per_token.sort(key=lambda m: len(m[0]) + len(m[1]))
+        for exact, prefix in per_token:
+            found = exact | prefix
+            candidates = found if candidates is None else candidates & found
+            if not candidates:
+                return [], 0
+            for i in exact:
+                exact_hits[i] = exact_hits.get(i, 0) + 1
+
+        if family_n:
+            candidates = {i for i in candidates if self._families[i] == family_n}
+
+        qnorm = normalize(query).strip()
+
+        def rank(i: int) -> tuple:
+            return (-exact_hits.get(i, 0), not self._labels[i].startswith(qnorm), i)
+
+        top = heapq.nsmallest(limit, candidates, key=rank)
+        return [self.entries[i] for i in top], len(candidates)
+
+
+def _build_index() -> CatalogIndex:
+    index = CatalogIndex(load_products())
+    logger.info("catalog_index_built | entries=%s | tokens=%s", len(index), len(index._tokens))
+    return index
+
+
+_index: data_version.VersionedCache[CatalogIndex] = data_version.VersionedCache("catalog_index", _build_index)
+
+
+def get_catalog_index() -> CatalogIndex:
+    """Индекс текущего каталога; перестраивается, только если сменилась версия данных."""
+    return _index.get()
+
+
+def catalog_version() -> str:
+    """Версия каталога: версия данных (штамп публикации или отпечаток файлов data/)."""
+    return data_version.current()
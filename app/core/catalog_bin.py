@@ -0,0 +1,254 @@
+"""
+Компактный бинарный каталог: products.txt + prices_materials.json + prices_services.json → один файл.
+Файл отображается в память (mmap), поэтому все воркеры uvicorn делят одни и те же страницы.
+
+Формат (little-endian):
+    заголовок   MAGIC, версия формата, версия каталога (хэш содержимого), число товаров, смещения секций,
+                хэш цен материалов (materials_hash снимка цен, core.prices)
+    строки      UTF-8 строки подряд (ключи, названия, семейства); ссылки — (offset, length)
+    товары      записи фиксированной ширины, отсортированы по байтам ключа
+    хэш-таблица открытая адресация по crc32(key): u32 номер записи + 1 (0 — пусто), поиск за O(1)
+    услуги      prices_services.json как компактный JSON (вложенная структура, читается один раз)
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import struct
+import zlib
+from collections.abc import Iterator, Mapping
+from pathlib import Path
+
+MAGIC = b"AGCCATLG"
+FORMAT_VERSION = 2
+
+# magic, format_version, n_products, catalog_version, strings_off, rows_off, hash_off, hash_slots,
+# services_off, services_len, materials_hash (sha256)
+_HEADER = struct.Struct("<8sII16sQQQQQQ32s")
+# key_off, key_len, label_off, label_len, family_off, family_len, thickness, material_price (NaN — нет цены)
+_ROW = struct.Struct("<IHIHIHdd")
+_SLOT = struct.Struct("<I")
+
+
+def parse_products_txt(path: Path) -> dict:
+    """Разбор products.txt: «название;толщина;ключ[;семейство]» → {key: {label, thickness, family}}."""
+    products = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            parts = line.split(";")[:4]
+            name, thickness, key = parts[0], float(parts[1]), parts[2]
+            # Необязательная 4-я колонка — семейство материала (mirror/glass/...), иначе префикс ключа
+            family = parts[3].strip() if len(parts) > 3 and parts[3].strip() else key.split("_")[0]
+            products[key] = {"label": name, "thickness": thickness, "family": family}
+    return products
+
+
+def price_number(value):
+    """1640.0 → 1640: цены из catalog.bin (float) и из JSON (int) дают один и тот же хэш."""
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def materials_hash(prices: Mapping) -> str:
+    """sha256 канонического JSON цен материалов {key: руб/м²} — materials_hash снимка цен (core.prices)."""
+    raw = json.dumps({k: price_number(prices[k]) for k in prices},
+                     ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def compile_catalog(products: dict, mat_prices: dict, srv_prices: dict, out_path: Path) -> str:
+    """
+    Записывает бинарный каталог в out_path атомарно (tmp + os.replace).
+    Возвращает версию каталога — hex-хэш содержимого.
+    """
+    strings = bytearray()
+    string_refs: dict[str, tuple[int, int]] = {}
+
+    def ref(s: str) -> tuple[int, int]:
+        if s not in string_refs:
+            data = s.encode("utf-8")
+            string_refs[s] = (len(strings), len(data))
+            strings.extend(data)
+        return string_refs[s]
+
+    rows = bytearray()
+    for key in sorted(products, key=lambda k: k.encode("utf-8")):
+        p = products[key]
+        k_off, k_len = ref(key)
+        l_off, l_len = ref(p["label"])
+        f_off, f_len = ref(p.get("family") or key.split("_")[0])
+        price = mat_prices.get(key)
+        rows.extend(_ROW.pack(
+            k_off, k_len, l_off, l_len, f_off, f_len,
+            float(p["thickness"]),
+            float(price) if price is not None else float("nan"),
+        ))
+    # Хэш-таблица: степень двойки не меньше 2n, линейное пробирование
+    slots = 1
+    while slots < 2 * max(len(products), 1):
+        slots *= 2
+    table = [0] * slots
+    for i, key in enumerate(sorted(products, key=lambda k: k.encode("utf-8"))):
+        pos = zlib.crc32(key.encode("utf-8")) & (slots - 1)
+        while table[pos]:
+            pos = (pos + 1) & (slots - 1)
+        table[pos] = i + 1
+    hash_table = struct.pack(f"<{slots}I", *table)
+
+    services = json.dumps(srv_prices, ensure_ascii=False, sort_keys=True, separators=(",", ":")).encode("utf-8")
+
+    digest = hashlib.blake2b(digest_size=16)
+    for part in (bytes(strings), bytes(rows), services):
+        digest.update(part)
+    version = digest.digest()
+    # Хэш цен считается здесь, один раз: снимок цен поверх mmap не пересериализует цены в каждом процессе
+    prices_hash = materials_hash({
+        key: float(mat_prices[key]) for key in products if mat_prices.get(key) is not None
+    })
+
+    strings_off = _HEADER.size
+    rows_off = strings_off + len(strings)
+    hash_off = rows_off + len(rows)
+    services_off = hash_off + len(hash_table)
+    header = _HEADER.pack(MAGIC, FORMAT_VERSION, len(products), version,
+                          strings_off, rows_off, hash_off, slots, services_off, len(services),
+                          bytes.fromhex(prices_hash))
+
+    out_path = Path(out_path)
+    tmp = out_path.with_name(out_path.name + f".tmp{os.getpid()}")
+    with open(tmp, "wb") as f:
+        f.write(header)
+        f.write(strings)
+        f.write(rows)
+        f.write(hash_table)
+        f.write(services)
+    os.replace(tmp, out_path)
+    return version.hex()
+
+
+def compile_data_dir(data_dir: Path, out_path: Path | None = None) -> str:
+    """Компилирует каталог из исходников в data_dir (по умолчанию в data_dir/catalog.bin)."""
+    data_dir = Path(data_dir)
+    with open(data_dir / "prices_materials.json", encoding="utf-8") as f:
+        mat_prices = json.load(f)
+    with open(data_dir / "prices_services.json", encoding="utf-8") as f:
+        srv_prices = json.load(f)
+    return compile_catalog(
+        parse_products_txt(data_dir / "products.txt"),
+        mat_prices,
+        srv_prices,
+        out_path or data_dir / "catalog.bin",
+    )
+
+
+class BinaryCatalog(Mapping):
+    """
+    Каталог поверх mmap. Как Mapping отдаёт товары {key: {label, thickness, family}} — совместим
+    с результатом load_products(). Записи декодируются при обращении, в памяти процесса ничего не копируется.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, fmt, n, version, strings_off, rows_off, hash_off, hash_slots,
+         services_off, services_len, prices_hash) = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{self.path}: не бинарный каталог")
+        if fmt != FORMAT_VERSION:
+            raise ValueError(f"{self.path}: версия формата {fmt}, ожидается {FORMAT_VERSION}")
+        self._n = n
+        self.version = version.hex()
+        self.materials_hash = prices_hash.hex()
+        self._strings_off = strings_off
+        self._rows_off = rows_off
+        self._hash_off = hash_off
+        self._hash_mask = hash_slots - 1
+        self._services = (services_off, services_len)
+        self._services_cache: dict | None = None
+        self.material_prices = _MaterialPrices(self)
+
+    def close(self) -> None:
+        self._mm.close()
+
+    def _str(self, off: int, length: int) -> str:
+        start = self._strings_off + off
+        return self._mm[start:start + length].decode("utf-8")
+
+    def _row(self, i: int) -> tuple:
+        return _ROW.unpack_from(self._mm, self._rows_off + i * _ROW.size)
+
+    def _key_bytes(self, row: tuple) -> bytes:
+        start = self._strings_off + row[0]
+        return self._mm[start:start + row[1]]
+
+    def _find(self, key: str) -> tuple | None:
+        target = key.encode("utf-8")
+        mm, mask = self._mm, self._hash_mask
+        pos = zlib.crc32(target) & mask
+        while True:
+            slot = _SLOT.unpack_from(mm, self._hash_off + pos * 4)[0]
+            if not slot:
+                return None
+            row = self._row(slot - 1)
+            if self._key_bytes(row) == target:
+                return row
+            pos = (pos + 1) & mask
+
+    def __getitem__(self, key: str) -> dict:
+        row = self._find(key) if isinstance(key, str) else None
+        if row is None:
+            raise KeyError(key)
+        return {"label": self._str(row[2], row[3]), "thickness": row[6], "family": self._str(row[4], row[5])}
+
+    def __contains__(self, key) -> bool:
+        return isinstance(key, str) and self._find(key) is not None
+
+    def __len__(self) -> int:
+        return self._n
+
+    def __iter__(self) -> Iterator[str]:
+        for i in range(self._n):
+            row = self._row(i)
+            yield self._key_bytes(row).decode("utf-8")
+
+    def services(self) -> dict:
+        """Цены услуг (разбираются один раз на процесс; результат только для чтения)."""
+        if self._services_cache is None:
+            off, length = self._services
+            self._services_cache = json.loads(self._mm[off:off + length].decode("utf-8"))
+        return self._services_cache
+
+
+class _MaterialPrices(Mapping):
+    """Цены материалов {key: руб/м²} из колонки бинарного каталога (товары без цены отсутствуют)."""
+
+    def __init__(self, catalog: BinaryCatalog):
+        self._cat = catalog
+
+    def __getitem__(self, key: str) -> float:
+        row = self._cat._find(key) if isinstance(key, str) else None
+        if row is None or row[7] != row[7]:  # NaN — цены нет
+            raise KeyError(key)
+        return row[7]
+
+    def __contains__(self, key) -> bool:
+        try:
+            self[key]
+        except KeyError:
+            return False
+        return True
+
+    def __iter__(self) -> Iterator[str]:
+        for i in range(self._cat._n):
+            row = self._cat._row(i)
+            if row[7] == row[7]:
+                yield self._cat._key_bytes(row).decode("utf-8")
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
@@ -0,0 +1,252 @@
+"""
+Версия данных каталога (data/), общая для всех воркеров, и публикация новой версии.
+
+Кэши данных в процессе (товары, индекс поиска, снимок цен, тексты, реквизиты) — VersionedCache:
+значение пересобирается лениво, при первом обращении после смены версии. Сама версия проверяется
+не чаще раза в DATA_VERSION_CHECK_S: одно чтение маленького файла вместо stat/чтения данных на каждый расчёт.
+
+Версия — содержимое файла-штампа DATA_DIR/.data_version. Его пишет publish() (scripts/publish_data.py,
+POST /api/admin/data/publish): проверяет новые данные, подменяет файлы и catalog.bin и только потом
+атомарно записывает штамп — воркеры переходят на новую версию целиком, не видя половину обновления.
+Пока штампа нет (разработка), версия — отпечаток (mtime, размер) файлов данных: правки подхватываются сами.
+После первой публикации прямые правки файлов в data/ видны только после следующей публикации.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Generic, TypeVar
+
+from app.config import settings
+from app.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+STAMP_FILE = ".data_version"
+# Файлы, которые публикуются вместе (необязательные — texts.json, company_info.json, sheets.json, delivery_zones.json)
+DATA_FILES = ("products.txt", "prices_materials.json", "prices_services.json", "texts.json", "company_info.json",
+              "sheets.json", "delivery_zones.json")
+_REQUIRED = ("products.txt", "prices_materials.json", "prices_services.json")
+
+T = TypeVar("T")
+
+_lock = threading.Lock()
+_publish_lock = threading.Lock()
+_version: str | None = None
+_checked_at = 0.0
+
+
+def _files_fingerprint(data_dir: Path) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    for name in DATA_FILES + ("catalog.bin",):
+        try:
+            st = (data_dir / name).stat()
+        except FileNotFoundError:
+            continue
+        h.update(f"{name}:{st.st_mtime_ns}:{st.st_size};".encode("utf-8"))
+    return "files:" + h.hexdigest()
+
+
+def _read_version() -> str:
+    try:
+        stamp = (settings.DATA_DIR / STAMP_FILE).read_text(encoding="utf-8").strip()
+    except FileNotFoundError:
+        stamp = ""
+    return stamp or _files_fingerprint(settings.DATA_DIR)
+
+
+def current() -> str:
+    """Текущая версия данных; перечитывается не чаще раза в DATA_VERSION_CHECK_S."""
+    global _version, _checked_at
+    now = time.monotonic()
+    if _version is not None and now - _checked_at < settings.DATA_VERSION_CHECK_S:
+        return _version
+    with _lock:
+        if _version is None or now - _checked_at >= settings.DATA_VERSION_CHECK_S:
+            version = _read_version()
+            if version != _version:
+                logger.info("data_version_changed | old=%s | new=%s", _version, version)
+            _version, _checked_at = version, time.monotonic()
+        return _version
+
+
+def invalidate() -> None:
+    """Сбрасывает интервал проверки: следующий current() перечитает штамп (после публикации в этом процессе)."""
+    global _checked_at
+    with _lock:
+        _checked_at = 0.0
+
+
+class VersionedCache(Generic[T]):
+    """Значение loader(), пересобираемое при смене версии данных (лениво, при первом обращении)."""
+
+    def __init__(self, name: str, loader: Callable[[], T]):
+        self.name = name
+        self._loader = loader
+        self._lock = threading.Lock()
+        self._entry: tuple[str, T] | None = None
+
+    def get(self) -> T:
+        version = current()
+        entry = self._entry
+        if entry is not None and entry[0] == version:
+            return entry[1]
+        with self._lock:
+            if self._entry is None or self._entry[0] != version:
+                self._entry = (version, self._loader())
+                logger.info("data_cache_loaded | cache=%s | version=%s", self.name, version)
+            return self._entry[1]
+
+
+def _load_json_object(path: Path, errors: list[str]) -> dict | None:
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        errors.append(f"{path.name}: {e}")
+        return None
+    if not isinstance(data, dict):
+        errors.append(f"{path.name}: ожидается JSON-объект")
+        return None
+    return data
+
+
+def validate(source_dir: Path) -> tuple[list[str], list[str]]:
+    """
+    Проверяет набор данных в source_dir: файлы читаются, цены числовые, у каждого товара есть цена,
+    каждый товар считается калькулятором (со всеми услугами), у каждой зоны доставки есть цена.
+    Возвращает (ошибки, предупреждения).
+    """
+    from app.core.calculator import calc_item
+    from app.core.catalog_bin import parse_products_txt
+    from app.core.delivery_zones import ZoneIndex
+    from app.core.prices import PriceSnapshot
+    from app.core.schemas import CalcItemFull
+
+    source_dir = Path(source_dir)
+    errors: list[str] = []
+    warnings: list[str] = []
+    for name in _REQUIRED:
+        if not (source_dir / name).is_file():
+            errors.append(f"{name}: файл не найден")
+    if errors:
+        return errors, warnings
+
+    try:
+        products = parse_products_txt(source_dir / "products.txt")
+    except (OSError, ValueError, IndexError) as e:
+        return [f"products.txt: {e}"], warnings
+    if not products:
+        errors.append("products.txt: нет ни одного товара")
+    materials = _load_json_object(source_dir / "prices_materials.json", errors)
+    services = _load_json_object(source_dir / "prices_services.json", errors)
+    optional = {}
+    for name in ("texts.json", "company_info.json", "sheets.json", "delivery_zones.json"):
+        if (source_dir / name).exists():
+            optional[name] = _load_json_object(source_dir / name, errors)
+    if errors:
+        return errors, warnings
+
+    for key, value in materials.items():
+        if not isinstance(value, (int, float)) or isinstance(value, bool) or value <= 0:
+            errors.append(f"prices_materials.json: {key}: цена должна быть положительным числом")
+    for key in ("edge", "film", "pack", "mount"):
+        if not isinstance(services.get(key), (int, float)):
+            errors.append(f"prices_services.json: {key}: нет числовой цены")
+    for key in ("drill", "delivery"):
+        if not isinstance(services.get(key), dict):
+            errors.append(f"prices_services.json: {key}: ожидается объект")
+    if errors:
+        return errors, warnings
+
+    if optional.get("delivery_zones.json") is not None:
+        try:
+            zones = ZoneIndex(optional["delivery_zones.json"])
+        except (ValueError, TypeError, AttributeError) as e:
+            errors.append(f"delivery_zones.json: {e}")
+        else:
+            for key in sorted(zones.zone_keys() - set(services["delivery"])):
+                errors.append(f"delivery_zones.json: {key}: нет цены в prices_services.json → delivery")
+    if errors:
+        return errors, warnings
+
+    snapshot = PriceSnapshot(materials, services)
+    for key, product in products.items():
+        if key not in materials:
+            errors.append(f"{key}: нет цены в prices_materials.json")
+            continue
+        drill = str(int(product["thickness"])) in services["drill"]
+        if not drill:
+            warnings.append(f"{key}: нет цены сверления для толщины {product['thickness']} мм")
+        item = CalcItemFull(
+            product_key=key, width_mm=1000, height_mm=1000, quantity=1,
+            options={"edge": True, "film": True, "drill": drill, "drill_qty": 1, "pack": True, "mount": True},
+        )
+        try:
+            calc_item(0, item, products, snapshot, unit="шт")
+        except Exception as e:
+            errors.append(f"{key}: расчёт не выполняется: {e}")
+    for key in materials:
+        if key not in products:
+            warnings.append(f"{key}: цена есть, товара в products.txt нет")
+    return errors, warnings
+
+
+def _content_version(data_dir: Path) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    for name in DATA_FILES:
+        path = data_dir / name
+        if path.is_file():
+            h.update(name.encode("utf-8") + b"\0" + path.read_bytes() + b"\0")
+    return h.hexdigest()
+
+
+def _replace_file(src: Path, dst: Path) -> None:
+    tmp = dst.with_name(f".{dst.name}.{os.getpid()}.tmp")
+    shutil.copyfile(src, tmp)
+    os.replace(tmp, dst)
+
+
+class PublishError(Exception):
+    """Данные не прошли проверку — ничего не опубликовано."""
+
+    def __init__(self, errors: list[str]):
+        super().__init__("; ".join(errors[:5]))
+        self.errors = errors
+
+
+def publish(source_dir: Path | None = None) -> tuple[str, list[str]]:
+    """
+    Проверяет данные из source_dir (по умолчанию — сами DATA_DIR) и публикует их как новую версию:
+    файлы подменяются атомарно по одному, catalog.bin (если используется) пересобирается, штамп пишется
+    последним. Возвращает (версия, предупреждения). Raises PublishError — ошибки проверки.
+    """
+    from app.core.catalog_bin import compile_data_dir
+
+    data_dir = settings.DATA_DIR
+    source_dir = Path(source_dir) if source_dir else data_dir
+    with _publish_lock:
+        errors, warnings = validate(source_dir)
+        if errors:
+            logger.warning("data_publish_rejected | source=%s | errors=%s", source_dir, len(errors))
+            raise PublishError(errors)
+
+        if source_dir.resolve() != data_dir.resolve():
+            for name in DATA_FILES:
+                if (source_dir / name).is_file():
+                    _replace_file(source_dir / name, data_dir / name)
+        if (data_dir / "catalog.bin").exists():
+            compile_data_dir(data_dir)
+
+        version = _content_version(data_dir)
+        stamp = data_dir / STAMP_FILE
+        tmp = stamp.with_name(f"{STAMP_FILE}.{os.getpid()}.tmp")
+        tmp.write_text(version, encoding="utf-8")
+        os.replace(tmp, stamp)
+    invalidate()
+    logger.info("data_published | version=%s | source=%s | warnings=%s", version, source_dir, len(warnings))
+    return version, warnings
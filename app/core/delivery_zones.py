@@ -0,0 +1,235 @@
+"""
+Зоны доставки: точка (широта, долгота) → ключ зоны → цена из prices_services.json["delivery"].
+
+Зоны описаны в data/delivery_zones.json: многоугольники (районы города) и кольца по расстоянию от склада
+(origin). Сначала проверяются многоугольники в порядке файла, затем кольца; первая подходящая зона
+выигрывает. Ключ зоны — ключ цены доставки, поэтому цена берётся из того же снимка цен, что и всё КП,
+а позиция «Доставка (…)» выглядит так же, как при выборе города.
+
+Координаты переводятся в километры локальной проекции вокруг origin (для масштабов города ошибка
+пренебрежима), многоугольники раскладываются по равномерной сетке (cell_km). В каждой ячейке хранятся
+зоны, которые её задевают: ячейка целиком внутри зоны отвечает сразу, для граничной ячейки точка
+проверяется лучом только по рёбрам своей горизонтальной полосы сетки — единицы рёбер вместо всего контура.
+Определение зоны — несколько микросекунд, без сети и геокодеров. Индекс перестраивается при смене версии
+данных (core.data_version).
+"""
+
+import json
+import math
+from pathlib import Path
+from typing import NamedTuple
+
+from app.config import settings
+from app.core.data_version import VersionedCache
+from app.core.schemas import CalcOptions
+from app.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+ZONES_FILE = "delivery_zones.json"
+_KM_PER_DEG_LAT = 110.574
+_KM_PER_DEG_LON = 111.320
+_DEFAULT_CELL_KM = 1.0
+_MAX_CELLS = 4_000_000
+
+
+class Ring(NamedTuple):
+    """Кольцо вокруг origin: min_km <= расстояние < max_km."""
+    key: str
+    min_km: float
+    max_km: float
+
+
+class ZoneIndex:
+    """Сеточный индекс зон доставки. Собирается из содержимого delivery_zones.json; Raises ValueError."""
+
+    def __init__(self, config: dict):
+        origin = config.get("origin")
+        if not (isinstance(origin, list) and len(origin) == 2 and all(_is_number(v) for v in origin)):
+            raise ValueError("origin: ожидается [широта, долгота]")
+        self.lat0, self.lon0 = float(origin[0]), float(origin[1])
+        self.kx = _KM_PER_DEG_LON * math.cos(math.radians(self.lat0))
+        self.ky = _KM_PER_DEG_LAT
+        self.cell = float(config.get("cell_km", _DEFAULT_CELL_KM))
+        if self.cell <= 0:
+            raise ValueError("cell_km: должно быть больше 0")
+
+        self.keys: list[str] = []
+        polygons: list[list[tuple[float, float]]] = []
+        self.rings: list[Ring] = []
+        zones = config.get("zones")
+        if not isinstance(zones, list):
+            raise ValueError("zones: ожидается список")
+        for n, zone in enumerate(zones):
+            key = zone.get("key") if isinstance(zone, dict) else None
+            if not isinstance(key, str) or not key:
+                raise ValueError(f"zones[{n}]: нет key")
+            if "polygon" in zone:
+                points = zone["polygon"]
+                if not (isinstance(points, list) and len(points) >= 3
+                        and all(isinstance(p, list) and len(p) == 2 and all(_is_number(v) for v in p) for p in points)):
+                    raise ValueError(f"zones[{n}] {key}: polygon — не меньше 3 точек [широта, долгота]")
+                self.keys.append(key)
+                polygons.append([self.project(float(lat), float(lon)) for lat, lon in points])
+            elif "max_km" in zone:
+                min_km, max_km = zone.get("min_km", 0), zone["max_km"]
+                if not (_is_number(min_km) and _is_number(max_km) and 0 <= min_km < max_km):
+                    raise ValueError(f"zones[{n}] {key}: ожидается 0 <= min_km < max_km")
+                self.rings.append(Ring(key, float(min_km), float(max_km)))
+            else:
+                raise ValueError(f"zones[{n}] {key}: нужен polygon или max_km")
+        self._build_grid(polygons)
+
+    def project(self, lat: float, lon: float) -> tuple[float, float]:
+        """Широта/долгота → (x, y) км от origin."""
+        return (lon - self.lon0) * self.kx, (lat - self.lat0) * self.ky
+
+    def _build_grid(self, polygons: list[list[tuple[float, float]]]) -> None:
+        self.nx = self.ny = 0
+        self.x0 = self.y0 = 0.0
+        self.cells: list[tuple] = []
+        # row_edges[z][j] — рёбра многоугольника z, задевающие полосу j: (y1, y2, x1, dx/dy)
+        self.row_edges: list[list[tuple]] = []
+        if not polygons:
+            return
+        xs = [x for poly in polygons for x, _ in poly]
+        ys = [y for poly in polygons for _, y in poly]
+        self.x0, self.y0 = min(xs), min(ys)
+        cell = self.cell
+        self.nx = max(1, math.ceil((max(xs) - self.x0) / cell))
+        self.ny = max(1, math.ceil((max(ys) - self.y0) / cell))
+        if self.nx * self.ny > _MAX_CELLS:
+            raise ValueError(f"cell_km={cell}: слишком мелкая сетка для размера зон ({self.nx}×{self.ny} ячеек)")
+
+        cells: list[list] = [[] for _ in range(self.nx * self.ny)]
+        for z, poly in enumerate(polygons):
+            rows: list[list] = [[] for _ in range(self.ny)]
+            row_boxes: list[list] = [[] for _ in range(self.ny)]   # x-диапазоны рёбер в полосе — для классификации
+            for (x1, y1), (x2, y2) in zip(poly, poly[1:] + poly[:1]):
+                if y1 == y2:
+                    # Горизонтальное ребро луч не пересекает, но ячейки под ним — граничные
+                    j = self._row(y1)
+                    row_boxes[j].append((min(x1, x2), max(x1, x2)))
+                    continue
+                edge = (y1, y2, x1, (x2 - x1) / (y2 - y1))
+                for j in range(self._row(min(y1, y2)), self._row(max(y1, y2)) + 1):
+                    rows[j].append(edge)
+                    # x-диапазон ребра внутри полосы j
+                    lo, hi = self.y0 + j * cell, self.y0 + (j + 1) * cell
+                    ya, yb = max(min(y1, y2), lo), min(max(y1, y2), hi)
+                    xa, xb = x1 + (ya - y1) * edge[3], x1 + (yb - y1) * edge[3]
+                    row_boxes[j].append((min(xa, xb), max(xa, xb)))
+            self.row_edges.append([tuple(r) for r in rows])
+
+            bx0, bx1 = self._col(min(x for x, _ in poly)), self._col(max(x for x, _ in poly))
+            for j in range(self._row(min(y for _, y in poly)), self._row(max(y for _, y in poly)) + 1):
+                cy = self.y0 + (j + 0.5) * cell
+                for i in range(bx0, bx1 + 1):
+                    cx0 = self.x0 + i * cell
+                    cx1 = cx0 + cell
+                    if any(a <= cx1 and b >= cx0 for a, b in row_boxes[j]):
+                        cells[j * self.nx + i].append((z, False))       # граница — проверка по рёбрам полосы
+                    elif _inside(self.row_edges[z][j], cx0 + cell / 2, cy):
+                        cells[j * self.nx + i].append((z, True))        # ячейка целиком внутри
+        self.cells = [tuple(c) for c in cells]
+
+    def _col(self, x: float) -> int:
+        return min(max(int((x - self.x0) / self.cell), 0), self.nx - 1)
+
+    def _row(self, y: float) -> int:
+        return min(max(int((y - self.y0) / self.cell), 0), self.ny - 1)
+
+    def resolve(self, lat: float, lon: float) -> str | None:
+        """Ключ зоны для точки или None, если точка вне всех зон."""
+        x = (lon - self.lon0) * self.kx
+        y = (lat - self.lat0) * self.ky
+        if self.cells:
+            i = int((x - self.x0) // self.cell)
+            j = int((y - self.y0) // self.cell)
+            if 0 <= i < self.nx and 0 <= j < self.ny:
+                for z, full in self.cells[j * self.nx + i]:
+                    if full or _inside(self.row_edges[z][j], x, y):
+                        return self.keys[z]
+        if self.rings:
+            d = math.hypot(x, y)
+            for ring in self.rings:
+                if ring.min_km <= d < ring.max_km:
+                    return ring.key
+        return None
+
+    def zone_keys(self) -> set[str]:
+        return set(self.keys) | {r.key for r in self.rings}
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+
+def _inside(edges: tuple, x: float, y: float) -> bool:
+    """Чётность пересечений луча вправо из (x, y) с рёбрами (y1, y2, x1, dx/dy)."""
+    inside = False
+    for y1, y2, x1, slope in edges:
+        if (y1 > y) != (y2 > y) and x < x1 + (y - y1) * slope:
+            inside = not inside
+    return inside
+
+
+def load_config(path: Path) -> dict | None:
+    if not path.exists():
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _load_index() -> ZoneIndex | None:
+    config = load_config(settings.DATA_DIR / ZONES_FILE)
+    if config is None:
+        return None
+    index = ZoneIndex(config)
+    logger.info(
+        "delivery_zones_loaded | polygons=%s | rings=%s | grid=%sx%s",
+        len(index.keys), len(index.rings), index.nx, index.ny,
+    )
+    return index
+
+
+_index: VersionedCache[ZoneIndex | None] = VersionedCache("delivery_zones", _load_index)
+# Зафиксированный индекс процесса (use_zone_index) — вместо data/delivery_zones.json
+_fixed: tuple[ZoneIndex | None] | None = None
+
+
+def use_zone_index(index: ZoneIndex | None) -> None:
+    """
+    Фиксирует индекс зон для всего процесса вместо data/ — для воркеров what-if пересчёта
+    с кандидатными зонами (core.repricing). index=None — зон нет, доставка только по городу.
+    """
+    global _fixed
+    _fixed = (index,)
+
+
+def get_zone_index() -> ZoneIndex | None:
+    """Индекс зон текущей версии данных; None — файла зон нет (доставка только по городу)."""
+    if _fixed is not None:
+        return _fixed[0]
+    return _index.get()
+
+
+def has_point(options: CalcOptions) -> bool:
+    return options.delivery_lat is not None or options.delivery_lon is not None
+
+
+def resolve_zone(lat: float, lon: float) -> str | None:
+    index = get_zone_index()
+    return index.resolve(lat, lon) if index is not None else None
+
+
+def delivery_key(options: CalcOptions) -> str | None:
+    """
+    Ключ цены доставки по опциям изделия: зона точки доставки, если заданы координаты, иначе delivery_city.
+    Точка вне зон даёт None — такие запросы отсекает валидация (validators).
+    """
+    if has_point(options):
+        if options.delivery_lat is None or options.delivery_lon is None:
+            return None
+        return resolve_zone(options.delivery_lat, options.delivery_lon)
+    return options.delivery_city
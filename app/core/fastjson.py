@@ -0,0 +1,41 @@
+"""
+Быстрая сериализация ответов калькулятора в JSON-байты, минуя pydantic и jsonable_encoder.
+
+Формат байт в байт совпадает с тем, что отдаёт FastAPI для CalcResponse (JSONResponse:
+ensure_ascii=False, без пробелов). Если установлен orjson — используется он, иначе стандартный json
+с теми же настройками. orjson — необязательная зависимость: pip install orjson.
+"""
+
+import json
+
+from app.core.schemas import CalcResult, Position
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - зависит от окружения
+    orjson = None
+
+_encoder = json.JSONEncoder(ensure_ascii=False, allow_nan=False, separators=(",", ":"))
+
+_POSITION_FIELDS = Position._fields
+
+
+def dumps(obj) -> bytes:
+    """JSON-байты как у FastAPI JSONResponse (orjson, если доступен)."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return _encoder.encode(obj).encode("utf-8")
+
+
+def positions_to_dicts(positions: list[Position]) -> list[dict]:
+    return [dict(zip(_POSITION_FIELDS, p)) for p in positions]
+
+
+def calc_result_json(result: CalcResult) -> bytes:
+    """CalcResult → JSON в формате CalcResponse: {"positions", "total", "price_snapshot_id", "waste"}."""
+    return dumps({
+        "positions": positions_to_dicts(result.positions),
+        "total": result.total,
+        "price_snapshot_id": result.price_snapshot_id,
+        "waste": positions_to_dicts(result.waste),
+    })
@@ -0,0 +1,134 @@
+"""
+Идемпотентность создания КП: повторная отправка с тем же ключом (Idempotency-Key, скрытое поле формы)
+возвращает результат первого запроса, а не создаёт второе КП и не рендерит PDF заново.
+
+Ключ занимается вставкой строки models.IdempotencyKey со статусом pending — первичный ключ гарантирует,
+что из параллельных запросов (в том числе в разных воркерах) работу выполнит только один. Остальные
+ждут его завершения (до IDEMPOTENCY_WAIT_S) и получают сохранённый ответ. Если запрос упал — ключ
+освобождается (release), и повтор выполняется заново. Ключи старше IDEMPOTENCY_TTL_HOURS удаляются.
+Запросы к БД идут через асинхронную сессию (app.db.AsyncSessionLocal) — ожидание ключа не блокирует цикл событий.
+"""
+
+import asyncio
+import hashlib
+import json
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app import models
+from app.config import settings
+from app.db import AsyncSessionLocal
+from app.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+MAX_KEY_LENGTH = 128
+_POLL_S = 0.2
+
+
+class IdempotencyConflict(Exception):
+    """Ключ нельзя использовать: status_code (400/409/422) и detail для ответа клиенту."""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def normalize_key(raw: str | None) -> str | None:
+    """Пустой ключ — запрос без идемпотентности; слишком длинный — 400."""
+    key = (raw or "").strip()
+    if not key:
+        return None
+    if len(key) > MAX_KEY_LENGTH:
+        raise IdempotencyConflict(400, f"Idempotency-Key длиннее {MAX_KEY_LENGTH} символов")
+    return key
+
+
+def fingerprint(payload: str | bytes) -> str:
+    """Отпечаток тела запроса: тот же ключ с другим телом — ошибка клиента (422)."""
+    if isinstance(payload, str):
+        payload = payload.encode("utf-8")
+    return hashlib.sha256(payload).hexdigest()
+
+
+def _claim(db: Session, key: str, endpoint: str, digest: str) -> tuple[str, dict | None]:
+    """
+    Одна попытка занять ключ. Возвращает ("acquired", None), ("done", ответ) или ("pending", None).
+    Выполняется через AsyncSession.run_sync: код синхронный, ввод-вывод — через aiosqlite.
+    """
+    now = datetime.utcnow()
+    db.execute(
+        delete(models.IdempotencyKey)
+        .where(models.IdempotencyKey.created_at < now - timedelta(hours=settings.IDEMPOTENCY_TTL_HOURS))
+    )
+    db.add(models.IdempotencyKey(key=key, endpoint=endpoint, fingerprint=digest, status="pending", created_at=now))
+    try:
+        db.commit()
+        return "acquired", None
+    except IntegrityError:
+        db.rollback()
+
+    row = db.get(models.IdempotencyKey, key)
+    if row is None:
+        return "pending", None  # ключ только что освобождён — следующая попытка его займёт
+    if row.endpoint != endpoint or row.fingerprint != digest:
+        raise IdempotencyConflict(422, "Idempotency-Key уже использован с другим запросом")
+    if row.status == "done":
+        return "done", json.loads(row.response_json)
+    if row.created_at < now - timedelta(seconds=settings.IDEMPOTENCY_WAIT_S):
+        # Воркер, занявший ключ, не завершил запрос (упал/перезапущен) — забираем ключ себе
+        taken = db.execute(
+            update(models.IdempotencyKey)
+            .where(models.IdempotencyKey.key == key, models.IdempotencyKey.created_at == row.created_at)
+            .values(created_at=now)
+        )
+        db.commit()
+        if taken.rowcount:
+            logger.warning("idempotency_takeover | key=%s | endpoint=%s", key, endpoint)
+            return "acquired", None
+    return "pending", None
+
+
+async def acquire(key: str, endpoint: str, digest: str) -> dict | None:
+    """
+    Занимает ключ для выполнения запроса (None) или возвращает сохранённый ответ предыдущего запроса.
+    Пока запрос с тем же ключом выполняется — ждёт. Raises IdempotencyConflict (409 — не дождались, 422).
+    """
+    deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_S
+    while True:
+        async with AsyncSessionLocal() as db:
+            state, response = await db.run_sync(_claim, key, endpoint, digest)
+        if state == "acquired":
+            return None
+        if state == "done":
+            logger.info("idempotency_replay | key=%s | endpoint=%s", key, endpoint)
+            return response
+        if time.monotonic() >= deadline:
+            raise IdempotencyConflict(409, "Запрос с этим Idempotency-Key ещё выполняется")
+        await asyncio.sleep(_POLL_S)
+
+
+async def complete(key: str, response: dict) -> None:
+    """Сохраняет ответ: повторы с этим ключом получат его без повторного выполнения."""
+    async with AsyncSessionLocal() as db:
+        await db.execute(
+            update(models.IdempotencyKey)
+            .where(models.IdempotencyKey.key == key)
+            .values(status="done", response_json=json.dumps(response, ensure_ascii=False))
+        )
+        await db.commit()
+
+
+async def release(key: str) -> None:
+    """Освобождает ключ после неудачного запроса — повтор выполнится заново."""
+    async with AsyncSessionLocal() as db:
+        await db.execute(
+            delete(models.IdempotencyKey)
+            .where(models.IdempotencyKey.key == key, models.IdempotencyKey.status == "pending")
+        )
+        await db.commit()
@@ -0,0 +1,143 @@
+"""
+Состояние «живого» КП одного соединения (WebSocket /manager/live).
+
+Правки из формы не считаются сразу, а сливаются в pending: по каждому изделию хранится только последняя
+версия, поэтому сколько бы правок ни пришло между пересчётами, очередь не растёт дальше числа изделий.
+recalculate() пересчитывает только изменённые изделия (calc_item), итоги остальных берёт из прошлого
+пересчёта и заново применяет доставку и округление итога (finalize_total).
+Цены по листам (price_by_sheets) здесь не считаются: отход зависит от всех изделий сразу — только API.
+"""
+
+from pydantic import ValidationError
+
+from app.config import settings
+from app.core.calculator import calc_item, finalize_total, load_products
+from app.core.delivery_zones import delivery_key
+from app.core.prices import current_snapshot
+from app.core.schemas import CalcItemFull
+from app.core.validators import validate_items
+
+
+class LiveQuote:
+    """Изделия, их итоги и ещё не посчитанные правки одного соединения."""
+
+    def __init__(self, max_items: int | None = None):
+        self.max_items = max_items or settings.LIVE_MAX_ITEMS
+        self.items: list[CalcItemFull | None] = []
+        self.totals: list[float | None] = []
+        self.errors: dict[int, str] = {}
+        self.delivery_city: str | None = None
+        self.snapshot_id: str | None = None
+        # Слитые правки: index -> сырое изделие (dict); count — новое число изделий, если менялось
+        self.pending: dict[int, dict] = {}
+        self.pending_count: int | None = None
+        self.seq = 0
+
+    def apply(self, message: dict) -> None:
+        """
+        Принимает правку из формы (без расчёта):
+            {"op": "set", "index": 3, "item": {...CalcItemFull...}, "seq": 17}
+            {"op": "count", "count": 5, "seq": 18}     — изделия с индексом >= count удалены
+        Raises ValueError на некорректное сообщение.
+        """
+        op = message.get("op")
+        if op == "set":
+            index = message.get("index")
+            if not isinstance(index, int) or not 0 <= index < self.max_items:
+                raise ValueError(f"Некорректный индекс изделия: {index}")
+            if not isinstance(message.get("item"), dict):
+                raise ValueError("Нет данных изделия")
+            self.pending[index] = message["item"]
+        elif op == "count":
+            count = message.get("count")
+            if not isinstance(count, int) or not 0 <= count <= self.max_items:
+                raise ValueError(f"Некорректное число изделий: {count}")
+            self.pending_count = count
+            for index in [i for i in self.pending if i >= count]:
+                del self.pending[index]
+        else:
+            raise ValueError(f"Неизвестная операция: {op}")
+        if isinstance(message.get("seq"), int):
+            self.seq = max(self.seq, message["seq"])
+
+    def has_pending(self) -> bool:
+        return bool(self.pending) or self.pending_count is not None
+
+    def take_pending(self) -> tuple[dict[int, dict], int | None, int]:
+        """Забирает накопленные правки (вызывается в event loop перед пересчётом в потоке)."""
+        batch, count, seq = self.pending, self.pending_count, self.seq
+        self.pending, self.pending_count = {}, None
+        return batch, count, seq
+
+    def recalculate(self, batch: dict[int, dict], count: int | None, seq: int) -> dict:
+        """
+        Применяет правки и пересчитывает изменённые изделия. Если цены обновились (другой снимок),
+        пересчитываются все изделия. Возвращает сообщение для клиента.
+        """
+        snapshot = current_snapshot()
+        products = load_products()
+
+        if count is not None:
+            del self.items[count:]
+            del self.totals[count:]
+            for index in [i for i in self.errors if i >= count]:
+                del self.errors[index]
+        dirty = set()
+        for index, raw in batch.items():
+            while len(self.items) <= index:
+                self.items.append(None)
+                self.totals.append(None)
+            self.errors.pop(index, None)
+            try:
+                self.items[index] = CalcItemFull(**raw)
+            except (ValidationError, TypeError) as e:
+                self.items[index] = None
+                self.totals[index] = None
+                self.errors[index] = _validation_message(e)
+                continue
+            dirty.add(index)
+
+        if snapshot.id != self.snapshot_id:
+            dirty.update(i for i, item in enumerate(self.items) if item is not None)
+            self.snapshot_id = snapshot.id
+
+        # Все изменённые изделия проверяются одним проходом; изделия с ошибками не считаются
+        for error in validate_items(((i, self.items[i]) for i in sorted(dirty)), products, snapshot):
+            if error.item_index in dirty:
+                dirty.discard(error.item_index)
+                self.totals[error.item_index] = None
+                self.errors[error.item_index] = error.message
+        changed = {}
+        for index in sorted(dirty):
+            positions, total = calc_item(index, self.items[index], products, snapshot)
+            self.totals[index] = total
+            changed[index] = {"total": total, "positions": [p._asdict() for p in positions]}
+
+        if self.items and self.items[0] is not None:
+            # Как и в calc(), город (зона) доставки задаётся опциями первого изделия
+            self.delivery_city = delivery_key(self.items[0].options)
+
+        complete = bool(self.totals) and all(t is not None for t in self.totals)
+        deliveries, total = [], None
+        if complete:
+            delivery_positions, total = finalize_total(self.totals, self.delivery_city, snapshot)
+            deliveries = [p._asdict() for p in delivery_positions]
+
+        return {
+            "type": "quote",
+            "seq": seq,
+            "price_snapshot_id": snapshot.id,
+            "changed": changed,
+            "errors": {str(i): msg for i, msg in self.errors.items()},
+            "item_totals": self.totals,
+            "deliveries": deliveries,
+            "total": total,
+        }
+
+
+def _validation_message(error: Exception) -> str:
+    if isinstance(error, ValidationError):
+        first = error.errors()[0]
+        field = ".".join(str(p) for p in first.get("loc", ()))
+        return f"{field}: {first.get('msg')}" if field else str(first.get("msg"))
+    return str(error)
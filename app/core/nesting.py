@@ -0,0 +1,330 @@
+"""
+Раскрой изделий КП на стандартные листы (гильотинный раскрой, 2D): сколько листов уйдёт на заказ,
+выход годного и отход. Используется для отчёта (POST /api/nesting) и, по желанию, для цены по листам
+(CalcRequest.price_by_sheets — отход добавляется в КП отдельной позицией, core.calculator).
+
+Размеры листов — data/sheets.json (по товару, по семейству или общий), перечитывается при смене версии
+данных (core.data_version). Алгоритм — жадная укладка по свободным прямоугольникам с гильотинными резами:
+каждая деталь кладётся в лучший по правилу fit свободный прямоугольник среди всех листов, остаток
+делится одним резом по правилу split. Для отчёта перебираются комбинации порядка деталей / fit / split
+(STRATEGIES), пока не кончится бюджет времени или не достигнута нижняя граница (площадь деталей / площадь
+листа); первая стратегия выполняется всегда. Для цены по листам бюджета нет: перебирается фиксированный
+список PRICING_STRATEGIES, и одно и то же КП всегда получает один и тот же раскрой, как бы ни был загружен
+сервер (иначе итог КП и его пересчёт по снимку цен зависели бы от скорости машины). Число деталей в таком
+КП ограничено settings.NESTING_MAX_PIECES (core.validators).
+Свободные прямоугольники, в которые не войдёт ни одна из оставшихся деталей (по наименьшим короткой и длинной
+сторонам), сразу выбрасываются — перебор остаётся коротким, и 1000+ деталей раскладываются одной стратегией
+за десятки миллисекунд.
+"""
+
+import json
+import math
+import time
+from collections.abc import Mapping
+from typing import NamedTuple
+
+from app.config import settings
+from app.core.data_version import VersionedCache
+from app.core.schemas import CalcItemFull
+from app.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# Лист по умолчанию, если в data/sheets.json нет подходящего размера: не меньше максимального изделия
+_DEFAULT_SHEET = {"width_mm": settings.MAX_WIDTH_MM, "height_mm": settings.MAX_HEIGHT_MM}
+
+
+class SheetSpec(NamedTuple):
+    """Стандартный лист: размеры (мм), обрезка кромки листа с каждой стороны, ширина реза, можно ли поворачивать детали."""
+    width: float
+    height: float
+    trim: float = 0.0
+    kerf: float = 0.0
+    rotate: bool = True
+
+    @property
+    def area_m2(self) -> float:
+        return self.width * self.height / 1_000_000
+
+
+class Piece(NamedTuple):
+    item_index: int
+    width: float
+    height: float
+
+
+class Placement(NamedTuple):
+    """Деталь на листе: номер листа, координаты левого верхнего угла (мм, от края листа), размеры после поворота."""
+    sheet: int
+    x: float
+    y: float
+    width: float
+    height: float
+    rotated: bool
+    item_index: int
+
+
+class NestingResult(NamedTuple):
+    product_key: str
+    sheet: SheetSpec
+    sheets: int
+    lower_bound: int            # меньше листов не бывает: ceil(площадь деталей / полезная площадь листа)
+    pieces: int
+    used_m2: float              # площадь деталей
+    sheets_m2: float            # площадь израсходованных листов
+    waste_m2: float
+    yield_pct: float
+    placements: list[Placement]
+    unplaced: list[Piece]       # детали больше листа — раскраиваются отдельно, в отход не входят
+    strategy: str
+    strategies_tried: int
+    elapsed_ms: float
+
+
+# --- Правила выбора прямоугольника (меньше — лучше) ---
+
+def _best_area(w: float, h: float, pw: float, ph: float) -> float:
+    return w * h - pw * ph
+
+
+def _best_short_side(w: float, h: float, pw: float, ph: float) -> float:
+    return min(w - pw, h - ph)
+
+
+def _best_long_side(w: float, h: float, pw: float, ph: float) -> float:
+    return max(w - pw, h - ph)
+
+
+_FITS = {"best_short_side": _best_short_side, "best_area": _best_area, "best_long_side": _best_long_side}
+
+# --- Порядок деталей ---
+
+_ORDERS = {
+    "area": lambda p: (-p.width * p.height, -max(p.width, p.height)),
+    "long_side": lambda p: (-max(p.width, p.height), -min(p.width, p.height)),
+    "short_side": lambda p: (-min(p.width, p.height), -max(p.width, p.height)),
+    "perimeter": lambda p: (-(p.width + p.height), -p.width * p.height),
+}
+
+_SPLITS = ("short_leftover", "long_leftover", "max_area")
+
+# Первая стратегия — та, что чаще всего лучшая; порядок деталей меняется быстрее всего,
+# чтобы даже короткий бюджет успел попробовать разные порядки
+STRATEGIES: list[tuple[str, str, str]] = [
+    (order, fit, split)
+    for fit in ("best_short_side", "best_area", "best_long_side")
+    for split in _SPLITS
+    for order in ("area", "long_side", "short_side", "perimeter")
+]
+# Стратегии цены по листам (без бюджета времени): правило best_short_side со всеми порядками и резами
+PRICING_STRATEGIES = STRATEGIES[:12]
+
+
+def _pack(pieces: list[Piece], spec: SheetSpec, fit_name: str, split: str):
+    """Одна жадная укладка. Возвращает (листов, размещения, неразмещённые, занятая площадь последнего листа)."""
+    fit = _FITS[fit_name]
+    sheet_w = spec.width - 2 * spec.trim
+    sheet_h = spec.height - 2 * spec.trim
+    kerf = spec.kerf
+    rotate = spec.rotate
+
+    # Наименьшие короткая и длинная стороны среди ещё не уложенных деталей: прямоугольник, чья короткая
+    # или длинная сторона меньше, не подойдёт ни одной из них (и выбрасывается)
+    min_short = [0.0] * len(pieces)
+    min_long = [0.0] * len(pieces)
+    short, long = math.inf, math.inf
+    for n in range(len(pieces) - 1, -1, -1):
+        p = pieces[n]
+        short = min(short, p.width, p.height)
+        long = min(long, max(p.width, p.height))
+        min_short[n], min_long[n] = short, long
+
+    def usable(w: float, h: float) -> bool:
+        return w >= limit_short and h >= limit_short and (w >= limit_long or h >= limit_long)
+
+    free: list[list[tuple]] = []        # по листам: свободные прямоугольники (x, y, w, h)
+    caps: list[tuple] = []              # по листам: наибольшие короткая и длинная стороны его прямоугольников
+    active: list[int] = []              # листы, в которые ещё может что-то войти
+    placements: list[Placement] = []
+    unplaced: list[Piece] = []
+    sheets = 0
+    for n, piece in enumerate(pieces):
+        pw, ph = piece.width, piece.height
+        p_short, p_long = (pw, ph) if pw <= ph else (ph, pw)
+        limit_short, limit_long = min_short[n], min_long[n]
+        best_s, best_i, best_score, best_rot = -1, -1, math.inf, False
+        still = []
+        for s in active:
+            cap_short, cap_long = caps[s]
+            if cap_short < limit_short or cap_long < limit_long:
+                continue  # лист больше ничего не вместит — больше его не просматриваем
+            still.append(s)
+            if cap_short < p_short or cap_long < p_long:
+                continue
+            for i, (x, y, w, h) in enumerate(free[s]):
+                if pw <= w and ph <= h:
+                    score = fit(w, h, pw, ph)
+                    if score < best_score:
+                        best_s, best_i, best_score, best_rot = s, i, score, False
+                if rotate and ph <= w and pw <= h:
+                    score = fit(w, h, ph, pw)
+                    if score < best_score:
+                        best_s, best_i, best_score, best_rot = s, i, score, True
+        active = still
+
+        if best_s >= 0:
+            s, rects = best_s, free[best_s]
+            x, y, w, h = rects[best_i]
+            rects[best_i] = rects[-1]
+            rects.pop()
+        elif (pw <= sheet_w and ph <= sheet_h) or (rotate and ph <= sheet_w and pw <= sheet_h):
+            best_rot = not (pw <= sheet_w and ph <= sheet_h)
+            s, x, y, w, h = sheets, 0.0, 0.0, sheet_w, sheet_h
+            sheets += 1
+            free.append([])
+            caps.append((0.0, 0.0))
+            active.append(s)
+        else:
+            unplaced.append(piece)
+            continue
+
+        if best_rot:
+            pw, ph = ph, pw
+        placements.append(Placement(s, x + spec.trim, y + spec.trim, pw, ph, best_rot, piece.item_index))
+
+        # Гильотинный рез остатка: справа от детали и под ней (рез шириной kerf)
+        right_w = w - pw - kerf
+        bottom_h = h - ph - kerf
+        if split == "short_leftover":
+            full_width = (w - pw) <= (h - ph)
+        elif split == "long_leftover":
+            full_width = (w - pw) > (h - ph)
+        else:  # max_area: рез, после которого больший остаток максимален
+            full_width = max(w * bottom_h, right_w * ph) >= max(right_w * h, pw * bottom_h)
+        if full_width:
+            right, bottom = (x + pw + kerf, y, right_w, ph), (x, y + ph + kerf, w, bottom_h)
+        else:
+            right, bottom = (x + pw + kerf, y, right_w, h), (x, y + ph + kerf, pw, bottom_h)
+        rects = [r for r in free[s] if usable(r[2], r[3])]
+        for r in (right, bottom):
+            if r[2] > 0 and r[3] > 0 and usable(r[2], r[3]):
+                rects.append(r)
+        free[s] = rects
+        caps[s] = (max((min(r[2], r[3]) for r in rects), default=0.0),
+                   max((max(r[2], r[3]) for r in rects), default=0.0))
+
+    last_used = sum(p.width * p.height for p in placements if p.sheet == sheets - 1)
+    return sheets, placements, unplaced, last_used
+
+
+def nest_pieces(product_key: str, pieces: list[Piece], spec: SheetSpec,
+                time_budget_s: float | None = None,
+                strategies: list[tuple[str, str, str]] | None = None) -> NestingResult:
+    """
+    Раскрой деталей одного материала на листы spec: лучшая из стратегий, успевших за time_budget_s.
+    strategies — перебрать ровно эти стратегии без бюджета времени (детерминированный результат).
+    """
+    started = time.perf_counter()
+    if strategies is None:
+        budget = settings.NESTING_TIME_BUDGET_MS / 1000 if time_budget_s is None else time_budget_s
+        deadline = started + budget
+    else:
+        deadline = math.inf
+    usable_m2 = (spec.width - 2 * spec.trim) * (spec.height - 2 * spec.trim) / 1_000_000
+    pieces_m2 = sum(p.width * p.height for p in pieces) / 1_000_000
+    lower_bound = math.ceil(pieces_m2 / usable_m2 - 1e-9) if usable_m2 > 0 else 0
+
+    sorted_cache: dict[str, list[Piece]] = {}
+    best, best_key, best_name, tried = None, None, "", 0
+    for order, fit, split in STRATEGIES if strategies is None else strategies:
+        if tried and time.perf_counter() >= deadline:
+            break
+        ordered = sorted_cache.get(order)
+        if ordered is None:
+            ordered = sorted_cache[order] = sorted(pieces, key=_ORDERS[order])
+        outcome = _pack(ordered, spec, fit, split)
+        tried += 1
+        # Лучше: больше уложено, меньше листов, меньше занято на последнем листе (остаток крупнее)
+        key = (len(outcome[2]), outcome[0], outcome[3])
+        if best_key is None or key < best_key:
+            best, best_key, best_name = outcome, key, f"{order}/{fit}/{split}"
+        if not outcome[2] and outcome[0] <= lower_bound:
+            break  # оптимум по числу листов
+
+    sheets, placements, unplaced, _ = best
+    used_m2 = sum(p.width * p.height for p in placements) / 1_000_000
+    sheets_m2 = sheets * spec.area_m2
+    return NestingResult(
+        product_key=product_key,
+        sheet=spec,
+        sheets=sheets,
+        lower_bound=lower_bound,
+        pieces=len(pieces),
+        used_m2=round(used_m2, 4),
+        sheets_m2=round(sheets_m2, 4),
+        waste_m2=round(sheets_m2 - used_m2, 4),
+        yield_pct=round(used_m2 / sheets_m2 * 100, 2) if sheets_m2 else 0.0,
+        placements=placements,
+        unplaced=unplaced,
+        strategy=best_name,
+        strategies_tried=tried,
+        elapsed_ms=round((time.perf_counter() - started) * 1000, 2),
+    )
+
+
+def _load_sheets() -> dict:
+    path = settings.DATA_DIR / "sheets.json"
+    if not path.exists():
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+_sheets: VersionedCache[dict] = VersionedCache("sheets", _load_sheets)
+
+
+def sheet_spec(product_key: str, product: Mapping) -> SheetSpec:
+    """Лист для товара: products[key] → families[семейство] → default из data/sheets.json."""
+    config = _sheets.get()
+    size = (
+        config.get("products", {}).get(product_key)
+        or config.get("families", {}).get(product.get("family", ""))
+        or config.get("default")
+        or _DEFAULT_SHEET
+    )
+    return SheetSpec(
+        width=float(size["width_mm"]),
+        height=float(size["height_mm"]),
+        trim=float(size.get("trim_mm", config.get("trim_mm", 0))),
+        kerf=float(size.get("kerf_mm", config.get("kerf_mm", 0))),
+        rotate=bool(size.get("rotate", config.get("rotate", True))),
+    )
+
+
+def nest_items(items: list[CalcItemFull], products: Mapping, time_budget_ms: float | None = None,
+               strategies: list[tuple[str, str, str]] | None = None) -> list[NestingResult]:
+    """
+    Раскрой изделий КП: детали группируются по товару (каждое изделие × quantity), на каждый товар — свой лист.
+    Бюджет времени делится между товарами поровну из оставшегося; со strategies бюджета нет (см. nest_pieces).
+    Изделия должны быть проверены заранее, в том числе на число деталей (NESTING_MAX_PIECES).
+    """
+    started = time.perf_counter()
+    budget_s = (settings.NESTING_TIME_BUDGET_MS if time_budget_ms is None else time_budget_ms) / 1000
+    groups: dict[str, list[Piece]] = {}
+    for index, item in enumerate(items):
+        piece = Piece(index, float(item.width_mm), float(item.height_mm))
+        groups.setdefault(item.product_key, []).extend([piece] * item.quantity)
+
+    results = []
+    for n, (key, pieces) in enumerate(groups.items()):
+        remaining = max(0.0, budget_s - (time.perf_counter() - started))
+        result = nest_pieces(key, pieces, sheet_spec(key, products[key]), remaining / (len(groups) - n), strategies)
+        results.append(result)
+        if result.unplaced:
+            logger.warning("nesting_unplaced | product_key=%s | pieces=%s", key, len(result.unplaced))
+    logger.info(
+        "nesting_done | products=%s | pieces=%s | sheets=%s | ms=%.1f",
+        len(results), sum(r.pieces for r in results), sum(r.sheets for r in results),
+        (time.perf_counter() - started) * 1000,
+    )
+    return results
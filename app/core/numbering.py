@@ -0,0 +1,79 @@
+"""
+Номера КП без коллизий при нескольких воркерах: последовательность в БД (models.NumberSequence),
+выдаваемая блоками. Воркер одним UPDATE резервирует PROPOSAL_NUMBER_BLOCK номеров и раздаёт их из памяти,
+поэтому обращение к БД — одно на блок, а не на номер. Номера уникальны и растут внутри воркера;
+между воркерами порядок не гарантирован, неиспользованный остаток блока при перезапуске теряется (пропуски).
+"""
+
+import threading
+from datetime import datetime
+
+import anyio
+from sqlalchemy import insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from app import models
+from app.config import settings
+from app.db import engine
+from app.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+PROPOSAL_SEQUENCE = "proposal_number"
+
+
+def reserve_block(name: str, size: int) -> tuple[int, int]:
+    """Атомарно резервирует size номеров последовательности name. Возвращает [start, end)."""
+    table = models.NumberSequence.__table__
+    for _ in range(3):
+        with engine.begin() as conn:
+            updated = conn.execute(
+                update(table).where(table.c.name == name).values(next_value=table.c.next_value + size)
+            )
+            if updated.rowcount:
+                end = conn.execute(select(table.c.next_value).where(table.c.name == name)).scalar_one()
+                return end - size, end
+        try:
+            with engine.begin() as conn:
+                conn.execute(insert(table).values(name=name, next_value=1 + size))
+            return 1, 1 + size
+        except IntegrityError:
+            continue  # последовательность создал другой воркер — повторяем UPDATE
+    raise RuntimeError(f"Не удалось зарезервировать номера последовательности {name}")
+
+
+class BlockAllocator:
+    """Раздаёт номера из зарезервированного блока; потокобезопасен (рендеринг PDF идёт в нескольких потоках)."""
+
+    def __init__(self, name: str, block_size: int):
+        self.name = name
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._next = 0
+        self._end = 0
+
+    def next(self) -> int:
+        with self._lock:
+            if self._next >= self._end:
+                self._next, self._end = reserve_block(self.name, self.block_size)
+                logger.info("number_block_reserved | sequence=%s | start=%s | end=%s", self.name, self._next, self._end)
+            value = self._next
+            self._next += 1
+            return value
+
+
+_proposals = BlockAllocator(PROPOSAL_SEQUENCE, settings.PROPOSAL_NUMBER_BLOCK)
+
+
+def next_proposal_number(now: datetime | None = None) -> str:
+    """Номер КП вида КП_19102026-000123: дата для читаемости, уникальность — по номеру последовательности."""
+    now = now or datetime.now()
+    return f"КП_{now:%d%m%Y}-{_proposals.next():06d}"
+
+
+async def next_proposal_number_async(now: datetime | None = None) -> str:
+    """
+    next_proposal_number для async-обработчиков: номер берётся в потоке. Резервирование блока — синхронная
+    запись в БД; в цикле событий она ждала бы блокировку SQLite, которую держит async-сессия этого же цикла.
+    """
+    return await anyio.to_thread.run_sync(next_proposal_number, now)
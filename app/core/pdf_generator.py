@@ -1,20 +1,56 @@
 """
 Генерация PDF для API (POST /api/pdf): items/deliveries/total → HTML → PDF.
 Пути и ассеты — из config и core.assets. Генерация логируется.
+render_proposal_html() — общий рендер КП по commercial_blue.html: им же пользуются /manager/pdf
+и перегенерация (core.regeneration).
 """
 
 from datetime import datetime
 from pathlib import Path
 
-from jinja2 import Environment, FileSystemLoader
 from weasyprint import HTML
 
 from app.config import settings, get_company_info, DELIVERY_TERMS, PAYMENT_TERMS, ADDITIONAL_TERMS, FINAL_TERMS
+from app.core import storage
+from app.core.numbering import next_proposal_number
+from app.core.templates import get_template
 from app.core.assets import get_logo_file_uri, get_works_file_uris
+from app.db import SessionLocal
 from app.logging_config import get_logger
 
 logger = get_logger(__name__)
-env = Environment(loader=FileSystemLoader(str(settings.TEMPLATES_DIR)))
+
+PROPOSAL_TEMPLATE = "commercial_blue.html"
+
+
+def proposal_assets() -> dict:
+    """Реквизиты, условия и ассеты КП (логотип, фото работ) — контекст шаблона по умолчанию."""
+    return {
+        "company_info": get_company_info(),
+        "logo": get_logo_file_uri(),
+        "works": get_works_file_uris(limit=8),
+        "delivery_terms": DELIVERY_TERMS,
+        "payment_terms": PAYMENT_TERMS,
+        "additional_terms": ADDITIONAL_TERMS,
+        "final_terms": FINAL_TERMS,
+    }
+
+
+def render_proposal_html(items: list, deliveries: list, total: float, number: str, date: str,
+                         waste: list | None = None, **assets) -> str:
+    """
+    HTML коммерческого предложения. assets — контекст proposal_assets(); без них берутся текущие
+    реквизиты и условия (воркеры перегенерации передают свой, собранный один раз на процесс).
+    """
+    return get_template(PROPOSAL_TEMPLATE).render(
+        items=items or [],
+        deliveries=deliveries or [],
+        waste=waste or [],
+        total=total or 0,
+        proposal_number=number,
+        date=date,
+        **(assets or proposal_assets()),
+    )
 
 
 def generate_pdf(
@@ -27,40 +63,34 @@ def generate_pdf(
     payment_terms: list | None = None,
     additional_terms: list | None = None,
     final_terms: list | None = None,
+    waste: list | None = None,
 ) -> Path:
     """
-    Генерирует PDF из items/deliveries/total.
-    Сохраняет в settings.PDF_DIR (или settings.APP_DIR для обратной совместимости).
+    Генерирует PDF из items/deliveries/total (waste — отход при раскрое, отдельный блок КП).
+    Сохраняет в хранилище PDF (core.storage: шард в settings.PDF_DIR + запись в индексе).
+    Без proposal_number номер выдаётся core.numbering, имя файла по умолчанию строится из него.
     Возвращает Path к файлу.
     """
-    delivery_terms = delivery_terms or DELIVERY_TERMS
-    payment_terms = payment_terms or PAYMENT_TERMS
-    additional_terms = additional_terms or ADDITIONAL_TERMS
-    final_terms = final_terms or FINAL_TERMS
+    assets = proposal_assets()
+    assets["delivery_terms"] = delivery_terms or assets["delivery_terms"]
+    assets["payment_terms"] = payment_terms or assets["payment_terms"]
+    assets["additional_terms"] = additional_terms or assets["additional_terms"]
+    assets["final_terms"] = final_terms or assets["final_terms"]
 
-    if filename is None:
-        filename = f"Коммерческое предложение {datetime.now().strftime('%d-%m-%Y %H-%M-%S')}.pdf"
     if proposal_number is None:
-        proposal_number = datetime.now().strftime("%d%m%Y%H%M%S")
+        proposal_number = next_proposal_number()
+    if filename is None:
+        filename = f"Коммерческое предложение {proposal_number}.pdf"
 
-    html_out = env.get_template("commercial_blue.html").render(
-        items=items or [],
-        deliveries=deliveries or [],
-        total=total or 0,
-        proposal_number=proposal_number,
-        date=datetime.now().strftime("%d.%m.%Y"),
-        company_info=get_company_info(),
-        delivery_terms=delivery_terms,
-        payment_terms=payment_terms,
-        additional_terms=additional_terms,
-        final_terms=final_terms,
-        logo=get_logo_file_uri(),
-        works=get_works_file_uris(limit=8),
+    html_out = render_proposal_html(
+        items, deliveries, total, proposal_number, datetime.now().strftime("%d.%m.%Y"), waste=waste, **assets
     )
 
-    out_dir = settings.PDF_DIR
-    out_dir.mkdir(parents=True, exist_ok=True)
-    pdf_path = out_dir / filename
-    HTML(string=html_out, base_url=str(settings.APP_DIR)).write_pdf(str(pdf_path))
+    pdf_bytes = HTML(string=html_out, base_url=str(settings.APP_DIR)).write_pdf()
+    db = SessionLocal()
+    try:
+        pdf_path = storage.save_pdf(db, filename, pdf_bytes)
+    finally:
+        db.close()
     logger.info("pdf_generated | proposal_number=%s | total=%.2f | file=%s", proposal_number, total, str(pdf_path))
     return pdf_path
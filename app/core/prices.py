@@ -0,0 +1,187 @@
+"""
+Версионированные снимки цен (prices_materials.json + prices_services.json).
+
+Снимок неизменяем, его id — хэш содержимого: одинаковые цены дают тот же id, любое изменение — новый снимок
+(copy-on-write). В БД разделы хранятся отдельно как сжатые блобы с адресацией по содержимому
+(models.PriceBlob), снимок ссылается на два блоба (models.PriceSnapshotRecord) — правка услуг
+не дублирует цены материалов. Загруженные снимки кэшируются в процессе, calc() считает по любому снимку
+без чтения файлов.
+"""
+
+import hashlib
+import json
+import threading
+import zlib
+from collections import OrderedDict
+from collections.abc import Mapping
+from datetime import datetime
+from types import MappingProxyType
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app import models
+from app.core import catalog_bin, data_version
+from app.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# Сколько снимков держать в памяти процесса
+SNAPSHOT_CACHE_SIZE = 32
+
+
+def _canonical(data: dict) -> bytes:
+    return json.dumps(data, ensure_ascii=False, sort_keys=True, separators=(",", ":")).encode("utf-8")
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return MappingProxyType({k: _freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def _thaw(value):
+    if isinstance(value, MappingProxyType):
+        return {k: _thaw(v) for k, v in value.items()}
+    if isinstance(value, tuple):
+        return [_thaw(v) for v in value]
+    return value
+
+
+class PriceSnapshot:
+    """Неизменяемый снимок цен: materials {key: руб/м²}, services (edge, film, drill{}, pack, delivery{}, mount)."""
+
+    __slots__ = ("id", "materials", "services", "materials_hash", "services_hash")
+
+    def __init__(self, materials: Mapping, services: dict, materials_hash: str | None = None):
+        """
+        materials_hash — уже известный хэш цен материалов (BinaryCatalog.materials_hash): тогда materials
+        (BinaryCatalog.material_prices поверх mmap) хранится как есть, без копии в память процесса.
+        """
+        if materials_hash is None:
+            materials = MappingProxyType({k: catalog_bin.price_number(materials[k]) for k in materials})
+            materials_hash = catalog_bin.materials_hash(materials)
+        services = json.loads(_canonical(dict(services)))
+        srv_raw = _canonical(services)
+        object.__setattr__(self, "materials_hash", materials_hash)
+        object.__setattr__(self, "services_hash", hashlib.sha256(srv_raw).hexdigest())
+        snapshot_id = hashlib.sha256(f"{self.materials_hash}:{self.services_hash}".encode("ascii")).hexdigest()[:32]
+        object.__setattr__(self, "id", snapshot_id)
+        object.__setattr__(self, "materials", materials)
+        object.__setattr__(self, "services", _freeze(services))
+
+    def as_dicts(self) -> tuple[dict, dict]:
+        """Изменяемые копии (materials, services) — для сериализации и передачи в другие процессы."""
+        return {k: catalog_bin.price_number(self.materials[k]) for k in self.materials}, _thaw(self.services)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("PriceSnapshot is immutable")
+
+    def __repr__(self) -> str:
+        return f"PriceSnapshot(id={self.id}, materials={len(self.materials)})"
+
+
+_lock = threading.Lock()
+_snapshots: "OrderedDict[str, PriceSnapshot]" = OrderedDict()
+_stored_ids: set[str] = set()
+_current: tuple[tuple, PriceSnapshot] | None = None
+
+
+def _remember(snapshot: PriceSnapshot) -> PriceSnapshot:
+    with _lock:
+        _snapshots[snapshot.id] = snapshot
+        _snapshots.move_to_end(snapshot.id)
+        while len(_snapshots) > SNAPSHOT_CACHE_SIZE:
+            _snapshots.popitem(last=False)
+    return snapshot
+
+
+def current_snapshot() -> PriceSnapshot:
+    """Снимок текущих цен из data/ (или catalog.bin); пересобирается только при смене версии данных."""
+    global _current
+    from app.core.calculator import get_binary_catalog, load_material_prices, load_service_prices
+
+    stamp = data_version.current()
+    if _current is not None and _current[0] == stamp:
+        return _current[1]
+    catalog = get_binary_catalog()
+    if catalog is not None:
+        # Цены читаются прямо из mmap, хэш — из заголовка: ни копии цен, ни повторной сериализации
+        snapshot = PriceSnapshot(catalog.material_prices, catalog.services(), catalog.materials_hash)
+    else:
+        snapshot = PriceSnapshot(load_material_prices(), load_service_prices())
+    _current = (stamp, snapshot)
+    logger.info("price_snapshot_current | id=%s", snapshot.id)
+    return _remember(snapshot)
+
+
+def _store_blob(db: Session, digest: str, raw: bytes) -> None:
+    if db.get(models.PriceBlob, digest) is None:
+        db.add(models.PriceBlob(hash=digest, data=zlib.compress(raw, 9), size=len(raw)))
+
+
+def ensure_stored(db: Session, snapshot: PriceSnapshot) -> str:
+    """Сохраняет снимок в БД, если его там нет (раз на процесс для каждого id). Возвращает id."""
+    if snapshot.id in _stored_ids:
+        return snapshot.id
+    if db.get(models.PriceSnapshotRecord, snapshot.id) is None:
+        materials, services = snapshot.as_dicts()
+        _store_blob(db, snapshot.materials_hash, _canonical(materials))
+        _store_blob(db, snapshot.services_hash, _canonical(services))
+        db.add(models.PriceSnapshotRecord(
+            id=snapshot.id,
+            materials_hash=snapshot.materials_hash,
+            services_hash=snapshot.services_hash,
+            created_at=datetime.utcnow(),
+        ))
+        db.commit()
+        logger.info("price_snapshot_stored | id=%s", snapshot.id)
+    _stored_ids.add(snapshot.id)
+    return snapshot.id
+
+
+def get_snapshot(db: Session, snapshot_id: str) -> PriceSnapshot | None:
+    """Снимок по id: из кэша процесса или из БД. None — неизвестный id."""
+    with _lock:
+        cached = _snapshots.get(snapshot_id)
+    if cached is not None:
+        return cached
+    record = db.get(models.PriceSnapshotRecord, snapshot_id)
+    if record is None:
+        return None
+    materials = json.loads(zlib.decompress(db.get(models.PriceBlob, record.materials_hash).data))
+    services = json.loads(zlib.decompress(db.get(models.PriceBlob, record.services_hash).data))
+    snapshot = PriceSnapshot(materials, services)
+    if snapshot.id != snapshot_id:
+        logger.error("price_snapshot_corrupted | id=%s | computed=%s", snapshot_id, snapshot.id)
+        return None
+    _stored_ids.add(snapshot.id)
+    return _remember(snapshot)
+
+
+async def ensure_stored_async(db: AsyncSession, snapshot: PriceSnapshot) -> str:
+    """То же, что ensure_stored, для async-обработчиков (запись через aiosqlite)."""
+    if snapshot.id in _stored_ids:
+        return snapshot.id
+    return await db.run_sync(ensure_stored, snapshot)
+
+
+async def get_snapshot_async(db: AsyncSession, snapshot_id: str) -> PriceSnapshot | None:
+    """То же, что get_snapshot, для async-обработчиков: из кэша процесса или из БД через aiosqlite."""
+    with _lock:
+        cached = _snapshots.get(snapshot_id)
+    if cached is not None:
+        return cached
+    return await db.run_sync(get_snapshot, snapshot_id)
+
+
+def list_snapshots(db: Session, limit: int = 50) -> list[models.PriceSnapshotRecord]:
+    return (
+        db.query(models.PriceSnapshotRecord)
+        .order_by(models.PriceSnapshotRecord.created_at.desc())
+        .limit(limit)
+        .all()
+    )
+
@@ -0,0 +1,79 @@
+"""
+Перегенерация PDF сохранённых КП (после правки commercial_blue.html, реквизитов или ассетов).
+Функции рассчитаны на запуск в пуле процессов (scripts/regenerate_pdfs.py): init_worker() один раз
+на процесс загружает шаблон (байткод — из общего кэша core.templates), реквизиты, условия и ассеты;
+render_rows() рендерит пачку КП и сохраняет файлы через core.storage (атомарная подмена на том же месте).
+
+КП рендерится с исходными номером и датой: перегенерированный документ отличается от старого только
+оформлением, а не содержанием.
+"""
+
+import json
+import logging
+from datetime import datetime
+
+from weasyprint import HTML
+
+from app.config import settings
+from app.core import storage
+from app.core.pdf_generator import PROPOSAL_TEMPLATE, proposal_assets, render_proposal_html
+from app.core.templates import get_template
+from app.db import SessionLocal
+from app.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# Состояние процесса-воркера: заполняется init_worker()
+_worker: dict = {}
+
+
+def init_worker() -> None:
+    """
+    Инициализация воркера: шаблон, ассеты КП (proposal_assets) и кэш изображений WeasyPrint — один раз на процесс.
+    Логотип и фото работ декодируются при первом рендере, дальше берутся из кэша.
+    """
+    logging.getLogger("app.core.storage").setLevel(logging.WARNING)
+    get_template(PROPOSAL_TEMPLATE)
+    _worker["assets"] = proposal_assets()
+    _worker["image_cache"] = {}
+
+
+def render_proposal(proposal_number: str, created_at: datetime, total: float,
+                    items_json: str | None, deliveries_json: str | None, waste_json: str | None = None) -> bytes:
+    """PDF одного КП из сохранённых items/deliveries/waste/total."""
+    html = render_proposal_html(
+        json.loads(items_json) if items_json else [],
+        json.loads(deliveries_json) if deliveries_json else [],
+        total,
+        proposal_number,
+        created_at.strftime("%d.%m.%Y"),
+        waste=json.loads(waste_json) if waste_json else [],
+        **_worker["assets"],
+    )
+    return HTML(string=html, base_url=str(settings.APP_DIR)).write_pdf(cache=_worker["image_cache"])
+
+
+def render_rows(rows: list[tuple]) -> dict:
+    """
+    Перегенерирует пачку КП [(id, proposal_number, created_at, total, pdf_path, items_json, deliveries_json,
+    waste_json), ...].
+    Возвращает {"done": n, "bytes": сумма размеров, "errors": [(id, сообщение), ...]}; ошибка одного КП
+    не останавливает пачку.
+    """
+    result = {"done": 0, "bytes": 0, "errors": []}
+    db = SessionLocal()
+    try:
+        for proposal_id, number, created_at, total, filename, items_json, deliveries_json, waste_json in rows:
+            try:
+                data = render_proposal(number, created_at, total, items_json, deliveries_json, waste_json)
+                storage.save_pdf(db, filename, data, created=created_at)
+            except Exception as e:
+                db.rollback()
+                logger.error("pdf_regenerate_failed | id=%s | file=%s | %s", proposal_id, filename, str(e))
+                result["errors"].append((proposal_id, f"{type(e).__name__}: {e}"))
+                continue
+            result["done"] += 1
+            result["bytes"] += len(data)
+    finally:
+        db.close()
+    return result
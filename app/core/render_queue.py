@@ -0,0 +1,180 @@
+"""
+Допуск к генерации PDF (admission control): ограниченная очередь рендеринга с лимитом на клиента.
+
+Рендеринг (WeasyPrint) выполняется в отдельном пуле потоков фиксированного размера и не занимает
+event loop и общий пул потоков FastAPI: дешёвые эндпоинты (/api/calculate) остаются отзывчивыми.
+Если в очереди уже max_queue ожидающих — запрос сразу отклоняется (503 + Retry-After), если у клиента
+уже per_client запросов в работе — 429 + Retry-After. Запрос, прождавший в очереди дольше
+queue_timeout, снимается с очереди (503). Метрики — metrics() (GET /api/metrics/pdf).
+"""
+
+import asyncio
+import math
+import statistics
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+from app.config import settings
+from app.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# Сколько последних замеров ожидания/рендеринга хранить для метрик и оценки Retry-After
+_SAMPLES = 1000
+
+
+class QueueRejected(Exception):
+    """Запрос не допущен к рендерингу: status_code (429/503), retry_after (сек), reason."""
+
+    def __init__(self, status_code: int, retry_after: int, reason: str):
+        super().__init__(reason)
+        self.status_code = status_code
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+def client_key(request) -> str:
+    """Ключ клиента для лимита на клиента: адрес подключения (request.client у Starlette)."""
+    return request.client.host if request.client else "unknown"
+
+
+class RenderQueue:
+    """Ограниченная очередь рендеринга: concurrency потоков, до max_queue ожидающих, до per_client на клиента."""
+
+    def __init__(self, name: str, concurrency: int, max_queue: int, per_client: int, queue_timeout: float):
+        self.name = name
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.per_client = per_client
+        self.queue_timeout = queue_timeout
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix=f"{name}-render")
+        self._in_flight = 0
+        self._clients: Counter = Counter()
+        self._counters: Counter = Counter()
+        self._wait_s: deque = deque(maxlen=_SAMPLES)
+        self._render_s: deque = deque(maxlen=_SAMPLES)
+
+    @property
+    def running(self) -> int:
+        return min(self._in_flight, self.concurrency)
+
+    @property
+    def waiting(self) -> int:
+        # Пул потоков выполняет задачи по порядку: всё сверх concurrency ждёт в очереди
+        return max(0, self._in_flight - self.concurrency)
+
+    def retry_after(self) -> int:
+        """Оценка, через сколько секунд освободится место: медиана рендеринга × длина очереди / потоки."""
+        samples = self._render_s.copy()  # копия: потоки рендеринга дописывают замеры параллельно
+        typical = statistics.median(samples) if samples else 1.0
+        return max(1, math.ceil(typical * (self.waiting + 1) / self.concurrency))
+
+    def _release(self, client: str) -> None:
+        self._in_flight -= 1
+        self._clients[client] -= 1
+        if self._clients[client] <= 0:
+            del self._clients[client]
+
+    def _timed(self, submitted: float, fn: Callable, args: tuple, kwargs: dict):
+        started = time.perf_counter()
+        self._wait_s.append(started - submitted)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            self._render_s.append(time.perf_counter() - started)
+
+    async def run(self, client: str, fn: Callable, *args, **kwargs):
+        """
+        Выполняет fn(*args, **kwargs) в пуле рендеринга, если запрос допущен.
+        Raises QueueRejected (429 — лимит клиента, 503 — очередь полна или ожидание истекло).
+        """
+        # Счётчики меняются только в event loop (_release тоже вызывается через call_soon_threadsafe)
+        if self._clients[client] >= self.per_client:
+            self._counters["rejected_client_limit"] += 1
+            reason, status = "client_limit", 429
+        elif self._in_flight >= self.concurrency + self.max_queue:
+            self._counters["rejected_queue_full"] += 1
+            reason, status = "queue_full", 503
+        else:
+            reason, status = None, 0
+            self._in_flight += 1
+            self._clients[client] += 1
+            self._counters["admitted"] += 1
+        if reason:
+            retry = self.retry_after()
+            logger.warning(
+                "render_rejected | queue=%s | reason=%s | client=%s | waiting=%s | retry_after=%s",
+                self.name, reason, client, self.waiting, retry,
+            )
+            raise QueueRejected(status, retry, reason)
+
+        loop = asyncio.get_running_loop()
+        future = self._executor.submit(self._timed, time.perf_counter(), fn, args, kwargs)
+
+        def on_done(_):
+            # Место в очереди освобождается, когда задача реально завершилась (или снята до старта)
+            try:
+                loop.call_soon_threadsafe(self._release, client)
+            except RuntimeError:
+                pass  # event loop уже закрыт — приложение останавливается
+
+        future.add_done_callback(on_done)
+        waiter = asyncio.wrap_future(future)
+        try:
+            done, _ = await asyncio.wait({waiter}, timeout=self.queue_timeout)
+            if not done and future.cancel():
+                self._counters["timed_out"] += 1
+                logger.warning("render_timeout | queue=%s | client=%s | waited_s=%s", self.name, client, self.queue_timeout)
+                raise QueueRejected(503, self.retry_after(), "queue_timeout")
+            # Уже рендерится — дожидаемся результата
+            result = await waiter
+        except asyncio.CancelledError:
+            future.cancel()  # клиент ушёл: снимаем задачу, если она ещё не начата
+            raise
+        except QueueRejected:
+            raise
+        except Exception:
+            self._counters["failed"] += 1
+            raise
+        self._counters["completed"] += 1
+        return result
+
+    def metrics(self) -> dict:
+        def summary(samples: deque) -> dict:
+            values = sorted(samples.copy())
+            if not values:
+                return {"p50": None, "p95": None, "max": None}
+            return {
+                "p50": round(values[len(values) // 2] * 1000, 1),
+                "p95": round(values[min(len(values) - 1, int(len(values) * 0.95))] * 1000, 1),
+                "max": round(values[-1] * 1000, 1),
+            }
+
+        return {
+            "queue": self.name,
+            "concurrency": self.concurrency,
+            "max_queue": self.max_queue,
+            "per_client": self.per_client,
+            "running": self.running,
+            "waiting": self.waiting,
+            "clients": len(self._clients),
+            "admitted": self._counters["admitted"],
+            "completed": self._counters["completed"],
+            "failed": self._counters["failed"],
+            "rejected_queue_full": self._counters["rejected_queue_full"],
+            "rejected_client_limit": self._counters["rejected_client_limit"],
+            "timed_out": self._counters["timed_out"],
+            "wait_ms": summary(self._wait_s),
+            "render_ms": summary(self._render_s),
+        }
+
+
+pdf_queue = RenderQueue(
+    "pdf",
+    concurrency=settings.PDF_RENDER_CONCURRENCY,
+    max_queue=settings.PDF_QUEUE_MAX,
+    per_client=settings.PDF_PER_CLIENT_LIMIT,
+    queue_timeout=settings.PDF_QUEUE_TIMEOUT_S,
+)
@@ -0,0 +1,201 @@
+"""
+Пересчёт сохранённых КП по кандидатному прайсу («what-if»): восстановление запроса из items_json,
+расчёт calc() по снимку цен, агрегирование разницы выручки по товарам и зонам доставки.
+Функции рассчитаны на запуск в пуле процессов (scripts/reprice_history.py): init_worker() готовит
+каталог и снимок один раз на процесс, reprice_rows() обрабатывает пачку строк и возвращает агрегат.
+"""
+
+import json
+import logging
+import re
+
+from app.config import get_texts
+from app.core.calculator import calc_records, load_products
+from app.core.delivery_zones import ZoneIndex, delivery_key, use_zone_index
+from app.core.prices import PriceSnapshot
+from app.core.schemas import CalcItemFull, CalcOptions, CalcRequest
+from app.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+NO_ZONE = "—"
+_OPTION_KEYS = ("edge", "film", "drill", "pack", "mount")
+
+
+def empty_aggregate() -> dict:
+    return {
+        "proposals": 0,
+        "repriced": 0,
+        "approximate": 0,
+        "skipped": 0,
+        "errors": {},
+        "old_total": 0.0,
+        "new_total": 0.0,
+        "by_product": {},
+        "by_zone": {},
+    }
+
+
+def merge_aggregates(into: dict, part: dict) -> dict:
+    for key in ("proposals", "repriced", "approximate", "skipped", "old_total", "new_total"):
+        into[key] += part[key]
+    for reason, count in part["errors"].items():
+        into["errors"][reason] = into["errors"].get(reason, 0) + count
+    for section in ("by_product", "by_zone"):
+        for key, vals in part[section].items():
+            dst = into[section].setdefault(key, {"count": 0, "old": 0.0, "new": 0.0})
+            for field in ("count", "old", "new"):
+                dst[field] += vals[field]
+    return into
+
+
+class RequestRebuilder:
+    """Восстанавливает CalcRequest из сохранённых items/deliveries/waste КП."""
+
+    def __init__(self, products):
+        texts = get_texts()
+        positions = texts.get("positions", {})
+        self._service_to_option = {positions.get(k, k): k for k in _OPTION_KEYS}
+        delivery_tpl = positions.get("delivery", "Доставка ({city})")
+        self._delivery_re = re.compile("^" + re.escape(delivery_tpl).replace(re.escape("{city}"), "(.+)") + "$")
+        self._by_label: dict[tuple[str, float], str] = {}
+        for key in products:
+            p = products[key]
+            self._by_label.setdefault((p["label"], float(p["thickness"])), key)
+
+    def delivery_city(self, deliveries: list) -> str | None:
+        for d in deliveries or []:
+            m = self._delivery_re.match(str(d.get("label", "")))
+            if m:
+                return m.group(1)
+        return None
+
+    def build(self, items: list, deliveries: list, waste: list | None = None) -> tuple[CalcRequest, bool]:
+        """
+        Возвращает (запрос, точный ли он). КП, сохранённые с product_key/options, восстанавливаются точно;
+        у старых КП товар ищется по названию и толщине, опции — по названиям услуг, а число отверстий
+        неизвестно (считается 0) — такие КП помечаются как приблизительные.
+        Непустой waste — КП считалось по листам (price_by_sheets).
+        """
+        city = self.delivery_city(deliveries)
+        exact = True
+        rebuilt = []
+        for it in items:
+            if it.get("product_key"):
+                options = dict(it.get("options") or {})
+            else:
+                key = self._by_label.get((it.get("product_name"), float(it.get("thickness") or 0)))
+                if key is None:
+                    raise LookupError(f"product_not_found:{it.get('product_name')}")
+                it = dict(it, product_key=key)
+                options = {}
+                for service in it.get("services", []):
+                    opt = self._service_to_option.get(service)
+                    if opt:
+                        options[opt] = True
+                if options.get("drill"):
+                    exact = False
+            options["delivery_city"] = city
+            rebuilt.append(CalcItemFull(
+                product_key=it["product_key"],
+                width_mm=it["width"],
+                height_mm=it["height"],
+                quantity=it.get("quantity", 1),
+                options=CalcOptions(**options),
+            ))
+        return CalcRequest(items=rebuilt, price_by_sheets=bool(waste)), exact
+
+
+# Состояние процесса-воркера: заполняется init_worker()
+_worker: dict = {}
+
+
+def init_worker(materials: dict, services: dict, zones: dict | None = None) -> None:
+    """
+    Инициализация воркера: кандидатный снимок цен и каталог — один раз на процесс; расчёты не логируются.
+    zones — кандидатный delivery_zones.json (None — зоны из data/).
+    """
+    logging.getLogger("app.core.calculator").setLevel(logging.WARNING)
+    if zones is not None:
+        use_zone_index(ZoneIndex(zones))
+    _worker["snapshot"] = PriceSnapshot(materials, services)
+    _worker["rebuilder"] = RequestRebuilder(load_products())
+    _worker["total_label"] = get_texts().get("positions", {}).get("total_per_item", "Итого по изделию")
+
+
+def reprice_rows(rows: list[tuple]) -> dict:
+    """
+    Пересчитывает пачку КП [(id, items_json, deliveries_json, total, waste_json), ...] по кандидатному снимку.
+    Возвращает агрегат (см. empty_aggregate): суммы старых/новых итогов по товарам и зонам.
+    """
+    snapshot = _worker["snapshot"]
+    rebuilder = _worker["rebuilder"]
+    total_label = _worker["total_label"]
+    agg = empty_aggregate()
+
+    for _, items_json, deliveries_json, old_total, waste_json in rows:
+        agg["proposals"] += 1
+        try:
+            items = json.loads(items_json) if items_json else []
+            deliveries = json.loads(deliveries_json) if deliveries_json else []
+            waste = json.loads(waste_json) if waste_json else []
+            if not items:
+                raise LookupError("no_items")
+            request, exact = rebuilder.build(items, deliveries, waste)
+            result = calc_records(request, snapshot)
+        except (LookupError, ValueError, TypeError, KeyError) as e:
+            reason = str(e).split(":")[0] if isinstance(e, LookupError) else type(e).__name__
+            agg["skipped"] += 1
+            agg["errors"][reason] = agg["errors"].get(reason, 0) + 1
+            continue
+
+        agg["repriced"] += 1
+        if not exact:
+            agg["approximate"] += 1
+        agg["old_total"] += old_total or 0.0
+        agg["new_total"] += result.total
+
+        new_item_totals = {
+            p.item_index: p.total for p in result.positions
+            if p.item_index is not None and p.name == total_label
+        }
+        for idx, (item, req_item) in enumerate(zip(items, request.items)):
+            dst = agg["by_product"].setdefault(req_item.product_key, {"count": 0, "old": 0.0, "new": 0.0})
+            dst["count"] += 1
+            dst["old"] += item.get("item_total") or 0.0
+            dst["new"] += new_item_totals.get(idx, 0.0)
+
+        zone = delivery_key(request.items[0].options) or NO_ZONE
+        dst = agg["by_zone"].setdefault(zone, {"count": 0, "old": 0.0, "new": 0.0})
+        dst["count"] += 1
+        dst["old"] += old_total or 0.0
+        dst["new"] += result.total
+    return agg
+
+
+def format_report(agg: dict, candidate_id: str) -> dict:
+    """Итоговый отчёт: дельты по товарам и зонам, отсортированные по абсолютному изменению."""
+
+    def rows(section: dict) -> list[dict]:
+        out = [
+            {"key": k, "count": v["count"], "old": round(v["old"], 2), "new": round(v["new"], 2),
+             "delta": round(v["new"] - v["old"], 2),
+             "delta_pct": round((v["new"] - v["old"]) / v["old"] * 100, 2) if v["old"] else None}
+            for k, v in section.items()
+        ]
+        out.sort(key=lambda r: abs(r["delta"]), reverse=True)
+        return out
+
+    return {
+        "candidate_snapshot_id": candidate_id,
+        "proposals": agg["proposals"],
+        "repriced": agg["repriced"],
+        "approximate": agg["approximate"],
+        "skipped": agg["skipped"],
+        "errors": agg["errors"],
+        "old_total": round(agg["old_total"], 2),
+        "new_total": round(agg["new_total"], 2),
+        "delta": round(agg["new_total"] - agg["old_total"], 2),
+        "by_product": rows(agg["by_product"]),
+        "by_zone": rows(agg["by_zone"]),
+    }
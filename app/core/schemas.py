@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional, List
+from typing import NamedTuple, Optional, List, Tuple
 
 
 class CalcOptions(BaseModel):
@@ -10,6 +10,8 @@ class CalcOptions(BaseModel):
     drill_qty: Optional[int] = 0               # Кол-во отверстий
     pack: bool = False                         # Упаковка в картон
     delivery_city: Optional[str] = None        # Доставка (только один раз)
+    delivery_lat: Optional[float] = None       # Точка доставки: зона и цена по data/delivery_zones.json
+    delivery_lon: Optional[float] = None       # (вместо delivery_city, core.delivery_zones)
     mount: bool = False                        # Монтаж
 
 
@@ -25,6 +27,9 @@ class CalcItemFull(BaseModel):
 class CalcRequest(BaseModel):
     """Основной вход API — список изделий"""
     items: List[CalcItemFull]
+    # Доплата за отход при раскрое на листы (core.nesting). Только API (/calculate, /pdf): отход зависит
+    # от всех изделий сразу, поэтому форма менеджера, /calculate/delta и живой расчёт считают без него
+    price_by_sheets: bool = False
 
 
 class CalcPosition(BaseModel):
@@ -37,7 +42,70 @@ class CalcPosition(BaseModel):
     item_index: Optional[int] = None  # Привязка к изделию
 
 
+class Position(NamedTuple):
+    """
+    Позиция результата без валидации — внутренние данные calc(). Поля и их порядок совпадают с CalcPosition,
+    числа уже приведены к float: сериализуется в тот же JSON, что и CalcPosition (core.fastjson).
+    """
+    name: str
+    quantity: float
+    unit: str
+    unit_price: float
+    total: float
+    item_index: Optional[int] = None
+
+
+class CalcResult(NamedTuple):
+    """Лёгкий результат расчёта (calc_records): то же, что CalcResponse, без pydantic-моделей"""
+    positions: List[Position]
+    total: float
+    price_snapshot_id: Optional[str] = None
+    waste: Tuple[Position, ...] = ()
+
+
 class CalcResponse(BaseModel):
     """Ответ калькулятора — список позиций и итог"""
     positions: List[CalcPosition]
-    total: float
\ No newline at end of file
+    total: float
+    price_snapshot_id: Optional[str] = None  # Снимок цен, по которому выполнен расчёт
+    waste: List[CalcPosition] = []           # Отход при раскрое (price_by_sheets): позиции на КП, входят в total
+
+
+class CalcItemChange(BaseModel):
+    """Изменённое (или новое) изделие для инкрементального пересчёта"""
+    index: int = Field(..., ge=0)
+    item: CalcItemFull
+
+
+class CalcDeltaRequest(BaseModel):
+    """
+    Инкрементальный пересчёт: итоги по изделиям из прошлого ответа (None — ещё не посчитано)
+    и список изменённых изделий. Итоги действительны только для того же снимка цен.
+    """
+    price_snapshot_id: Optional[str] = None
+    item_totals: List[Optional[float]]
+    changed: List[CalcItemChange] = []
+    delivery_city: Optional[str] = None        # Город доставки прошлого расчёта (если первое изделие не менялось)
+
+
+class CalcDeltaResponse(BaseModel):
+    """Позиции только изменённых изделий + доставка, новые итоги по всем изделиям и итог КП"""
+    positions: List[CalcPosition]
+    item_totals: List[float]
+    delivery_city: Optional[str] = None
+    total: float
+    price_snapshot_id: str
+
+
+class ProductInfo(BaseModel):
+    """Товар каталога (для поиска в форме менеджера)"""
+    key: str
+    label: str
+    thickness: float
+    family: str
+
+
+class ProductSearchResponse(BaseModel):
+    """Результат поиска по каталогу: top-N и общее число совпадений"""
+    items: List[ProductInfo]
+    total: int
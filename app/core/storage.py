@@ -0,0 +1,337 @@
+"""
+Хранилище PDF: шардирование по дате и хэш-префиксу, индекс в БД (models.StoredPdf), ретенция и компакция.
+
+Раскладка относительно settings.PDF_DIR:
+    YYYY/MM/ab/<filename>      — «живые» файлы (ab — первые 2 hex-символа sha1 имени файла)
+    archive/YYYY-MM.zip        — старые файлы, собранные в сжатые бандлы (доступны через resolve_pdf)
+Файлы, сохранённые до появления хранилища (плоско в PDF_DIR), по-прежнему находятся resolve_pdf;
+migrate_flat() переносит их в шарды.
+Для async-обработчиков — save_pdf_async() и resolve_pdf_async() (сессия app.db.AsyncSessionLocal):
+запись файла уходит в поток, запросы к индексу — через aiosqlite, цикл событий не блокируется.
+"""
+
+import hashlib
+import os
+import shutil
+import threading
+import zipfile
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import anyio
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app import models
+from app.config import settings
+from app.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+ARCHIVE_DIR_NAME = "archive"
+
+
+class ResolvedPdf:
+    """Найденный PDF: либо файл на диске (path), либо член архивного бандла (archive)."""
+
+    def __init__(self, filename: str, size: int, sha256: str | None, mtime: float,
+                 path: Path | None = None, archive: Path | None = None):
+        self.filename = filename
+        self.size = size
+        self.sha256 = sha256
+        self.mtime = mtime
+        self.path = path
+        self.archive = archive
+
+    def read_bytes(self) -> bytes:
+        if self.path is not None:
+            return self.path.read_bytes()
+        with zipfile.ZipFile(self.archive) as zf:
+            return zf.read(self.filename)
+
+
+def shard_rel_path(filename: str, created: datetime) -> str:
+    prefix = hashlib.sha1(filename.encode("utf-8")).hexdigest()[:2]
+    return f"{created:%Y}/{created:%m}/{prefix}/{filename}"
+
+
+def _atomic_write(path: Path, data: bytes) -> None:
+    """Запись через временный файл + os.replace: читатель видит либо старый, либо новый файл целиком."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # pid + поток: рендеринг PDF идёт в нескольких потоках (core.render_queue)
+    tmp = path.with_name(f".{path.name}.tmp{os.getpid()}.{threading.get_ident()}")
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def get_stored(db: Session, filename: str) -> models.StoredPdf | None:
+    return db.query(models.StoredPdf).filter(models.StoredPdf.filename == filename).first()
+
+
+async def get_stored_async(db: AsyncSession, filename: str) -> models.StoredPdf | None:
+    result = await db.execute(select(models.StoredPdf).where(models.StoredPdf.filename == filename))
+    return result.scalars().first()
+
+
+def _new_row(filename: str, created: datetime | None) -> models.StoredPdf:
+    created = created or datetime.utcnow()
+    return models.StoredPdf(filename=filename, rel_path=shard_rel_path(filename, created), created_at=created)
+
+
+def _mark_written(row: models.StoredPdf, data: bytes) -> None:
+    row.size = len(data)
+    row.sha256 = hashlib.sha256(data).hexdigest()
+    # Если файл был в архиве — теперь актуальна живая копия; старый член бандла уберёт compact()
+    row.archive = None
+    row.archived_at = None
+
+
+def _write_indexed(db: Session, filename: str, data: bytes,
+                   created: datetime | None) -> tuple[models.StoredPdf, Path]:
+    row = get_stored(db, filename)
+    if row is None:
+        row = _new_row(filename, created)
+        db.add(row)
+    path = settings.PDF_DIR / row.rel_path
+    _atomic_write(path, data)
+    _mark_written(row, data)
+    db.commit()
+    return row, path
+
+
+async def _write_indexed_async(db: AsyncSession, filename: str, data: bytes,
+                               created: datetime | None) -> tuple[models.StoredPdf, Path]:
+    row = await get_stored_async(db, filename)
+    if row is None:
+        row = _new_row(filename, created)
+        db.add(row)
+    path = settings.PDF_DIR / row.rel_path
+    await anyio.to_thread.run_sync(_atomic_write, path, data)
+    _mark_written(row, data)
+    await db.commit()
+    return row, path
+
+
+def save_pdf(db: Session, filename: str, data: bytes, created: datetime | None = None) -> Path:
+    """
+    Сохраняет PDF в шард и записывает/обновляет запись индекса. Возвращает путь к файлу.
+    Повторное сохранение того же имени (перегенерация) перезаписывает файл атомарно на том же месте.
+    """
+    if Path(filename).name != filename:
+        raise ValueError(f"Некорректное имя файла: {filename}")
+    try:
+        row, path = _write_indexed(db, filename, data, created)
+    except IntegrityError:
+        # Запись с тем же именем вставил параллельный поток/воркер — обновляем её
+        db.rollback()
+        row, path = _write_indexed(db, filename, data, created)
+    logger.info("pdf_stored | filename=%s | path=%s | size=%s", filename, row.rel_path, row.size)
+    return path
+
+
+async def save_pdf_async(db: AsyncSession, filename: str, data: bytes, created: datetime | None = None) -> Path:
+    """То же, что save_pdf, для async-обработчиков."""
+    if Path(filename).name != filename:
+        raise ValueError(f"Некорректное имя файла: {filename}")
+    try:
+        row, path = await _write_indexed_async(db, filename, data, created)
+    except IntegrityError:
+        await db.rollback()
+        row, path = await _write_indexed_async(db, filename, data, created)
+    logger.info("pdf_stored | filename=%s | path=%s | size=%s", filename, row.rel_path, row.size)
+    return path
+
+
+async def delete_pdf_async(db: AsyncSession, filename: str) -> None:
+    """Удаляет живой файл и запись индекса — откат save_pdf_async, если КП под этот PDF создать не удалось."""
+    row = await get_stored_async(db, filename)
+    if row is None:
+        return
+    path = settings.PDF_DIR / row.rel_path
+    await db.delete(row)
+    await db.commit()
+    await anyio.to_thread.run_sync(lambda: path.unlink(missing_ok=True))
+    logger.info("pdf_deleted | filename=%s | path=%s", filename, row.rel_path)
+
+
+def resolve_pdf(db: Session, filename: str) -> ResolvedPdf | None:
+    """Находит PDF по имени: через индекс (шард или бандл), иначе — в плоском PDF_DIR (старые файлы)."""
+    if Path(filename).name != filename:
+        return None
+    return _resolve_row(filename, get_stored(db, filename))
+
+
+async def resolve_pdf_async(db: AsyncSession, filename: str) -> ResolvedPdf | None:
+    """То же, что resolve_pdf, для async-обработчиков."""
+    if Path(filename).name != filename:
+        return None
+    return _resolve_row(filename, await get_stored_async(db, filename))
+
+
+def _resolve_row(filename: str, row: models.StoredPdf | None) -> ResolvedPdf | None:
+    if row is not None:
+        if row.archive:
+            bundle = settings.PDF_DIR / row.archive
+            try:
+                with zipfile.ZipFile(bundle) as zf:
+                    info = zf.getinfo(filename)
+            except (OSError, KeyError, zipfile.BadZipFile):
+                logger.error("pdf_resolve | archive_member_missing | filename=%s | archive=%s", filename, row.archive)
+                return None
+            mtime = datetime(*info.date_time).timestamp()
+            return ResolvedPdf(filename, info.file_size, row.sha256, mtime, archive=bundle)
+        path = settings.PDF_DIR / row.rel_path
+        try:
+            st = path.stat()
+        except FileNotFoundError:
+            logger.error("pdf_resolve | shard_file_missing | filename=%s | path=%s", filename, row.rel_path)
+            return None
+        return ResolvedPdf(filename, st.st_size, row.sha256, st.st_mtime, path=path)
+
+    legacy = settings.PDF_DIR / filename
+    if legacy.is_file():
+        st = legacy.stat()
+        return ResolvedPdf(filename, st.st_size, None, st.st_mtime, path=legacy)
+    return None
+
+
+def migrate_flat(db: Session) -> int:
+    """Переносит PDF, лежащие плоско в PDF_DIR, в шарды и индексирует их. Возвращает число файлов."""
+    moved = 0
+    for path in sorted(settings.PDF_DIR.glob("*.pdf")):
+        if get_stored(db, path.name) is not None:
+            continue
+        data = path.read_bytes()
+        created = datetime.utcfromtimestamp(path.stat().st_mtime)
+        save_pdf(db, path.name, data, created=created)
+        path.unlink()
+        moved += 1
+    logger.info("pdf_storage_migrate | moved=%s", moved)
+    return moved
+
+
+def _bundle_rel_path(created: datetime) -> str:
+    return f"{ARCHIVE_DIR_NAME}/{created:%Y-%m}.zip"
+
+
+def archive_older_than(db: Session, days: int | None = None) -> int:
+    """
+    Ретенция: живые файлы старше days (по умолчанию settings.PDF_RETENTION_DAYS) собираются
+    в помесячные zip-бандлы (deflate), шардовые копии удаляются. Возвращает число архивированных файлов.
+    """
+    days = settings.PDF_RETENTION_DAYS if days is None else days
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    rows = (
+        db.query(models.StoredPdf)
+        .filter(models.StoredPdf.archive.is_(None), models.StoredPdf.created_at < cutoff)
+        .order_by(models.StoredPdf.created_at)
+        .all()
+    )
+    by_bundle: dict[str, list[models.StoredPdf]] = {}
+    for row in rows:
+        by_bundle.setdefault(_bundle_rel_path(row.created_at), []).append(row)
+
+    archived = 0
+    for bundle_rel, bundle_rows in by_bundle.items():
+        bundle = settings.PDF_DIR / bundle_rel
+        bundle.parent.mkdir(parents=True, exist_ok=True)
+        # Дописываем во временную копию и подменяем атомарно: при сбое старый бандл цел
+        tmp = bundle.with_name(f".{bundle.name}.tmp{os.getpid()}")
+        if bundle.exists():
+            shutil.copyfile(bundle, tmp)
+        present = []
+        with zipfile.ZipFile(tmp, "a", compression=zipfile.ZIP_DEFLATED, compresslevel=9) as zf:
+            existing = set(zf.namelist())
+            for row in bundle_rows:
+                src = settings.PDF_DIR / row.rel_path
+                if not src.exists():
+                    logger.warning("pdf_archive | shard_file_missing | filename=%s", row.filename)
+                    continue
+                if row.filename in existing:
+                    # Устаревший член после перегенерации: новый добавляется, старый уберёт compact()
+                    logger.info("pdf_archive | replacing_member | filename=%s", row.filename)
+                zf.write(src, arcname=row.filename)
+                present.append((row, src))
+        os.replace(tmp, bundle)
+
+        now = datetime.utcnow()
+        for row, _ in present:
+            row.archive = bundle_rel
+            row.archived_at = now
+        db.commit()
+        for _, src in present:
+            src.unlink(missing_ok=True)
+        archived += len(present)
+        logger.info("pdf_archive | bundle=%s | files=%s", bundle_rel, len(present))
+    return archived
+
+
+def compact(db: Session) -> dict:
+    """
+    Компакция: переписывает бандлы без лишних членов (дубликаты после перегенерации, файлы без записи в индексе),
+    удаляет пустые бандлы и пустые каталоги шардов. Возвращает статистику.
+    """
+    stats = {"bundles_rewritten": 0, "bundles_removed": 0, "members_dropped": 0, "dirs_removed": 0}
+    archive_dir = settings.PDF_DIR / ARCHIVE_DIR_NAME
+    if archive_dir.exists():
+        for bundle in sorted(archive_dir.glob("*.zip")):
+            bundle_rel = f"{ARCHIVE_DIR_NAME}/{bundle.name}"
+            live = {
+                r.filename
+                for r in db.query(models.StoredPdf.filename).filter(models.StoredPdf.archive == bundle_rel)
+            }
+            with zipfile.ZipFile(bundle) as zf:
+                infos = zf.infolist()
+                # Последний член с данным именем — актуальный (zip допускает дубликаты)
+                latest = {info.filename: info for info in infos}
+                keep = [info for name, info in latest.items() if name in live]
+                if len(keep) == len(infos):
+                    continue
+                stats["members_dropped"] += len(infos) - len(keep)
+                if not keep:
+                    bundle_data = None
+                else:
+                    tmp = bundle.with_name(f".{bundle.name}.tmp{os.getpid()}")
+                    with zipfile.ZipFile(tmp, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=9) as out:
+                        for info in keep:
+                            out.writestr(info, zf.read(info))
+                    bundle_data = tmp
+            if bundle_data is None:
+                bundle.unlink()
+                stats["bundles_removed"] += 1
+            else:
+                os.replace(bundle_data, bundle)
+                stats["bundles_rewritten"] += 1
+
+    # Пустые каталоги шардов (снизу вверх)
+    for dirpath, _, _ in os.walk(settings.PDF_DIR, topdown=False):
+        path = Path(dirpath)
+        if path == settings.PDF_DIR or path == archive_dir:
+            continue
+        if not any(path.iterdir()):
+            try:
+                path.rmdir()
+                stats["dirs_removed"] += 1
+            except OSError:
+                pass
+    logger.info("pdf_compact | %s", stats)
+    return stats
+
+
+def storage_stats(db: Session) -> dict:
+    rows = db.query(models.StoredPdf.size, models.StoredPdf.archive).all()
+    archive_dir = settings.PDF_DIR / ARCHIVE_DIR_NAME
+    bundles = list(archive_dir.glob("*.zip")) if archive_dir.exists() else []
+    return {
+        "files": len(rows),
+        "bytes": sum(r.size for r in rows),
+        "archived": sum(1 for r in rows if r.archive),
+        "bundles": len(bundles),
+        "bundle_bytes": sum(b.stat().st_size for b in bundles),
+        "legacy_flat": sum(1 for _ in settings.PDF_DIR.glob("*.pdf")) if settings.PDF_DIR.exists() else 0,
+    }
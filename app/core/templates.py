@@ -0,0 +1,78 @@
+"""
+Единое окружение Jinja2 для страниц менеджера и PDF-шаблонов (commercial_blue.html).
+
+Скомпилированный байткод шаблонов хранится на диске (settings.TEMPLATES_CACHE_DIR) и общий для всех
+воркеров: новый воркер не компилирует шаблоны заново, а читает готовый код. В production
+TEMPLATES_AUTO_RELOAD выключен — файлы шаблонов не проверяются на каждом рендере, изменения
+подхватываются после перезапуска. precompile() загружает все шаблоны при старте приложения.
+"""
+
+import os
+import time
+
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, Template, select_autoescape
+
+from app.config import settings
+from app.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+class _VersionedLoader(FileSystemLoader):
+    """FileSystemLoader, запоминающий mtime файла, из которого шаблон был загружен (для ETag страниц)."""
+
+    def __init__(self, searchpath):
+        super().__init__(searchpath)
+        self.versions: dict[str, int] = {}
+
+    def get_source(self, environment, template):
+        source, filename, uptodate = super().get_source(environment, template)
+        self.versions[template] = os.stat(filename).st_mtime_ns
+        return source, filename, uptodate
+
+
+def _bytecode_cache() -> FileSystemBytecodeCache | None:
+    if settings.TEMPLATES_CACHE_DIR is None:
+        return None
+    try:
+        settings.TEMPLATES_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    except OSError as e:
+        logger.warning("templates_bytecode_cache_disabled | dir=%s | %s", settings.TEMPLATES_CACHE_DIR, str(e))
+        return None
+    return FileSystemBytecodeCache(str(settings.TEMPLATES_CACHE_DIR))
+
+
+_loader = _VersionedLoader(str(settings.TEMPLATES_DIR))
+
+env = Environment(
+    loader=_loader,
+    autoescape=select_autoescape(["html"]),
+    auto_reload=settings.TEMPLATES_AUTO_RELOAD,
+    bytecode_cache=_bytecode_cache(),
+)
+
+
+def get_template(name: str) -> Template:
+    return env.get_template(name)
+
+
+def template_version(name: str) -> int:
+    """
+    Версия шаблона, который реально используется при рендере (mtime файла на момент загрузки).
+    При выключенном auto_reload правка файла без перезапуска не меняет версию — ETag не обгоняет содержимое.
+    """
+    env.get_template(name)
+    return _loader.versions[name]
+
+
+def precompile() -> list[str]:
+    """Загружает (компилирует или читает из кэша байткода) все .html-шаблоны. Возвращает их имена."""
+    started = time.perf_counter()
+    names = env.list_templates(extensions=["html"])
+    for name in names:
+        env.get_template(name)
+    logger.info(
+        "templates_precompiled | count=%s | ms=%.1f | bytecode_cache=%s",
+        len(names), (time.perf_counter() - started) * 1000, settings.TEMPLATES_CACHE_DIR,
+    )
+    return names
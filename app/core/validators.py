@@ -1,61 +1,140 @@
 """
-Валидация входных данных калькулятора: размеры, товар, цены.
-Сообщения об ошибках берутся из config.get_texts(). Ошибки пишутся в лог.
+Валидация входных данных калькулятора: размеры, товар, цены материала и сверления, точка доставки,
+число деталей для раскроя на листы.
+Весь запрос проверяется за один проход до начала расчёта: возвращаются все ошибки сразу, с индексами изделий.
+Проверки по товару (есть ли в каталоге, есть ли цена, толщина для сверления) выполняются один раз
+на уникальный product_key, а не на каждое изделие. Сообщения — из config.get_texts(), сводка пишется в лог.
 """
 
+from collections.abc import Iterable, Mapping
+from typing import NamedTuple
+
 from app.config import settings, get_texts
+from app.core.delivery_zones import has_point, resolve_zone
+from app.core.prices import PriceSnapshot
+from app.core.schemas import CalcItemFull
 from app.logging_config import get_logger
 
 logger = get_logger(__name__)
 
+_DEFAULT_MESSAGES = {
+    "height_max": "Ошибка: Высота превышает {max_mm} мм",
+    "width_max": "Ошибка: Ширина превышает {max_mm} мм",
+    "unknown_product": "Ошибка: неизвестный товар {product_key}",
+    "no_material_price": "Ошибка: нет цены для {product_key}",
+    "no_drill_price": "Ошибка: нет цены сверления для толщины {thickness} мм",
+    "delivery_point": "Ошибка: для точки доставки нужны широта и долгота",
+    "delivery_out_of_zone": "Ошибка: точка доставки вне зон доставки",
+    "no_delivery_price": "Ошибка: нет цены доставки для зоны {zone}",
+    "nesting_pieces_max": "Ошибка: для раскроя на листы не больше {max_pieces} деталей в КП",
+}
 
-def validate_dimensions(height_mm: float, width_mm: float) -> None:
-    """Проверяет высоту и ширину против MAX_HEIGHT_MM, MAX_WIDTH_MM. Raises ValueError."""
-    texts = get_texts()
-    err = texts.get("errors", {})
-    if height_mm > settings.MAX_HEIGHT_MM:
-        msg = err.get("height_max", "Ошибка: Высота превышает {max_mm} мм").format(
-            max_mm=settings.MAX_HEIGHT_MM
-        )
-        logger.warning("validation_error | dimensions | height_mm=%s max=%s", height_mm, settings.MAX_HEIGHT_MM)
-        raise ValueError(msg)
-    if width_mm > settings.MAX_WIDTH_MM:
-        msg = err.get("width_max", "Ошибка: Ширина превышает {max_mm} мм").format(
-            max_mm=settings.MAX_WIDTH_MM
-        )
-        logger.warning("validation_error | dimensions | width_mm=%s max=%s", width_mm, settings.MAX_WIDTH_MM)
-        raise ValueError(msg)
 
+class ItemError(NamedTuple):
+    """Ошибка изделия: индекс в запросе, поле, код (ключ в texts.json → errors) и сообщение."""
+    item_index: int
+    field: str
+    code: str
+    message: str
 
-def validate_product_key(product_key: str, products: dict) -> None:
-    """Проверяет, что product_key есть в справочнике products. Raises ValueError."""
-    if product_key not in products:
-        texts = get_texts()
-        msg = texts.get("errors", {}).get(
-            "unknown_product", "Ошибка: неизвестный товар {product_key}"
-        )
-        logger.warning("validation_error | unknown_product | product_key=%s", product_key)
-        raise ValueError(msg.format(product_key=product_key))
 
+class RequestValidationError(ValueError):
+    """Запрос не прошёл проверку; errors — все ошибки. str() — сообщения через «; » с номерами изделий."""
+
+    def __init__(self, errors: list[ItemError]):
+        super().__init__("; ".join(f"Изделие {e.item_index + 1}: {e.message}" for e in errors))
+        self.errors = errors
+
+    def as_dicts(self) -> list[dict]:
+        return [e._asdict() for e in self.errors]
+
+
+class _ProductCheck(NamedTuple):
+    error: ItemError | None     # шаблон ошибки товара (item_index подставляется для каждого изделия)
+    drill_error: str | None     # сообщение, если сверления для толщины товара нет в ценах
 
-def validate_material_price(product_key: str, mat_prices: dict) -> None:
-    """Проверяет наличие цены материала для product_key. Raises ValueError."""
-    if product_key not in mat_prices:
-        texts = get_texts()
-        msg = texts.get("errors", {}).get(
-            "no_material_price", "Ошибка: нет цены для {product_key}"
-        )
-        logger.warning("validation_error | no_material_price | product_key=%s", product_key)
-        raise ValueError(msg.format(product_key=product_key))
 
+def validate_items(items: Iterable[tuple[int, CalcItemFull]], products: Mapping,
+                   prices: PriceSnapshot, max_pieces: int | None = None) -> list[ItemError]:
+    """
+    Проверяет изделия (пары (индекс, CalcItemFull)) против каталога products и снимка цен prices.
+    max_pieces — запрос пойдёт в раскрой на листы (core.nesting): деталей (изделия × количество) не больше;
+    ошибка ставится изделию, на котором лимит превышен.
+    Возвращает все ошибки; пустой список — можно считать.
+    """
+    messages = {**_DEFAULT_MESSAGES, **get_texts().get("errors", {})}
+    max_h, max_w = settings.MAX_HEIGHT_MM, settings.MAX_WIDTH_MM
+    height_msg = messages["height_max"].format(max_mm=max_h)
+    width_msg = messages["width_max"].format(max_mm=max_w)
+    materials = prices.materials
+    drill_prices = prices.services["drill"]
+    checked: dict[str, _ProductCheck] = {}
+    errors: list[ItemError] = []
+    pieces = 0
 
-def validate_drill_price(thickness_str: str, drill_prices: dict) -> None:
-    """Проверяет наличие цены сверления для толщины. Raises ValueError."""
-    if thickness_str not in drill_prices:
-        texts = get_texts()
-        msg = texts.get("errors", {}).get(
-            "no_drill_price",
-            "Ошибка: нет цены сверления для толщины {thickness} мм",
+    for index, item in items:
+        if item.height_mm > max_h:
+            errors.append(ItemError(index, "height_mm", "height_max", height_msg))
+        if item.width_mm > max_w:
+            errors.append(ItemError(index, "width_mm", "width_max", width_msg))
+
+        key = item.product_key
+        check = checked.get(key)
+        if check is None:
+            check = checked[key] = _check_product(key, products, materials, drill_prices, messages)
+        if check.error is not None:
+            errors.append(check.error._replace(item_index=index))
+        elif item.options.drill and check.drill_error is not None:
+            errors.append(ItemError(index, "options.drill", "no_drill_price", check.drill_error))
+        if index == 0 and has_point(item.options):
+            # Доставка считается по первому изделию (как и delivery_city)
+            error = _check_delivery_point(item, prices, messages)
+            if error is not None:
+                errors.append(error)
+        if max_pieces is not None and pieces <= max_pieces:
+            pieces += max(item.quantity, 0)
+            if pieces > max_pieces:
+                message = messages["nesting_pieces_max"].format(max_pieces=max_pieces)
+                errors.append(ItemError(index, "quantity", "nesting_pieces_max", message))
+
+    if errors:
+        logger.warning(
+            "validation_error | errors=%s | items=%s | codes=%s",
+            len(errors), sorted({e.item_index for e in errors}), sorted({e.code for e in errors}),
         )
-        logger.warning("validation_error | no_drill_price | thickness=%s", thickness_str)
-        raise ValueError(msg.format(thickness=thickness_str))
+    return errors
+
+
+def validate_request(items: Iterable[tuple[int, CalcItemFull]], products: Mapping, prices: PriceSnapshot,
+                     max_pieces: int | None = None) -> None:
+    """То же, что validate_items, но с исключением. Raises RequestValidationError."""
+    errors = validate_items(items, products, prices, max_pieces)
+    if errors:
+        raise RequestValidationError(errors)
+
+
+def _check_delivery_point(item: CalcItemFull, prices: PriceSnapshot, messages: dict) -> ItemError | None:
+    lat, lon = item.options.delivery_lat, item.options.delivery_lon
+    if lat is None or lon is None:
+        return ItemError(0, "options.delivery_lat", "delivery_point", messages["delivery_point"])
+    zone = resolve_zone(lat, lon)
+    if zone is None:
+        return ItemError(0, "options.delivery_lat", "delivery_out_of_zone", messages["delivery_out_of_zone"])
+    if zone not in prices.services["delivery"]:
+        return ItemError(0, "options.delivery_lat", "no_delivery_price", messages["no_delivery_price"].format(zone=zone))
+    return None
+
+
+def _check_product(key: str, products: Mapping, materials: Mapping, drill_prices: Mapping,
+                   messages: dict) -> _ProductCheck:
+    if key not in products:
+        message = messages["unknown_product"].format(product_key=key)
+        return _ProductCheck(ItemError(-1, "product_key", "unknown_product", message), None)
+    if key not in materials:
+        message = messages["no_material_price"].format(product_key=key)
+        return _ProductCheck(ItemError(-1, "product_key", "no_material_price", message), None)
+    thickness = str(int(products[key]["thickness"]))
+    drill_error = None
+    if thickness not in drill_prices:
+        drill_error = messages["no_drill_price"].format(thickness=thickness)
+    return _ProductCheck(None, drill_error)
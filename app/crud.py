@@ -9,6 +9,7 @@ from datetime import datetime
 from sqlalchemy.orm import Session
 
 from app import models
+from app.config import settings
 from app.logging_config import get_logger
 
 logger = get_logger(__name__)
@@ -16,9 +17,14 @@ logger = get_logger(__name__)
 
 def create_proposal(db: Session, proposal_number: str, total: float, pdf_path: str,
                     items: list, deliveries: list = None, manager: str | None = None,
-                    status: str = "draft") -> models.Proposal:
-    """Создаёт запись о коммерческом предложении."""
+                    status: str = "draft", price_snapshot_id: str | None = None,
+                    waste: list | None = None) -> models.Proposal:
+    """
+    Создаёт запись о коммерческом предложении (price_snapshot_id — снимок цен расчёта, core.prices;
+    waste — строки отхода, если КП считалось по листам).
+    """
     deliveries_json = json.dumps(deliveries, ensure_ascii=False) if deliveries is not None else None
+    waste_json = json.dumps(waste, ensure_ascii=False) if waste else None
     items_json = json.dumps(items, ensure_ascii=False) if items is not None else None
 
     obj = models.Proposal(
@@ -28,17 +34,20 @@ def create_proposal(db: Session, proposal_number: str, total: float, pdf_path: s
         pdf_path=str(pdf_path),
         items_json=items_json,
         deliveries_json=deliveries_json,
+        waste_json=waste_json,
         manager=manager,
-        status=status
+        status=status,
+        price_snapshot_id=price_snapshot_id,
     )
     db.add(obj)
     db.commit()
     db.refresh(obj)
     logger.info(
-        "proposal_created | proposal_number=%s | total=%.2f | items_count=%s",
+        "proposal_created | proposal_number=%s | total=%.2f | items_count=%s | price_snapshot=%s",
         proposal_number,
         total,
         len(items) if items else 0,
+        price_snapshot_id,
     )
     return obj
 
@@ -51,4 +60,12 @@ def get_proposal(db: Session, proposal_id: int):
     return db.query(models.Proposal).filter(models.Proposal.id == proposal_id).first()
 
 def get_proposal_by_number(db: Session, proposal_number: str):
-    return db.query(models.Proposal).filter(models.Proposal.proposal_number == proposal_number).first()
\ No newline at end of file
+    return db.query(models.Proposal).filter(models.Proposal.proposal_number == proposal_number).first()
+
+def get_proposal_by_pdf(db: Session, filename: str):
+    """КП по имени PDF-файла (pdf_path хранится как имя файла или путь)."""
+    return (
+        db.query(models.Proposal)
+        .filter(models.Proposal.pdf_path.in_([filename, str(settings.PDF_DIR / filename)]))
+        .first()
+    )
@@ -0,0 +1,81 @@
+"""
+Асинхронные версии функций app.crud для async-обработчиков (сессия — app.db.AsyncSessionLocal).
+Имена и аргументы те же, что в app.crud; создание КП — сама app.crud.create_proposal через run_sync.
+"""
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import load_only
+
+from app import crud, models
+from app.config import settings
+from app.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# Колонки для списка КП: items_json/deliveries_json (основной объём строки) списку не нужны
+_LIST_COLUMNS = (
+    models.Proposal.id,
+    models.Proposal.proposal_number,
+    models.Proposal.created_at,
+    models.Proposal.total,
+    models.Proposal.pdf_path,
+    models.Proposal.manager,
+    models.Proposal.status,
+)
+
+
+async def create_proposal(db: AsyncSession, proposal_number: str, total: float, pdf_path: str,
+                          items: list, deliveries: list = None, manager: str | None = None,
+                          status: str = "draft", price_snapshot_id: str | None = None,
+                          waste: list | None = None) -> models.Proposal:
+    """
+    Создаёт запись о коммерческом предложении: app.crud.create_proposal на синхронном фасаде сессии
+    (db.run_sync) — одна реализация записи КП для sync- и async-обработчиков.
+    """
+    return await db.run_sync(
+        crud.create_proposal,
+        proposal_number=proposal_number,
+        total=total,
+        pdf_path=pdf_path,
+        items=items,
+        deliveries=deliveries,
+        manager=manager,
+        status=status,
+        price_snapshot_id=price_snapshot_id,
+        waste=waste,
+    )
+
+
+async def list_proposals(db: AsyncSession, limit: int = 50, offset: int = 0) -> list[models.Proposal]:
+    """
+    Список КП, новые первыми. Загружаются только колонки для списка (_LIST_COLUMNS):
+    обращение к items_json/deliveries_json у этих объектов — ошибка, для них есть get_proposal().
+    """
+    result = await db.execute(
+        select(models.Proposal)
+        .options(load_only(*_LIST_COLUMNS, raiseload=True))
+        .order_by(models.Proposal.created_at.desc())
+        .offset(offset)
+        .limit(limit)
+    )
+    return list(result.scalars())
+
+
+async def get_proposal(db: AsyncSession, proposal_id: int) -> models.Proposal | None:
+    """Получить КП по id."""
+    return await db.get(models.Proposal, proposal_id)
+
+
+async def get_proposal_by_number(db: AsyncSession, proposal_number: str) -> models.Proposal | None:
+    result = await db.execute(select(models.Proposal).where(models.Proposal.proposal_number == proposal_number))
+    return result.scalars().first()
+
+
+async def get_proposal_by_pdf(db: AsyncSession, filename: str) -> models.Proposal | None:
+    """КП по имени PDF-файла (pdf_path хранится как имя файла или путь)."""
+    result = await db.execute(
+        select(models.Proposal)
+        .where(models.Proposal.pdf_path.in_([filename, str(settings.PDF_DIR / filename)]))
+    )
+    return result.scalars().first()
@@ -1,8 +1,17 @@
 """
 SQLite + SQLAlchemy. Путь к БД берётся из app.config.settings.DATA_DIR.
+
+Две точки входа к одной БД:
+- SessionLocal — синхронная сессия (скрипты, воркеры пулов, синхронные обработчики);
+- AsyncSessionLocal — асинхронная (драйвер aiosqlite) для async-обработчиков: запрос к БД выполняется
+  в потоке соединения aiosqlite и не блокирует цикл событий. Функции — app.crud_async.
+
+БД в режиме WAL: чтение истории не мешает записи новых КП и наоборот (в режиме журнала отката
+фиксация записи ждёт, пока закончатся все читатели, — под потоком просмотров запись «голодает»).
 """
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 
 from app.config import settings
@@ -12,6 +21,7 @@ DATA_DIR.mkdir(parents=True, exist_ok=True)
 
 DB_PATH = DATA_DIR / "app.db"
 DATABASE_URL = f"sqlite:///{DB_PATH}"
+ASYNC_DATABASE_URL = f"sqlite+aiosqlite:///{DB_PATH}"
 
 engine = create_engine(
     DATABASE_URL,
@@ -21,3 +31,19 @@ engine = create_engine(
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
+
+async_engine = create_async_engine(ASYNC_DATABASE_URL, echo=False)
+
+
+@event.listens_for(engine, "connect")
+@event.listens_for(async_engine.sync_engine, "connect")
+def _sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    # В WAL synchronous=NORMAL не теряет целостность при сбое, только последние транзакции при отказе питания
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
+
+# expire_on_commit=False: объекты читаются шаблонами после закрытия сессии — без ленивых запросов
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
@@ -10,6 +10,7 @@ from fastapi.responses import RedirectResponse
 from fastapi.staticfiles import StaticFiles
 
 from app.config import settings
+from app.core import templates
 from app.api.routes import router
 from app.web.manager_routes import router as manager_router
 from app.web.pdf_routes import router as pdf_router
@@ -23,6 +24,7 @@ logger = get_logger(__name__)
 async def lifespan(app: FastAPI):
     """Инициализация при старте приложения."""
     logger.info("application_start | title=%s", settings.PROJECT_NAME)
+    templates.precompile()
     yield
     logger.info("application_shutdown")
 
@@ -1,12 +1,17 @@
 """
 SQLAlchemy-модели.
-Здесь определены простые модели для хранения истории коммерческих предложений (КП).
+Здесь определены простые модели для хранения истории коммерческих предложений (КП),
+индекс PDF-хранилища (core.storage), снимки цен (core.prices), последовательности номеров (core.numbering)
+и ключи идемпотентности (core.idempotency).
 """
 
-from sqlalchemy import Column, Integer, String, DateTime, Float, Text
+from sqlalchemy import BigInteger, Column, Integer, LargeBinary, String, DateTime, Float, Text
 from datetime import datetime
 from app.db import Base
 
+# Статусы КП, после которых PDF больше не меняется (можно кэшировать как immutable)
+FINAL_STATUSES = ("confirmed", "cancelled")
+
 class Proposal(Base):
     __tablename__ = "proposals"
 
@@ -17,5 +22,60 @@ class Proposal(Base):
     pdf_path = Column(String(512), nullable=True)         # относительный/абсолютный путь к файлу
     items_json = Column(Text, nullable=True)              # JSON строки: items
     deliveries_json = Column(Text, nullable=True)         # JSON строки: deliveries
+    waste_json = Column(Text, nullable=True)              # JSON строки: waste (отход при раскрое на листы)
     manager = Column(String(128), nullable=True)          # имя менеджера (опционально)
-    status = Column(String(32), default="draft")          # draft/confirmed/cancelled
\ No newline at end of file
+    status = Column(String(32), default="draft")          # draft/confirmed/cancelled
+    price_snapshot_id = Column(String(32), nullable=True, index=True)  # снимок цен, по которому считалось КП
+
+
+class StoredPdf(Base):
+    """Индекс PDF-хранилища: где лежит файл (шард или архивный бандл), размер и контрольная сумма."""
+    __tablename__ = "stored_pdfs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    filename = Column(String(255), unique=True, index=True, nullable=False)
+    rel_path = Column(String(512), nullable=False)        # путь шарда относительно PDF_DIR: YYYY/MM/ab/<filename>
+    size = Column(BigInteger, nullable=False)
+    sha256 = Column(String(64), nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+    archive = Column(String(512), nullable=True)          # бандл относительно PDF_DIR, если файл архивирован
+    archived_at = Column(DateTime, nullable=True)
+
+
+class PriceBlob(Base):
+    """Раздел цен (материалы или услуги): канонический JSON, сжатый zlib; ключ — sha256 содержимого."""
+    __tablename__ = "price_blobs"
+
+    hash = Column(String(64), primary_key=True)
+    data = Column(LargeBinary, nullable=False)
+    size = Column(Integer, nullable=False)                # размер до сжатия
+
+
+class PriceSnapshotRecord(Base):
+    """Неизменяемый снимок цен: ссылки на блобы материалов и услуг."""
+    __tablename__ = "price_snapshots"
+
+    id = Column(String(32), primary_key=True)
+    materials_hash = Column(String(64), nullable=False)
+    services_hash = Column(String(64), nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+class NumberSequence(Base):
+    """Последовательность номеров: next_value — первый ещё не выданный номер (воркеры берут блоками)."""
+    __tablename__ = "number_sequences"
+
+    name = Column(String(64), primary_key=True)
+    next_value = Column(BigInteger, nullable=False)
+
+
+class IdempotencyKey(Base):
+    """Ключ идемпотентности запроса на создание КП: повтор с тем же ключом возвращает сохранённый результат."""
+    __tablename__ = "idempotency_keys"
+
+    key = Column(String(128), primary_key=True)
+    endpoint = Column(String(64), nullable=False)
+    fingerprint = Column(String(64), nullable=False)      # sha256 тела запроса
+    status = Column(String(16), nullable=False)           # pending/done
+    response_json = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
@@ -1,64 +1,66 @@
 """
 История КП: список /manager/history, просмотр /manager/history/{id}, скачивание PDF.
+Скачивание поддерживает ETag/304 и Range (web.http_cache).
+Обработчики асинхронные, БД — через app.db.AsyncSessionLocal и app.crud_async (без занятия потоков пула).
 Ошибки и отсутствующие файлы логируются.
 """
 
 import json
 
 from fastapi import APIRouter, Request
-from fastapi.responses import FileResponse, HTMLResponse
-from fastapi.templating import Jinja2Templates
+from fastapi.responses import HTMLResponse
 
-from app import crud
-from app.config import settings
-from app.db import SessionLocal
+from app import crud_async
+from app.core import storage
+from app.db import AsyncSessionLocal
+from app.models import FINAL_STATUSES
 from app.logging_config import get_logger
+from app.web.http_cache import stored_pdf_response_async
+from app.web.templating import templates
 
 router = APIRouter()
 logger = get_logger(__name__)
-templates = Jinja2Templates(directory=str(settings.TEMPLATES_DIR))
 
 
 @router.get("/manager/history", response_class=HTMLResponse)
-def history_list(request: Request):
-    db = SessionLocal()
-    try:
-        items = crud.list_proposals(db, limit=200)
-        return templates.TemplateResponse(
-            "history_list.html",
-            {"request": request, "items": items},
-        )
-    finally:
-        db.close()
+async def history_list(request: Request):
+    async with AsyncSessionLocal() as db:
+        items = await crud_async.list_proposals(db, limit=200)
+    return templates.TemplateResponse(
+        "history_list.html",
+        {"request": request, "items": items},
+    )
 
 
 @router.get("/manager/history/{proposal_id}", response_class=HTMLResponse)
-def history_view(request: Request, proposal_id: int):
-    db = SessionLocal()
-    try:
-        prop = crud.get_proposal(db, proposal_id)
-        if not prop:
-            logger.warning("history_view | proposal_not_found | proposal_id=%s", proposal_id)
-            return HTMLResponse(content="Proposal not found", status_code=404)
-        items = json.loads(prop.items_json) if prop.items_json else []
-        deliveries = json.loads(prop.deliveries_json) if prop.deliveries_json else []
-        return templates.TemplateResponse(
-            "history_view.html",
-            {
-                "request": request,
-                "prop": prop,
-                "items": items,
-                "deliveries": deliveries,
-            },
-        )
-    finally:
-        db.close()
+async def history_view(request: Request, proposal_id: int):
+    async with AsyncSessionLocal() as db:
+        prop = await crud_async.get_proposal(db, proposal_id)
+    if not prop:
+        logger.warning("history_view | proposal_not_found | proposal_id=%s", proposal_id)
+        return HTMLResponse(content="Proposal not found", status_code=404)
+    items = json.loads(prop.items_json) if prop.items_json else []
+    deliveries = json.loads(prop.deliveries_json) if prop.deliveries_json else []
+    waste = json.loads(prop.waste_json) if prop.waste_json else []
+    return templates.TemplateResponse(
+        "history_view.html",
+        {
+            "request": request,
+            "prop": prop,
+            "items": items,
+            "deliveries": deliveries,
+            "waste": waste,
+        },
+    )
 
 
 @router.get("/manager/history/download/{filename}")
-def history_download(filename: str):
-    fpath = settings.PDF_DIR / filename
-    if not fpath.exists():
+async def history_download(request: Request, filename: str):
+    async with AsyncSessionLocal() as db:
+        resolved = await storage.resolve_pdf_async(db, filename)
+        prop = await crud_async.get_proposal_by_pdf(db, filename) if resolved else None
+    if resolved is None:
         logger.warning("history_download | file_not_found | filename=%s", filename)
         return HTMLResponse(content="File not found", status_code=404)
-    return FileResponse(path=fpath, media_type="application/pdf", filename=filename)
+    immutable = prop is not None and prop.status in FINAL_STATUSES
+    return await stored_pdf_response_async(request, resolved, immutable=immutable)
@@ -0,0 +1,247 @@
+"""
+HTTP-кэширование: ETag/Last-Modified, условные запросы (304) и Range-запросы (206/416).
+Используется страницами менеджера и скачиванием PDF (pdf_routes, history_routes).
+"""
+
+import hashlib
+import os
+from email.utils import formatdate, parsedate_to_datetime
+from pathlib import Path
+from typing import Callable
+from urllib.parse import quote
+
+from fastapi import Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, Response, StreamingResponse
+
+# Финализированные КП не меняются — кэш без перепроверки на год, только в браузере клиента:
+# это документы конкретного клиента, общим прокси/CDN их хранить нельзя
+IMMUTABLE_CACHE_CONTROL = "private, max-age=31536000, immutable"
+# Остальное можно хранить, но перед использованием — перепроверка по ETag
+REVALIDATE_CACHE_CONTROL = "private, no-cache"
+
+_CHUNK_SIZE = 64 * 1024
+
+
+def make_etag(*parts) -> str:
+    """Сильный ETag из произвольных частей (версия каталога, размер, mtime, контрольная сумма...)."""
+    h = hashlib.blake2b(digest_size=12)
+    for part in parts:
+        h.update(str(part).encode("utf-8"))
+        h.update(b"\x00")
+    return f'"{h.hexdigest()}"'
+
+
+def http_date(timestamp: float) -> str:
+    return formatdate(timestamp, usegmt=True)
+
+
+def _etag_list(header: str) -> list[str]:
+    return [t.strip() for t in header.split(",") if t.strip()]
+
+
+def _weak_match(a: str, b: str) -> bool:
+    """Слабое сравнение ETag (RFC 9110): префикс W/ не учитывается."""
+    return a.removeprefix("W/") == b.removeprefix("W/")
+
+
+def _parse_http_date(value: str) -> float | None:
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+def is_not_modified(request: Request, etag: str, last_modified: float | None = None) -> bool:
+    """
+    Проверяет If-None-Match / If-Modified-Since. If-None-Match имеет приоритет;
+    If-Modified-Since сравнивается с точностью до секунды (точность HTTP-даты).
+    """
+    inm = request.headers.get("if-none-match")
+    if inm is not None:
+        tags = _etag_list(inm)
+        return "*" in tags or any(_weak_match(t, etag) for t in tags)
+    ims = request.headers.get("if-modified-since")
+    if ims and last_modified is not None:
+        since = _parse_http_date(ims)
+        return since is not None and int(last_modified) <= int(since)
+    return False
+
+
+def not_modified_response(headers: dict[str, str]) -> Response:
+    return Response(status_code=304, headers=headers)
+
+
+def cached_page(request: Request, etag: str, render: Callable[[], Response]) -> Response:
+    """Страница с ETag: при совпадении — 304 без рендеринга, иначе render() с валидаторами."""
+    headers = {"ETag": etag, "Cache-Control": REVALIDATE_CACHE_CONTROL}
+    if is_not_modified(request, etag):
+        return not_modified_response(headers)
+    response = render()
+    response.headers.update(headers)
+    return response
+
+
+def content_disposition(filename: str) -> str:
+    quoted = quote(filename)
+    if quoted != filename:
+        return f"attachment; filename*=utf-8''{quoted}"
+    return f'attachment; filename="{filename}"'
+
+
+def parse_range(header: str, size: int) -> tuple[int, int] | None | bool:
+    """
+    Разбирает Range: bytes=... для одного диапазона.
+    Возвращает (start, end) включительно; None — заголовок игнорируется (не bytes или несколько диапазонов);
+    False — диапазон невыполним (416).
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, sep, last = spec.strip().partition("-")
+    if not sep:
+        return None
+    try:
+        if first == "":
+            # Суффикс: последние N байт
+            length = int(last)
+            if length <= 0:
+                return False
+            return max(0, size - length), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if start >= size:
+        return False
+    if end < start:
+        return None
+    return start, min(end, size - 1)
+
+
+def _if_range_matches(request: Request, etag: str, last_modified: float) -> bool:
+    """If-Range: диапазон отдаётся, только если представление не изменилось (иначе — весь файл)."""
+    value = request.headers.get("if-range")
+    if value is None:
+        return True
+    value = value.strip()
+    if value.startswith('"') or value.startswith("W/"):
+        # Для If-Range нужно сильное сравнение
+        return not value.startswith("W/") and value == etag
+    since = _parse_http_date(value)
+    return since is not None and int(last_modified) == int(since)
+
+
+def _iter_file(path: Path, start: int, length: int):
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = f.read(min(_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def _validators(size: int, mtime: float, etag: str, immutable: bool) -> dict[str, str]:
+    return {
+        "ETag": etag,
+        "Last-Modified": http_date(mtime),
+        "Cache-Control": IMMUTABLE_CACHE_CONTROL if immutable else REVALIDATE_CACHE_CONTROL,
+        "Accept-Ranges": "bytes",
+    }
+
+
+def _range_or_early(request: Request, size: int, mtime: float, etag: str,
+                    headers: dict[str, str]) -> tuple[Response | None, tuple[int, int] | None]:
+    """
+    Общая часть: 304 на условный запрос, 416 на невыполнимый диапазон.
+    Возвращает (готовый ответ или None, диапазон (start, end) или None — отдавать целиком).
+    """
+    if is_not_modified(request, etag, mtime):
+        return not_modified_response(headers), None
+    range_header = request.headers.get("range")
+    if range_header and _if_range_matches(request, etag, mtime):
+        byte_range = parse_range(range_header, size)
+        if byte_range is False:
+            headers["Content-Range"] = f"bytes */{size}"
+            return Response(status_code=416, headers=headers), None
+        if byte_range is not None:
+            start, end = byte_range
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+            return None, byte_range
+    return None, None
+
+
+def file_response(
+    request: Request,
+    path: Path,
+    filename: str,
+    media_type: str = "application/pdf",
+    etag: str | None = None,
+    immutable: bool = False,
+) -> Response:
+    """
+    Отдаёт файл с ETag/Last-Modified/Accept-Ranges: 304 на условный запрос, 206/416 на Range.
+    По умолчанию ETag строится из имени, размера и mtime файла.
+    """
+    st = os.stat(path)
+    etag = etag or make_etag(filename, st.st_size, st.st_mtime_ns)
+    headers = _validators(st.st_size, st.st_mtime, etag, immutable)
+    early, byte_range = _range_or_early(request, st.st_size, st.st_mtime, etag, headers)
+    if early is not None:
+        return early
+    if byte_range is not None:
+        start, end = byte_range
+        length = end - start + 1
+        headers.update({"Content-Length": str(length), "Content-Disposition": content_disposition(filename)})
+        return StreamingResponse(
+            _iter_file(path, start, length), status_code=206, media_type=media_type, headers=headers,
+        )
+    if request.headers.get("range"):
+        # Range проигнорирован (несколько диапазонов, некорректный, If-Range не совпал) — весь файл.
+        # FileResponse не используем: новые версии Starlette разбирают Range сами и ответили бы иначе.
+        headers.update({"Content-Length": str(st.st_size), "Content-Disposition": content_disposition(filename)})
+        return StreamingResponse(_iter_file(path, 0, st.st_size), media_type=media_type, headers=headers)
+    return FileResponse(path=path, media_type=media_type, filename=filename, headers=headers, stat_result=st)
+
+
+def bytes_response(
+    request: Request,
+    data: bytes,
+    filename: str,
+    mtime: float,
+    etag: str,
+    media_type: str = "application/pdf",
+    immutable: bool = False,
+) -> Response:
+    """То же, что file_response, для содержимого в памяти (например, файл из архивного бандла)."""
+    headers = _validators(len(data), mtime, etag, immutable)
+    early, byte_range = _range_or_early(request, len(data), mtime, etag, headers)
+    if early is not None:
+        return early
+    headers["Content-Disposition"] = content_disposition(filename)
+    if byte_range is not None:
+        start, end = byte_range
+        return Response(content=data[start:end + 1], status_code=206, media_type=media_type, headers=headers)
+    return Response(content=data, media_type=media_type, headers=headers)
+
+
+def stored_pdf_response(request: Request, resolved, immutable: bool = False) -> Response:
+    """Ответ для PDF из хранилища (core.storage.ResolvedPdf): ETag по контрольной сумме, если она известна."""
+    etag = f'"{resolved.sha256[:32]}"' if resolved.sha256 else make_etag(resolved.filename, resolved.size, resolved.mtime)
+    if resolved.path is not None:
+        return file_response(request, resolved.path, resolved.filename, etag=etag, immutable=immutable)
+    if is_not_modified(request, etag, resolved.mtime):
+        return not_modified_response(_validators(resolved.size, resolved.mtime, etag, immutable))
+    return bytes_response(
+        request, resolved.read_bytes(), resolved.filename, resolved.mtime, etag, immutable=immutable,
+    )
+
+
+async def stored_pdf_response_async(request: Request, resolved, immutable: bool = False) -> Response:
+    """stored_pdf_response для async-обработчиков: член архивного бандла распаковывается в потоке, а не в цикле событий."""
+    if resolved.archive is not None:
+        return await run_in_threadpool(stored_pdf_response, request, resolved, immutable)
+    return stored_pdf_response(request, resolved, immutable=immutable)
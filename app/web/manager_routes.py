@@ -1,32 +1,44 @@
 """
-Маршруты менеджера: форма /manager, превью /manager/preview.
+Маршруты менеджера: форма /manager, превью /manager/preview, живой расчёт WebSocket /manager/live.
 Форма отправляет JSON с items; расчёт через calc(), данные для PDF — response_to_pdf_data().
 Ошибки и действия менеджера логируются.
 """
 
+import asyncio
 import json
+import uuid
 
-from fastapi import APIRouter, Request, Form
+from fastapi import APIRouter, Request, Form, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import HTMLResponse
-from fastapi.templating import Jinja2Templates
 
 from app.config import settings
-from app.core.calculator import calc, load_products, response_to_pdf_data
+from app.core.calculator import calc, response_to_pdf_data
+from app.core import prices
+from app.core.catalog import catalog_version
+from app.core.live_quote import LiveQuote
+from app.core.templates import template_version
 from app.core.schemas import CalcRequest
+from app.db import AsyncSessionLocal
 from app.logging_config import get_logger
+from app.web.http_cache import cached_page, make_etag
+from app.web.templating import templates
 
 router = APIRouter()
-templates = Jinja2Templates(directory=str(settings.TEMPLATES_DIR))
 logger = get_logger(__name__)
 
 
 @router.get("/manager", response_class=HTMLResponse)
 async def manager_form(request: Request):
-    """Форма: добавление/удаление товаров, отправка JSON на превью."""
-    products = load_products()
-    return templates.TemplateResponse(
-        "manager_form.html",
-        {"request": request, "products": products},
+    """
+    Форма: добавление/удаление товаров, отправка JSON на превью. Товары подгружаются поиском /api/products/search.
+    ETag зависит от версии каталога и шаблона: повторный заход отдаёт 304 без рендеринга.
+    """
+    etag = make_etag(catalog_version(), template_version("manager_form.html"))
+    return cached_page(
+        request,
+        etag,
+        lambda: templates.TemplateResponse("manager_form.html", {"request": request}),
     )
 
 
@@ -42,12 +54,17 @@ async def manager_preview(request: Request, data_json: str = Form(...)):
 
     try:
         req = CalcRequest(items=items_payload)
-        result = calc(req)
-        data_for_pdf = response_to_pdf_data(result)
+        snapshot = prices.current_snapshot()
+        result = calc(req, snapshot)
+        data_for_pdf = response_to_pdf_data(result, req)
     except Exception as e:
         logger.error("manager_preview | calculation_error | %s", str(e), exc_info=True)
         return HTMLResponse(content=f"Calculation error: {e}", status_code=400)
 
+    # Снимок цен сохраняется до создания КП, чтобы /manager/pdf мог сослаться на него из любого воркера
+    async with AsyncSessionLocal() as db:
+        await prices.ensure_stored_async(db, snapshot)
+
     logger.info(
         "manager_preview | success | items_count=%s | total=%.2f",
         len(items_payload),
@@ -61,7 +78,89 @@ async def manager_preview(request: Request, data_json: str = Form(...)):
             "result": result,
             "items": data_for_pdf["items"],
             "deliveries": data_for_pdf["deliveries"],
+            "waste": data_for_pdf["waste"],
             "total": data_for_pdf["total"],
             "data_json": data_json_out,
+            # Один ключ на превью: повторная отправка формы вернёт уже созданное КП
+            "idempotency_key": uuid.uuid4().hex,
         },
     )
+
+
+# Максимальный размер одного сообщения формы (одно изделие — сотни байт)
+LIVE_MAX_MESSAGE_BYTES = 64 * 1024
+
+
+@router.websocket("/manager/live")
+async def manager_live(websocket: WebSocket):
+    """
+    Живой расчёт: форма шлёт правки изделий ({"op": "set"|"count", ...}, см. LiveQuote.apply),
+    сервер сливает их, выжидает паузу во вводе (LIVE_DEBOUNCE_MS, но не дольше LIVE_MAX_WAIT_MS)
+    и присылает пересчитанные итоги. На соединение — не больше одного расчёта одновременно:
+    правки, пришедшие во время расчёта или пока клиент не принял ответ, сливаются в следующий пересчёт,
+    поэтому быстрый ввод не копит очередь устаревших расчётов.
+    В сокет пишет только основной цикл: ошибки разбора reader() складывает в errors.
+    """
+    await websocket.accept()
+    quote = LiveQuote()
+    edited = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    last_edit = 0.0
+    errors: list[str] = []
+
+    async def reader():
+        nonlocal last_edit
+        while True:
+            raw = await websocket.receive_text()
+            try:
+                if len(raw) > LIVE_MAX_MESSAGE_BYTES:
+                    raise ValueError("Слишком большое сообщение")
+                message = json.loads(raw)
+                if not isinstance(message, dict):
+                    raise ValueError("Ожидается JSON-объект")
+                quote.apply(message)
+            except ValueError as e:
+                errors.append(str(e))
+                edited.set()
+                continue
+            last_edit = loop.time()
+            edited.set()
+
+    debounce = settings.LIVE_DEBOUNCE_MS / 1000
+    max_wait = settings.LIVE_MAX_WAIT_MS / 1000
+    reader_task = asyncio.create_task(reader())
+    logger.info("manager_live | connected")
+    try:
+        while True:
+            edited_wait = asyncio.create_task(edited.wait())
+            done, _ = await asyncio.wait({reader_task, edited_wait}, return_when=asyncio.FIRST_COMPLETED)
+            if reader_task in done:
+                edited_wait.cancel()
+                reader_task.result()  # WebSocketDisconnect или ошибка чтения
+                return
+            # Дебаунс: ждём паузы во вводе, но при непрерывном вводе считаем не реже max_wait
+            first_edit = loop.time()
+            while quote.has_pending() and not reader_task.done():
+                now = loop.time()
+                quiet_left = last_edit + debounce - now
+                if quiet_left <= 0 or now - first_edit >= max_wait:
+                    break
+                await asyncio.sleep(min(quiet_left, max_wait - (now - first_edit)))
+            edited.clear()
+            while errors:
+                await websocket.send_json({"type": "error", "detail": errors.pop(0)})
+            if not quote.has_pending():
+                continue
+            batch, count, seq = quote.take_pending()
+            try:
+                result = await run_in_threadpool(quote.recalculate, batch, count, seq)
+            except Exception as e:
+                logger.error("manager_live | calculation_error | %s", str(e), exc_info=True)
+                await websocket.send_json({"type": "error", "seq": seq, "detail": str(e)})
+                continue
+            await websocket.send_json(result)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        reader_task.cancel()
+        logger.info("manager_live | disconnected | items=%s", len(quote.items))
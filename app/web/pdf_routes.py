@@ -1,76 +1,132 @@
 """
-Генерация PDF из превью: POST /manager/pdf, скачивание /manager/pdf/download/{filename}.
-Пути и ассеты — из config и core.assets. Действия и ошибки логируются.
+Генерация PDF из превью: POST /manager/pdf, скачивание /manager/pdf/download/{filename} (ETag/304, Range).
+Повторная отправка формы превью (двойной клик, обновление страницы) не создаёт второе КП: ключ идемпотентности
+из скрытого поля idempotency_key (или заголовка Idempotency-Key) — core.idempotency, номера — core.numbering.
+БД — через асинхронную сессию (app.db.AsyncSessionLocal, app.crud_async): обработчики не блокируют цикл событий.
+HTML КП — core.pdf_generator.render_proposal_html (общий с /api/pdf и перегенерацией). Действия и ошибки логируются.
 """
 
 import json
 from datetime import datetime
 
 from fastapi import APIRouter, Request, Form
-from fastapi.responses import FileResponse, HTMLResponse
-from fastapi.templating import Jinja2Templates
+from fastapi.responses import HTMLResponse
 from weasyprint import HTML
 
-from app import crud
-from app.config import settings, DELIVERY_TERMS, PAYMENT_TERMS, ADDITIONAL_TERMS, FINAL_TERMS, get_company_info
-from app.core.assets import get_logo_file_uri, get_works_file_uris
-from app.db import SessionLocal
+from app import crud_async
+from app.config import settings
+from app.core import idempotency, prices, storage
+from app.core.numbering import next_proposal_number_async
+from app.core.pdf_generator import render_proposal_html
+from app.core.render_queue import QueueRejected, client_key, pdf_queue
+from app.db import AsyncSessionLocal
+from app.models import FINAL_STATUSES
 from app.logging_config import get_logger
+from app.web.http_cache import stored_pdf_response_async
+from app.web.templating import templates
 
 router = APIRouter()
 logger = get_logger(__name__)
 
 settings.PDF_DIR.mkdir(parents=True, exist_ok=True)
-templates = Jinja2Templates(directory=str(settings.TEMPLATES_DIR))
+
+
+def _ready_page(request: Request, proposal_number: str, pdf_filename: str) -> HTMLResponse:
+    return templates.TemplateResponse(
+        "manager_pdf_ready.html",
+        {
+            "request": request,
+            "proposal_number": proposal_number,
+            "pdf_filename": pdf_filename,
+        },
+    )
 
 
 @router.post("/manager/pdf")
-async def manager_generate_pdf(request: Request, data_json: str = Form(...)):
-    """Генерация PDF по данным превью, сохранение в БД, ответ со страницей «Готово»."""
+async def manager_generate_pdf(
+    request: Request,
+    data_json: str = Form(...),
+    idempotency_key: str | None = Form(None),
+):
+    """
+    Генерация PDF по данным превью, сохранение в БД, ответ со страницей «Готово».
+    Рендеринг — через очередь core.render_queue: при перегрузке 429/503 с Retry-After.
+    Повтор с тем же ключом идемпотентности возвращает уже созданное КП.
+    """
     try:
         data = json.loads(data_json)
     except Exception as e:
         logger.error("manager_pdf | invalid_json | %s", str(e), exc_info=True)
         return HTMLResponse(content=f"JSON error: {e}", status_code=400)
 
+    try:
+        key = idempotency.normalize_key(idempotency_key or request.headers.get("Idempotency-Key"))
+        if key:
+            previous = await idempotency.acquire(key, "manager_pdf", idempotency.fingerprint(data_json))
+            if previous is not None:
+                return _ready_page(request, previous["proposal_number"], previous["pdf_filename"])
+    except idempotency.IdempotencyConflict as e:
+        logger.warning("manager_pdf | idempotency_conflict | status=%s | %s", e.status_code, e.detail)
+        return HTMLResponse(content=e.detail, status_code=e.status_code)
+
+    try:
+        proposal_number, pdf_filename = await _create_proposal(request, data)
+    except QueueRejected as e:
+        if key:
+            await idempotency.release(key)
+        return HTMLResponse(
+            content="Сервер занят генерацией других КП, повторите через несколько секунд.",
+            status_code=e.status_code,
+            headers={"Retry-After": str(e.retry_after)},
+        )
+    except BaseException:
+        if key:
+            await idempotency.release(key)
+        raise
+    if key:
+        await idempotency.complete(key, {"proposal_number": proposal_number, "pdf_filename": pdf_filename})
+    return _ready_page(request, proposal_number, pdf_filename)
+
+
+async def _create_proposal(request: Request, data: dict) -> tuple[str, str]:
+    """Номер → рендеринг в очереди → хранилище и БД. Возвращает (номер КП, имя PDF). Raises QueueRejected."""
     items = data.get("items", [])
     deliveries = data.get("deliveries", [])
+    waste = data.get("waste", [])
     total = data.get("total", 0)
+    price_snapshot_id = data.get("price_snapshot_id")
 
-    timestamp = datetime.now().strftime("%d%m%Y%H%M%S")
-    proposal_number = f"КП_{timestamp}"
+    proposal_number = await next_proposal_number_async()
     pdf_filename = f"{proposal_number}.pdf"
-    pdf_path = settings.PDF_DIR / pdf_filename
-
-    html = templates.get_template("commercial_blue.html").render(
-        items=items,
-        deliveries=deliveries,
-        total=total,
-        date=datetime.now().strftime("%d.%m.%Y"),
-        proposal_number=proposal_number,
-        company_info=get_company_info(),
-        logo=get_logo_file_uri(),
-        works=get_works_file_uris(limit=8),
-        delivery_terms=DELIVERY_TERMS,
-        payment_terms=PAYMENT_TERMS,
-        additional_terms=ADDITIONAL_TERMS,
-        final_terms=FINAL_TERMS,
+
+    html = render_proposal_html(
+        items, deliveries, total, proposal_number, datetime.now().strftime("%d.%m.%Y"), waste=waste
     )
 
-    HTML(string=html).write_pdf(pdf_path)
+    pdf_bytes = await pdf_queue.run(client_key(request), lambda: HTML(string=html).write_pdf())
 
-    db = SessionLocal()
-    try:
-        crud.create_proposal(
-            db=db,
-            proposal_number=proposal_number,
-            total=total,
-            pdf_path=pdf_filename,
-            items=items,
-            deliveries=deliveries,
-        )
-    finally:
-        db.close()
+    async with AsyncSessionLocal() as db:
+        if price_snapshot_id and await prices.get_snapshot_async(db, price_snapshot_id) is None:
+            logger.warning("manager_pdf | unknown_price_snapshot | id=%s", price_snapshot_id)
+            price_snapshot_id = None
+        await storage.save_pdf_async(db, pdf_filename, pdf_bytes)
+        try:
+            await crud_async.create_proposal(
+                db=db,
+                proposal_number=proposal_number,
+                total=total,
+                pdf_path=pdf_filename,
+                items=items,
+                deliveries=deliveries,
+                waste=waste,
+                price_snapshot_id=price_snapshot_id,
+            )
+        except BaseException:
+            # Без записи КП файл никто не найдёт в истории — убираем его из хранилища
+            logger.error("manager_pdf | proposal_not_saved | proposal_number=%s | file=%s", proposal_number, pdf_filename)
+            await db.rollback()
+            await storage.delete_pdf_async(db, pdf_filename)
+            raise
 
     logger.info(
         "manager_pdf | created | proposal_number=%s | total=%.2f | file=%s",
@@ -78,25 +134,17 @@ async def manager_generate_pdf(request: Request, data_json: str = Form(...)):
         total,
         pdf_filename,
     )
-    return templates.TemplateResponse(
-        "manager_pdf_ready.html",
-        {
-            "request": request,
-            "proposal_number": proposal_number,
-            "pdf_filename": pdf_filename,
-        },
-    )
+    return proposal_number, pdf_filename
 
 
 @router.get("/manager/pdf/download/{filename}")
-async def manager_download_pdf(filename: str):
-    """Скачивание PDF по имени файла."""
-    file_path = settings.PDF_DIR / filename
-    if not file_path.exists():
+async def manager_download_pdf(request: Request, filename: str):
+    """Скачивание PDF по имени файла: ETag/Last-Modified, 304 на условный запрос, Range."""
+    async with AsyncSessionLocal() as db:
+        resolved = await storage.resolve_pdf_async(db, filename)
+        prop = await crud_async.get_proposal_by_pdf(db, filename) if resolved else None
+    if resolved is None:
         logger.warning("manager_pdf_download | file_not_found | filename=%s", filename)
         return HTMLResponse(content="File not found", status_code=404)
-    return FileResponse(
-        path=file_path,
-        media_type="application/pdf",
-        filename=filename,
-    )
+    immutable = prop is not None and prop.status in FINAL_STATUSES
+    return await stored_pdf_response_async(request, resolved, immutable=immutable)
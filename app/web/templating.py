@@ -0,0 +1,10 @@
+"""
+Общий Jinja2Templates для маршрутов менеджера, PDF и истории: поверх единого окружения core.templates
+(кэш байткода, без auto_reload в production, предкомпиляция при старте).
+"""
+
+from fastapi.templating import Jinja2Templates
+
+from app.core.templates import env
+
+templates = Jinja2Templates(env=env)
@@ -0,0 +1,125 @@
+"""
+Бенчмарк загрузки каталога: текстовый загрузчик (products.txt + JSON) против бинарного mmap-каталога.
+Генерирует синтетический каталог на N товаров во временном каталоге и для каждого загрузчика
+в отдельном процессе меряет время загрузки, время 10k поисков по ключу и прирост RSS:
+приватной памяти (anon) и страниц файла (file — у mmap общие для всех воркеров).
+
+Usage:
+    python scripts/bench_catalog_load.py            # 100 000 товаров
+    python scripts/bench_catalog_load.py --products 20000 --repeat 5
+"""
+
+import argparse
+import json
+import random
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+# Добавляем корень проекта в PYTHONPATH
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(BASE_DIR))
+
+# Код замера выполняется в чистом подпроцессе, чтобы RSS не смешивался между загрузчиками
+_PROBE = r"""
+import json, os, random, sys, time
+sys.path.insert(0, sys.argv[1])
+from app.core.catalog_bin import BinaryCatalog, parse_products_txt
+
+def rss_kib():
+    # RssAnon — приватная память процесса; RssFile — страницы файлов (для mmap общие между воркерами)
+    vals = {}
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(("RssAnon:", "RssFile:")):
+                name, value = line.split(":")
+                vals[name] = int(value.split()[0])
+    return vals
+
+mode, data_dir = sys.argv[2], sys.argv[3]
+keys = json.loads(sys.stdin.read())
+before = rss_kib()
+t0 = time.perf_counter()
+if mode == "text":
+    products = parse_products_txt(os.path.join(data_dir, "products.txt"))
+    with open(os.path.join(data_dir, "prices_materials.json"), encoding="utf-8") as f:
+        prices = json.load(f)
+    with open(os.path.join(data_dir, "prices_services.json"), encoding="utf-8") as f:
+        services = json.load(f)
+else:
+    products = BinaryCatalog(os.path.join(data_dir, "catalog.bin"))
+    prices = products.material_prices
+    services = products.services()
+load_s = time.perf_counter() - t0
+t0 = time.perf_counter()
+for k in keys:
+    products[k]["thickness"] * prices[k]
+lookup_s = time.perf_counter() - t0
+after = rss_kib()
+print(json.dumps({"load_s": load_s, "lookup_s": lookup_s,
+                  "anon_kib": after["RssAnon"] - before["RssAnon"], "file_kib": after["RssFile"] - before["RssFile"]}))
+"""
+
+
+def make_catalog(data_dir: Path, n: int) -> list[str]:
+    rnd = random.Random(42)
+    families = ["mirror", "glass"]
+    labels = ["Зеркало стандарт", "Зеркало графит", "Стекло закалённое", "Стекло матовое", "Триплекс", "Оптивайт"]
+    keys = []
+    mat = {}
+    with open(data_dir / "products.txt", "w", encoding="utf-8") as f:
+        for i in range(n):
+            fam = rnd.choice(families)
+            t = rnd.choice([3, 4, 5, 6, 8, 10, 12])
+            key = f"{fam}_sku{i:06d}_{t}mm"
+            f.write(f"{rnd.choice(labels)} арт.{i};{t};{key};{fam}\n")
+            mat[key] = rnd.randint(800, 6000)
+            keys.append(key)
+    with open(data_dir / "prices_materials.json", "w", encoding="utf-8") as f:
+        json.dump(mat, f, ensure_ascii=False, indent=4)
+    with open(BASE_DIR / "data" / "prices_services.json", encoding="utf-8") as src:
+        services = json.load(src)
+    with open(data_dir / "prices_services.json", "w", encoding="utf-8") as f:
+        json.dump(services, f, ensure_ascii=False, indent=4)
+    return keys
+
+
+def probe(mode: str, data_dir: Path, keys: list[str]) -> dict:
+    out = subprocess.run(
+        [sys.executable, "-c", _PROBE, str(BASE_DIR), mode, str(data_dir)],
+        input=json.dumps(keys), check=True, capture_output=True, text=True,
+    )
+    return json.loads(out.stdout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк загрузки каталога")
+    parser.add_argument("--products", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=3, help="Повторов на загрузчик (берётся лучший)")
+    args = parser.parse_args()
+
+    from app.core.catalog_bin import compile_data_dir
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = Path(tmp)
+        keys = make_catalog(data_dir, args.products)
+        sample = random.Random(1).sample(keys, min(10_000, len(keys)))
+        compile_data_dir(data_dir)
+        txt_size = sum((data_dir / n).stat().st_size for n in ("products.txt", "prices_materials.json", "prices_services.json"))
+        bin_size = (data_dir / "catalog.bin").stat().st_size
+
+        print(f"товаров={args.products} | исходники={txt_size / 1024:.0f} KiB | catalog.bin={bin_size / 1024:.0f} KiB")
+        print(f"{'loader':<8} {'load ms':>10} {'10k lookups ms':>15} {'anon +KiB':>10} {'file +KiB':>10}")
+        for mode in ("text", "binary"):
+            runs = [probe(mode, data_dir, sample) for _ in range(args.repeat)]
+            best = min(runs, key=lambda r: r["load_s"])
+            print(
+                f"{mode:<8} {best['load_s'] * 1000:>10.1f} "
+                f"{min(r['lookup_s'] for r in runs) * 1000:>15.1f} "
+                f"{min(r['anon_kib'] for r in runs):>10} {min(r['file_kib'] for r in runs):>10}"
+            )
+
+
+if __name__ == "__main__":
+    main()
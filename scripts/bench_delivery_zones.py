@@ -0,0 +1,128 @@
+"""
+Бенчмарк определения зоны доставки (core.delivery_zones): сеточный индекс против полного перебора
+(луч по всем рёбрам всех многоугольников, затем кольца). Результаты обоих способов сверяются.
+
+Наборы зон: data — data/delivery_zones.json; synthetic — сетка из --zones неправильных многоугольников
+по --vertices вершин вокруг города плюс кольца (как у крупного перевозчика с районной сеткой тарифов).
+Точки — случайные в квадрате ±--radius-km от origin.
+
+Usage:
+    python scripts/bench_delivery_zones.py
+    python scripts/bench_delivery_zones.py --points 100000 --zones 400 --vertices 64
+"""
+
+import argparse
+import math
+import random
+import sys
+import time
+from pathlib import Path
+
+# Добавляем корень проекта в PYTHONPATH
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(BASE_DIR))
+
+from app.config import settings
+from app.core.delivery_zones import ZONES_FILE, ZoneIndex, load_config
+
+ORIGIN = [58.0105, 56.2502]
+
+
+def synthetic_config(zones: int, vertices: int, rng: random.Random) -> dict:
+    """Квадратная сетка районов ~3 км с «рваными» границами + три кольца вокруг."""
+    side = math.ceil(math.sqrt(zones))
+    step_km = 3.0
+    lat_km, lon_km = 110.574, 111.320 * math.cos(math.radians(ORIGIN[0]))
+    config = {"origin": ORIGIN, "cell_km": 0.5, "zones": []}
+    for n in range(zones):
+        cx = (n % side - side / 2 + 0.5) * step_km
+        cy = (n // side - side / 2 + 0.5) * step_km
+        points = []
+        for k in range(vertices):
+            a = 2 * math.pi * k / vertices
+            r = step_km / 2 * rng.uniform(0.75, 1.0)
+            points.append([ORIGIN[0] + (cy + r * math.sin(a)) / lat_km, ORIGIN[1] + (cx + r * math.cos(a)) / lon_km])
+        config["zones"].append({"key": f"district_{n}", "polygon": points})
+    extent = side * step_km / 2
+    for n, (lo, hi) in enumerate([(0, extent * 1.2), (extent * 1.2, extent * 2), (extent * 2, extent * 3)]):
+        config["zones"].append({"key": f"ring_{n}", "min_km": lo, "max_km": hi})
+    return config
+
+
+def brute_force(config: dict, index: ZoneIndex):
+    """Тот же порядок зон, но без сетки: луч по всем рёбрам каждого многоугольника."""
+    polygons = []
+    for zone in config["zones"]:
+        if "polygon" in zone:
+            polygons.append((zone["key"], [index.project(lat, lon) for lat, lon in zone["polygon"]]))
+
+    def resolve(lat: float, lon: float) -> str | None:
+        x, y = index.project(lat, lon)
+        for key, poly in polygons:
+            inside = False
+            for (x1, y1), (x2, y2) in zip(poly, poly[1:] + poly[:1]):
+                if (y1 > y) != (y2 > y) and x < x1 + (y - y1) * (x2 - x1) / (y2 - y1):
+                    inside = not inside
+            if inside:
+                return key
+        d = math.hypot(x, y)
+        for ring in index.rings:
+            if ring.min_km <= d < ring.max_km:
+                return ring.key
+        return None
+
+    return resolve
+
+
+def run(name: str, config: dict, points: list[tuple[float, float]], brute_limit: int):
+    t0 = time.perf_counter()
+    index = ZoneIndex(config)
+    build_ms = (time.perf_counter() - t0) * 1000
+    resolve = index.resolve
+
+    t0 = time.perf_counter()
+    found = [resolve(lat, lon) for lat, lon in points]
+    index_s = time.perf_counter() - t0
+
+    sample = points[:brute_limit]
+    slow = brute_force(config, index)
+    t0 = time.perf_counter()
+    expected = [slow(lat, lon) for lat, lon in sample]
+    brute_s = time.perf_counter() - t0
+    mismatches = sum(1 for a, b in zip(found, expected) if a != b)
+
+    hit = sum(1 for z in found if z is not None)
+    print(f"{name:<10} многоугольников {len(index.keys):>5}, колец {len(index.rings)}, "
+          f"сетка {index.nx}×{index.ny}, сборка {build_ms:,.0f} мс")
+    print(f"  индекс:  {len(points):,} точек за {index_s * 1000:,.0f} мс — "
+          f"{index_s / len(points) * 1e6:.2f} мкс/точку, в зонах {hit / len(points):.1%}")
+    print(f"  перебор: {len(sample):,} точек — {brute_s / len(sample) * 1e6:.1f} мкс/точку "
+          f"(×{(brute_s / len(sample)) / (index_s / len(points)):,.0f}), расхождений: {mismatches}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк зон доставки")
+    parser.add_argument("--points", type=int, default=100_000)
+    parser.add_argument("--zones", type=int, default=400, help="Многоугольников в синтетическом наборе")
+    parser.add_argument("--vertices", type=int, default=64)
+    parser.add_argument("--radius-km", type=float, default=40.0)
+    parser.add_argument("--brute-points", type=int, default=10_000, help="Точек для сверки полным перебором")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    lat_km, lon_km = 110.574, 111.320 * math.cos(math.radians(ORIGIN[0]))
+    points = [
+        (ORIGIN[0] + rng.uniform(-args.radius_km, args.radius_km) / lat_km,
+         ORIGIN[1] + rng.uniform(-args.radius_km, args.radius_km) / lon_km)
+        for _ in range(args.points)
+    ]
+
+    data = load_config(settings.DATA_DIR / ZONES_FILE)
+    if data is not None:
+        run("data", data, points, args.brute_points)
+    run("synthetic", synthetic_config(args.zones, args.vertices, rng), points, args.brute_points)
+
+
+if __name__ == "__main__":
+    main()
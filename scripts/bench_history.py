@@ -0,0 +1,160 @@
+"""
+Бенчмарк истории КП под нагрузкой: просмотр истории (/manager/history, /manager/history/{id})
+параллельно с созданием КП (/manager/pdf). Сначала фаза только просмотра, затем просмотр + создание;
+для каждого маршрута — пропускная способность и p50/p95/p99, для просмотра — во сколько раз выросла
+задержка. В режиме «в процессе» дополнительно меряется задержка цикла событий (насколько опаздывает
+таймер 5 мс) — её рост значит, что обработчики блокируют цикл.
+
+Клиенты и статистика — из scripts/loadtest.py. КП для просмотра берутся из БД (последние --ids),
+КП создаются с уникальными ключами идемпотентности и попадают в историю.
+
+Usage:
+    python scripts/bench_history.py --browsers 16 --creators 2 --duration 15
+    python scripts/bench_history.py --url http://127.0.0.1:8000
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+import uuid
+from pathlib import Path
+from urllib.parse import urlencode
+
+# Добавляем корень проекта в PYTHONPATH
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(BASE_DIR))
+
+from app import models
+from app.core import prices
+from app.core.calculator import calc, load_products, response_to_pdf_data
+from app.core.schemas import CalcRequest
+from app.db import SessionLocal
+from loadtest import HttpClient, InProcessClient, RouteStats, print_table
+
+
+def proposal_ids(limit: int) -> list[int]:
+    db = SessionLocal()
+    try:
+        rows = db.query(models.Proposal.id).order_by(models.Proposal.id.desc()).limit(limit).all()
+    finally:
+        db.close()
+    return [r[0] for r in rows]
+
+
+def pdf_form_data(items: int) -> str:
+    """data_json, как его отправляет превью менеджера: расчёт + снимок цен, сохранённый в БД."""
+    keys = sorted(load_products())
+    rnd = random.Random(1)
+    request = CalcRequest(items=[
+        {"product_key": rnd.choice(keys), "width_mm": rnd.randint(300, 1500), "height_mm": rnd.randint(300, 1500)}
+        for _ in range(items)
+    ])
+    snapshot = prices.current_snapshot()
+    db = SessionLocal()
+    try:
+        prices.ensure_stored(db, snapshot)
+    finally:
+        db.close()
+    data = response_to_pdf_data(calc(request, snapshot), request)
+    data["price_snapshot_id"] = snapshot.id
+    return json.dumps(data, ensure_ascii=False)
+
+
+async def browser(client, ids: list[int], stats: dict[str, RouteStats], deadline: float, rnd: random.Random):
+    while time.perf_counter() < deadline:
+        if rnd.random() < 0.25:
+            name, path = "list", "/manager/history"
+        else:
+            name, path = "view", f"/manager/history/{rnd.choice(ids)}"
+        await _timed(client, stats[name], "GET", path, b"", {})
+
+
+async def creator(client, data_json: str, stats: dict[str, RouteStats], deadline: float):
+    while time.perf_counter() < deadline:
+        body = urlencode({"data_json": data_json, "idempotency_key": uuid.uuid4().hex}).encode("utf-8")
+        await _timed(client, stats["create"], "POST", "/manager/pdf", body,
+                     {"content-type": "application/x-www-form-urlencoded"})
+
+
+async def _timed(client, st: RouteStats, method: str, path: str, body: bytes, headers: dict[str, str]) -> None:
+    t0 = time.perf_counter()
+    try:
+        status, size = await client.request(method, path, body, headers)
+    except Exception:
+        status, size = 0, 0
+    st.latencies.append(time.perf_counter() - t0)
+    st.bytes += size
+    if not 200 <= status < 400:
+        st.errors += 1
+
+
+async def loop_lag(stats: RouteStats, deadline: float, tick: float = 0.005) -> None:
+    """Опоздание таймера tick: сколько цикл событий был занят чем-то блокирующим."""
+    while time.perf_counter() < deadline:
+        t0 = time.perf_counter()
+        await asyncio.sleep(tick)
+        stats.latencies.append(max(0.0, time.perf_counter() - t0 - tick))
+
+
+async def run_phase(client, args, ids: list[int], data_json: str | None, measure_lag: bool):
+    stats = {name: RouteStats() for name in ("list", "view", "create", "loop_lag")}
+    deadline = time.perf_counter() + args.duration
+    rnd = random.Random(args.seed)
+    tasks = [browser(client, ids, stats, deadline, random.Random(rnd.random())) for _ in range(args.browsers)]
+    if data_json is not None:
+        tasks += [creator(client, data_json, stats, deadline) for _ in range(args.creators)]
+    if measure_lag:
+        tasks.append(loop_lag(stats["loop_lag"], deadline))
+    started = time.perf_counter()
+    await asyncio.gather(*tasks)
+    return {k: v for k, v in stats.items() if v.latencies}, time.perf_counter() - started
+
+
+async def main_async(args) -> None:
+    ids = proposal_ids(args.ids)
+    if not ids:
+        raise SystemExit("В БД нет КП для просмотра")
+    data_json = pdf_form_data(args.items)
+    if args.url:
+        client = HttpClient(args.url, args.browsers + args.creators)
+        target = args.url
+    else:
+        from app.main import app
+        client = InProcessClient(app)
+        target = "in-process app.main:app"
+    print(f"target={target} | browsers={args.browsers} | creators={args.creators} | КП для просмотра: {len(ids)}")
+    try:
+        base, elapsed = await run_phase(client, args, ids, None, not args.url)
+        print_table("Только просмотр истории", base, elapsed)
+        full, elapsed = await run_phase(client, args, ids, data_json, not args.url)
+        print_table("Просмотр + создание КП", full, elapsed)
+    finally:
+        await client.close()
+
+    print("\n== Рост задержки просмотра при создании КП")
+    print(f"{'route':<10} {'p50 x':>8} {'p95 x':>8} {'p99 x':>8}")
+    for name in ("list", "view", "loop_lag"):
+        if name in base and name in full:
+            ratios = [full[name].percentile(p) / base[name].percentile(p) if base[name].percentile(p) else 0.0
+                      for p in (50, 95, 99)]
+            print(f"{name:<10} {ratios[0]:>8.1f} {ratios[1]:>8.1f} {ratios[2]:>8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк просмотра истории КП параллельно с созданием КП")
+    parser.add_argument("--url", help="Адрес локального uvicorn (по умолчанию — приложение в этом процессе)")
+    parser.add_argument("--browsers", type=int, default=16, help="Параллельных клиентов, листающих историю")
+    parser.add_argument("--creators", type=int, default=2, help="Параллельных клиентов, создающих КП")
+    parser.add_argument("--duration", type=float, default=10.0, help="Длительность каждой фазы, с")
+    parser.add_argument("--ids", type=int, default=500, help="Сколько последних КП просматривать")
+    parser.add_argument("--items", type=int, default=5, help="Изделий в создаваемом КП")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
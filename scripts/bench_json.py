@@ -0,0 +1,113 @@
+"""
+Бенчмарк ответа /api/calculate на больших КП: прежний путь (CalcResponse с валидацией позиций
+→ jsonable_encoder → JSONResponse) против быстрого (лёгкие записи Position → core.fastjson).
+Для каждого размера КП проверяется, что байты ответа совпадают, и печатается время
+построения ответа и сериализации (медиана по --repeat прогонам).
+
+Usage:
+    python scripts/bench_json.py                      # 10, 100, 500 изделий
+    python scripts/bench_json.py --items 1000 --repeat 50
+"""
+
+import argparse
+import logging
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+# Добавляем корень проекта в PYTHONPATH
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(BASE_DIR))
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app.core import fastjson
+from app.core.calculator import calc_records, load_products
+from app.core.prices import current_snapshot
+from app.core.schemas import CalcPosition, CalcRequest, CalcResponse
+
+
+def make_request(n_items: int, rng: random.Random) -> CalcRequest:
+    products = load_products()
+    keys = [k for k in products]
+    drillable = current_snapshot().services["drill"]
+    items = []
+    for _ in range(n_items):
+        key = rng.choice(keys)
+        items.append({
+            "product_key": key,
+            "width_mm": rng.randint(200, 2700),
+            "height_mm": rng.randint(200, 1600),
+            "quantity": rng.randint(1, 5),
+            "options": {
+                "edge": rng.random() < 0.7,
+                "film": rng.random() < 0.4,
+                "drill": str(int(products[key]["thickness"])) in drillable and rng.random() < 0.4,
+                "drill_qty": rng.randint(1, 6),
+                "pack": rng.random() < 0.5,
+                "mount": rng.random() < 0.3,
+                "delivery_city": None,
+            },
+        })
+    return CalcRequest(items=items)
+
+
+def old_path(result) -> bytes:
+    """Как раньше: модели с валидацией на построении и jsonable_encoder + JSONResponse на выходе."""
+    response = CalcResponse(
+        positions=[CalcPosition(**p._asdict()) for p in result.positions],
+        total=result.total,
+        price_snapshot_id=result.price_snapshot_id,
+    )
+    return JSONResponse(content=jsonable_encoder(response)).body
+
+
+def new_path(result) -> bytes:
+    return fastjson.calc_result_json(result)
+
+
+def timed(fn, arg, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(arg)
+        samples.append(time.perf_counter() - t0)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк сериализации ответа калькулятора")
+    parser.add_argument("--items", default="10,100,500", help="Размеры КП через запятую")
+    parser.add_argument("--repeat", type=int, default=30)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    logging.getLogger("app").setLevel(logging.WARNING)
+    rng = random.Random(args.seed)
+    encoder = "orjson" if fastjson.orjson is not None else "json"
+    print(f"Кодировщик быстрого пути: {encoder}")
+    print(f"{'изделий':>8} {'позиций':>8} {'KiB':>8} {'было, мс':>10} {'стало, мс':>10} {'ускорение':>10}  байты")
+
+    for n in (int(x) for x in args.items.split(",")):
+        request = make_request(n, rng)
+        result = calc_records(request)
+        old_bytes, new_bytes = old_path(result), new_path(result)
+        same = "совпадают" if old_bytes == new_bytes else "РАЗЛИЧАЮТСЯ"
+        old_s = timed(old_path, result, args.repeat)
+        new_s = timed(new_path, result, args.repeat)
+        print(
+            f"{n:>8} {len(result.positions):>8} {len(new_bytes) / 1024:>8.1f} "
+            f"{old_s * 1000:>10.2f} {new_s * 1000:>10.2f} {old_s / new_s:>9.1f}x  {same}"
+        )
+        if old_bytes != new_bytes:
+            for i, (a, b) in enumerate(zip(old_bytes, new_bytes)):
+                if a != b:
+                    print(f"    первое отличие на байте {i}: {old_bytes[i - 40:i + 40]!r} / {new_bytes[i - 40:i + 40]!r}")
+                    break
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Бенчмарк раскроя (core.nesting): качество (листы относительно нижней границы, выход годного) против времени.
+Для каждого набора деталей — только первая стратегия, укладка в бюджете по умолчанию (NESTING_TIME_BUDGET_MS),
+бюджеты побольше и полный перебор стратегий (медиана времени по --repeat прогонам).
+
+Наборы: mixed — случайные размеры; repeated — несколько типовых размеров большими партиями (как в реальных КП);
+small — мелкие детали (фасады, полки).
+
+Usage:
+    python scripts/bench_nesting.py
+    python scripts/bench_nesting.py --pieces 1000,5000 --repeat 3
+"""
+
+import argparse
+import logging
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+# Добавляем корень проекта в PYTHONPATH
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(BASE_DIR))
+
+from app.config import settings
+from app.core.nesting import STRATEGIES, Piece, SheetSpec, nest_pieces
+
+
+def make_pieces(kind: str, n: int, rng: random.Random) -> list[Piece]:
+    if kind == "mixed":
+        return [Piece(i, rng.randint(150, 1800), rng.randint(150, 1200)) for i in range(n)]
+    if kind == "repeated":
+        sizes = [(rng.randint(300, 1500), rng.randint(300, 1100)) for _ in range(6)]
+        return [Piece(i, *sizes[rng.randrange(len(sizes))]) for i in range(n)]
+    return [Piece(i, rng.randint(100, 600), rng.randint(100, 400)) for i in range(n)]
+
+
+def run(pieces: list[Piece], spec: SheetSpec, budget_s: float, repeat: int):
+    times, result = [], None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = nest_pieces("bench", pieces, spec, budget_s)
+        times.append(time.perf_counter() - t0)
+    return result, statistics.median(times) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк раскроя на листы")
+    parser.add_argument("--pieces", default="100,1000,3000", help="Число деталей через запятую")
+    parser.add_argument("--kinds", default="mixed,repeated,small")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    logging.getLogger("app").setLevel(logging.WARNING)
+    rng = random.Random(args.seed)
+    spec = SheetSpec(width=3210, height=2250)
+    default_s = settings.NESTING_TIME_BUDGET_MS / 1000
+    modes = [("1 стратегия", 0.0), (f"бюджет {settings.NESTING_TIME_BUDGET_MS} мс", default_s),
+             ("бюджет 1 с", 1.0), (f"все {len(STRATEGIES)}", 1e9)]
+
+    print(f"Лист {spec.width:.0f}×{spec.height:.0f} мм, поворот разрешён")
+    print(f"{'набор':<9} {'деталей':>7} {'граница':>7}  {'режим':<16} {'листов':>6} {'выход %':>8} "
+          f"{'стратегий':>9} {'мс':>8}")
+    for kind in args.kinds.split(","):
+        for n in (int(x) for x in args.pieces.split(",")):
+            pieces = make_pieces(kind, n, rng)
+            for label, budget in modes:
+                result, ms = run(pieces, spec, budget, args.repeat if budget < 1 else 1)
+                print(
+                    f"{kind:<9} {n:>7} {result.lower_bound:>7}  {label:<16} {result.sheets:>6} "
+                    f"{result.yield_pct:>8.2f} {result.strategies_tried:>9} {ms:>8.1f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Бенчмарк шаблонов: холодный рендер в новом воркере без кэша байткода (как раньше — каждое окружение
+компилирует шаблоны из исходников), холодный рендер с кэшем байткода на диске (core.templates)
+и тёплый рендер (шаблон уже в памяти). Каждый холодный замер — в отдельном процессе.
+
+Usage:
+    python scripts/bench_templates.py
+    python scripts/bench_templates.py --repeat 10
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+# Добавляем корень проекта в PYTHONPATH
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(BASE_DIR))
+
+TEMPLATES = ("commercial_blue.html", "manager_form.html", "manager_preview.html",
+             "history_list.html", "history_view.html")
+
+# Выполняется в чистом подпроцессе: замер первой загрузки шаблона, первого и повторного рендера
+_PROBE = r"""
+import json, sys, time
+from datetime import datetime
+from types import SimpleNamespace
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, select_autoescape
+
+templates_dir, cache_dir, names = sys.argv[1], sys.argv[2], sys.argv[3].split(",")
+env = Environment(
+    loader=FileSystemLoader(templates_dir),
+    autoescape=select_autoescape(["html"]),
+    auto_reload=False,
+    bytecode_cache=FileSystemBytecodeCache(cache_dir) if cache_dir else None,
+)
+items = [
+    {"product_name": "Зеркало графит", "thickness": "4", "width": 1200.0 + i, "height": 800.0, "quantity": 2,
+     "services": ["Обработка кромки", "Упаковка в гофрокартон"], "item_total": 12300.0}
+    for i in range(30)
+]
+deliveries = [{"label": "Доставка (center)", "price": 1500.0}]
+prop = SimpleNamespace(id=1, proposal_number="КП_1", total=370500.0, created_at=datetime(2026, 1, 1),
+                       pdf_path="pdf/КП_1.pdf", status="draft")
+context = {
+    "request": None, "items": items, "deliveries": deliveries, "total": 370500.0, "data_json": "{}",
+    "proposal_number": "КП_1", "date": "01.01.2026", "company_info": {}, "logo": "", "works": [],
+    "delivery_terms": ["a"], "payment_terms": ["b"], "additional_terms": ["c"], "final_terms": ["d"],
+    "prop": prop, "pdf_filename": "КП_1.pdf",
+}
+history_items = [prop] * 200
+out = {}
+for name in names:
+    ctx = dict(context, items=history_items) if name == "history_list.html" else context
+    t0 = time.perf_counter()
+    tpl = env.get_template(name)
+    t1 = time.perf_counter()
+    tpl.render(ctx)
+    t2 = time.perf_counter()
+    warm = []
+    for _ in range(20):
+        t3 = time.perf_counter()
+        env.get_template(name).render(ctx)
+        warm.append(time.perf_counter() - t3)
+    warm.sort()
+    out[name] = {"load": t1 - t0, "first_render": t2 - t1, "warm": warm[len(warm) // 2]}
+print(json.dumps(out))
+"""
+
+
+def probe(templates_dir: Path, cache_dir: str) -> dict:
+    proc = subprocess.run(
+        [sys.executable, "-c", _PROBE, str(templates_dir), cache_dir, ",".join(TEMPLATES)],
+        capture_output=True, text=True, check=True,
+    )
+    return json.loads(proc.stdout)
+
+
+def median_of(runs: list[dict], name: str, field: str) -> float:
+    return statistics.median(r[name][field] for r in runs) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк холодного и тёплого рендера шаблонов")
+    parser.add_argument("--repeat", type=int, default=5, help="Процессов на каждый режим")
+    args = parser.parse_args()
+
+    from app.config import settings
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        probe(settings.TEMPLATES_DIR, cache_dir)  # заполняем кэш байткода, как первый воркер
+        no_cache = [probe(settings.TEMPLATES_DIR, "") for _ in range(args.repeat)]
+        bytecode = [probe(settings.TEMPLATES_DIR, cache_dir) for _ in range(args.repeat)]
+
+    print("Медианы, мс. Холодный = загрузка шаблона + первый рендер в новом процессе.")
+    print(f"{'шаблон':<22} {'без кэша':>10} {'байткод':>10} {'тёплый':>10}")
+    totals = [0.0, 0.0, 0.0]
+    for name in TEMPLATES:
+        cold_src = median_of(no_cache, name, "load") + median_of(no_cache, name, "first_render")
+        cold_bc = median_of(bytecode, name, "load") + median_of(bytecode, name, "first_render")
+        warm = median_of(bytecode, name, "warm")
+        totals = [totals[0] + cold_src, totals[1] + cold_bc, totals[2] + warm]
+        print(f"{name:<22} {cold_src:>10.2f} {cold_bc:>10.2f} {warm:>10.2f}")
+    print(f"{'всего':<22} {totals[0]:>10.2f} {totals[1]:>10.2f} {totals[2]:>10.2f}")
+    print("\nРаньше commercial_blue.html компилировался отдельно в окружении pdf_generator и в pdf_routes;")
+    print("теперь окружение одно, а при старте (precompile) шаблоны берутся из кэша байткода.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+"""
+Компиляция каталога: data/products.txt + prices_*.json → data/catalog.bin (mmap-формат, см. app/core/catalog_bin.py).
+После компиляции load_products() и цены в calc() читаются из бинарного файла, пока он не старше исходников.
+
+Usage:
+    python scripts/compile_catalog.py
+    python scripts/compile_catalog.py --data-dir path/to/data --out path/to/catalog.bin
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+# Добавляем корень проекта в PYTHONPATH
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(BASE_DIR))
+
+from app.config import settings
+from app.core.catalog_bin import BinaryCatalog, compile_data_dir
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Компиляция бинарного каталога")
+    parser.add_argument("--data-dir", type=Path, default=settings.DATA_DIR, help="Каталог с исходниками")
+    parser.add_argument("--out", type=Path, default=None, help="Выходной файл (по умолчанию DATA_DIR/catalog.bin)")
+    args = parser.parse_args()
+
+    out = args.out or args.data_dir / "catalog.bin"
+    t0 = time.perf_counter()
+    version = compile_data_dir(args.data_dir, out)
+    elapsed = time.perf_counter() - t0
+    catalog = BinaryCatalog(out)
+    print(f"Каталог скомпилирован: {out}")
+    print(f"версия={version} | товаров={len(catalog)} | размер={out.stat().st_size} байт | {elapsed:.3f} с")
+    catalog.close()
+
+
+if __name__ == "__main__":
+    main()
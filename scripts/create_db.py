@@ -5,12 +5,33 @@ from pathlib import Path
 BASE_DIR = Path(__file__).resolve().parent.parent
 sys.path.append(str(BASE_DIR))
 
+from sqlalchemy import inspect, text
+
 from app.db import engine, Base
 from app import models
 
+def add_missing_columns():
+    """create_all не меняет существующие таблицы: новые nullable-колонки добавляем через ALTER TABLE."""
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                col_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN "{column.name}" {col_type}'))
+                print(f"Added column {table.name}.{column.name}")
+                for index in table.indexes:
+                    if [c.name for c in index.columns] == [column.name]:
+                        index.create(conn, checkfirst=True)
+
 def create():
     Base.metadata.create_all(bind=engine)
+    add_missing_columns()
     print("DB created")
 
 if __name__ == "__main__":
-    create()
\ No newline at end of file
+    create()
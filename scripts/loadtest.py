@@ -0,0 +1,329 @@
+"""
+Нагрузочный тест приложения: /api/calculate, /manager/preview, /api/pdf, /manager/history.
+
+Два режима, оба полностью офлайн:
+- по умолчанию приложение app.main:app вызывается в этом же процессе напрямую через ASGI;
+- с --url запросы идут по HTTP на локально запущенный uvicorn.
+
+Сначала выполняется базовая фаза без PDF, затем полная смесь. Для каждого маршрута
+выводятся пропускная способность и p50/p95/p99, для «дешёвых» маршрутов — во сколько раз
+выросла задержка, когда параллельно идёт рендеринг PDF.
+
+Usage:
+    python scripts/loadtest.py --concurrency 16 --duration 20
+    python scripts/loadtest.py --url http://127.0.0.1:8000 --mix calculate=6,preview=3,pdf=1,history=2
+    python scripts/loadtest.py --items 1,30 --no-baseline
+
+PDF пишутся в settings.PDF_DIR — для отдельного каталога задайте переменную окружения PDF_DIR.
+"""
+
+import argparse
+import asyncio
+import http.client
+import json
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import urlencode, urlsplit
+
+# Добавляем корень проекта в PYTHONPATH
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(BASE_DIR))
+
+from app.config import settings
+from app.core.calculator import load_json, load_products
+
+# Маршруты: имя -> (метод, путь, тип тела)
+ROUTES = {
+    "calculate": ("POST", "/api/calculate", "json"),
+    "preview": ("POST", "/manager/preview", "form"),
+    "pdf": ("POST", "/api/pdf", "json"),
+    "history": ("GET", "/manager/history", None),
+}
+# Маршруты, которые не должны страдать от рендеринга PDF
+CHEAP_ROUTES = ("calculate", "preview", "history")
+DEFAULT_MIX = "calculate=6,preview=3,pdf=1,history=2"
+
+
+def parse_mix(text: str) -> dict[str, int]:
+    """Разбирает смесь вида calculate=6,pdf=1 в {маршрут: вес}."""
+    mix = {}
+    for part in text.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ROUTES:
+            raise SystemExit(f"Неизвестный маршрут в --mix: {name} (доступны: {', '.join(ROUTES)})")
+        mix[name] = int(weight or 1)
+    if not any(mix.values()):
+        raise SystemExit("Пустая смесь запросов")
+    return mix
+
+
+def parse_items_range(text: str) -> tuple[int, int]:
+    """Количество изделий в расчёте: "5" или диапазон "1,30"."""
+    lo, _, hi = text.partition(",")
+    lo_i = int(lo)
+    hi_i = int(hi) if hi else lo_i
+    return max(1, min(lo_i, hi_i)), max(lo_i, hi_i)
+
+
+class PayloadFactory:
+    """Случайные, но валидные запросы к калькулятору на основе текущего каталога."""
+
+    def __init__(self, items_range: tuple[int, int], seed: int | None = None):
+        self.rnd = random.Random(seed)
+        self.items_range = items_range
+        self.product_keys = sorted(load_products())
+        self.cities = sorted(load_json("prices_services.json").get("delivery", {}))
+
+    def items(self) -> list[dict]:
+        count = self.rnd.randint(*self.items_range)
+        city = self.rnd.choice(self.cities) if self.cities and self.rnd.random() < 0.5 else None
+        items = []
+        for _ in range(count):
+            drill = self.rnd.random() < 0.3
+            items.append({
+                "product_key": self.rnd.choice(self.product_keys),
+                "width_mm": self.rnd.randint(200, settings.MAX_WIDTH_MM),
+                "height_mm": self.rnd.randint(200, settings.MAX_HEIGHT_MM),
+                "quantity": self.rnd.randint(1, 5),
+                "options": {
+                    "edge": self.rnd.random() < 0.5,
+                    "film": self.rnd.random() < 0.3,
+                    "drill": drill,
+                    "drill_qty": self.rnd.randint(1, 6) if drill else 0,
+                    "pack": self.rnd.random() < 0.4,
+                    "delivery_city": city,
+                    "mount": self.rnd.random() < 0.2,
+                },
+            })
+        return items
+
+    def body(self, kind: str | None) -> tuple[bytes, dict[str, str]]:
+        if kind == "json":
+            return json.dumps({"items": self.items()}).encode("utf-8"), {"content-type": "application/json"}
+        if kind == "form":
+            data = urlencode({"data_json": json.dumps({"items": self.items()})}).encode("utf-8")
+            return data, {"content-type": "application/x-www-form-urlencoded"}
+        return b"", {}
+
+
+class InProcessClient:
+    """Вызывает ASGI-приложение напрямую, без сети: все запросы делят один event loop, как в воркере uvicorn."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def request(self, method: str, path: str, body: bytes, headers: dict[str, str]) -> tuple[int, int]:
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": method,
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode("ascii"),
+            "query_string": b"",
+            "root_path": "",
+            "headers": [(k.encode("latin-1"), v.encode("latin-1")) for k, v in headers.items()]
+            + [(b"host", b"loadtest"), (b"content-length", str(len(body)).encode("ascii"))],
+            "client": ("127.0.0.1", 50000),
+            "server": ("loadtest", 80),
+        }
+        sent = False
+        status = 0
+        size = 0
+
+        async def receive():
+            nonlocal sent
+            if not sent:
+                sent = True
+                # Отдаём управление циклу, как при чтении тела из сокета
+                await asyncio.sleep(0)
+                return {"type": "http.request", "body": body, "more_body": False}
+            # Тело уже отдано: дальше ждём «вечно», как ждёт сервер отключения клиента
+            await asyncio.sleep(3600)
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+
+        await self.app(scope, receive, send)
+        return status, size
+
+    async def close(self) -> None:
+        pass
+
+
+class HttpClient:
+    """Запросы к локальному uvicorn через http.client в пуле потоков (одно соединение на поток)."""
+
+    def __init__(self, base_url: str, concurrency: int):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname or "127.0.0.1"
+        self.port = parts.port or 80
+        self.prefix = parts.path.rstrip("/")
+        self.pool = ThreadPoolExecutor(max_workers=concurrency)
+        self._local = threading.local()
+
+    def _conn(self) -> http.client.HTTPConnection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = http.client.HTTPConnection(self.host, self.port, timeout=300)
+            self._local.conn = conn
+        return conn
+
+    def _do(self, method: str, path: str, body: bytes, headers: dict[str, str]) -> tuple[int, int]:
+        for attempt in range(2):
+            conn = self._conn()
+            try:
+                conn.request(method, self.prefix + path, body=body or None, headers=headers)
+                resp = conn.getresponse()
+                return resp.status, len(resp.read())
+            except (http.client.HTTPException, ConnectionError):
+                conn.close()
+                self._local.conn = None
+                if attempt:
+                    raise
+        return 0, 0
+
+    async def request(self, method: str, path: str, body: bytes, headers: dict[str, str]) -> tuple[int, int]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.pool, self._do, method, path, body, headers)
+
+    async def close(self) -> None:
+        self.pool.shutdown(wait=True)
+
+
+class RouteStats:
+    def __init__(self):
+        self.latencies: list[float] = []
+        self.errors = 0
+        self.bytes = 0
+
+    def percentile(self, p: float) -> float:
+        if not self.latencies:
+            return 0.0
+        data = sorted(self.latencies)
+        k = max(0, min(len(data) - 1, int(round(p / 100 * len(data) + 0.5)) - 1))
+        return data[k]
+
+
+async def run_phase(client, factory: PayloadFactory, mix: dict[str, int], concurrency: int,
+                    duration: float, max_requests: int | None) -> tuple[dict[str, RouteStats], float]:
+    """Гоняет concurrency виртуальных клиентов, пока не истечёт duration (или max_requests)."""
+    names = [n for n, w in mix.items() if w > 0]
+    weights = [mix[n] for n in names]
+    stats = {n: RouteStats() for n in names}
+    deadline = time.perf_counter() + duration
+    issued = 0
+
+    async def worker():
+        nonlocal issued
+        while time.perf_counter() < deadline:
+            if max_requests is not None:
+                if issued >= max_requests:
+                    return
+                issued += 1
+            name = factory.rnd.choices(names, weights)[0]
+            method, path, kind = ROUTES[name]
+            body, headers = factory.body(kind)
+            t0 = time.perf_counter()
+            try:
+                status, size = await client.request(method, path, body, headers)
+            except Exception:
+                status, size = 0, 0
+            st = stats[name]
+            st.latencies.append(time.perf_counter() - t0)
+            st.bytes += size
+            if not 200 <= status < 400:
+                st.errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return stats, time.perf_counter() - started
+
+
+def print_table(title: str, stats: dict[str, RouteStats], elapsed: float) -> None:
+    print(f"\n== {title} ({elapsed:.1f} s)")
+    print(f"{'route':<10} {'reqs':>7} {'err':>5} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'KiB/req':>8}")
+    for name, st in stats.items():
+        n = len(st.latencies)
+        print(
+            f"{name:<10} {n:>7} {st.errors:>5} {n / elapsed if elapsed else 0:>8.1f} "
+            f"{st.percentile(50) * 1000:>9.1f} {st.percentile(95) * 1000:>9.1f} {st.percentile(99) * 1000:>9.1f} "
+            f"{(st.bytes / n / 1024) if n else 0:>8.1f}"
+        )
+    total = sum(len(s.latencies) for s in stats.values())
+    print(f"{'total':<10} {total:>7} {sum(s.errors for s in stats.values()):>5} {total / elapsed if elapsed else 0:>8.1f}")
+
+
+def print_starvation(baseline: dict[str, RouteStats], full: dict[str, RouteStats]) -> None:
+    """Сравнивает дешёвые маршруты без PDF и с PDF: рост p50/p95 показывает голодание."""
+    rows = [n for n in CHEAP_ROUTES if n in baseline and n in full and baseline[n].latencies and full[n].latencies]
+    if not rows:
+        return
+    print("\n== Влияние рендеринга PDF на дешёвые маршруты")
+    print(f"{'route':<10} {'p50 x':>8} {'p95 x':>8} {'p99 x':>8}")
+    for name in rows:
+        ratios = []
+        for p in (50, 95, 99):
+            base = baseline[name].percentile(p)
+            ratios.append(full[name].percentile(p) / base if base else 0.0)
+        flag = "  <-- голодание" if ratios[1] >= 3 else ""
+        print(f"{name:<10} {ratios[0]:>8.1f} {ratios[1]:>8.1f} {ratios[2]:>8.1f}{flag}")
+
+
+async def main_async(args) -> None:
+    mix = parse_mix(args.mix)
+    factory = PayloadFactory(parse_items_range(args.items), seed=args.seed)
+
+    if args.url:
+        client = HttpClient(args.url, args.concurrency)
+        target = args.url
+    else:
+        from app.main import app
+        client = InProcessClient(app)
+        target = "in-process app.main:app"
+
+    print(f"target={target} | concurrency={args.concurrency} | items={args.items} | mix={mix}")
+    try:
+        baseline = None
+        cheap_mix = {n: w for n, w in mix.items() if n != "pdf"}
+        if not args.no_baseline and mix.get("pdf") and any(cheap_mix.values()):
+            baseline, elapsed = await run_phase(client, factory, cheap_mix, args.concurrency, args.duration, args.requests)
+            print_table("Базовая фаза (без PDF)", baseline, elapsed)
+        full, elapsed = await run_phase(client, factory, mix, args.concurrency, args.duration, args.requests)
+        print_table("Полная смесь", full, elapsed)
+        if baseline:
+            print_starvation(baseline, full)
+    finally:
+        await client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест AI Glass Calculator")
+    parser.add_argument("--url", help="Адрес локального uvicorn (по умолчанию — приложение в этом процессе)")
+    parser.add_argument("--concurrency", type=int, default=8, help="Число параллельных клиентов")
+    parser.add_argument("--duration", type=float, default=10.0, help="Длительность каждой фазы, с")
+    parser.add_argument("--requests", type=int, default=None, help="Ограничить число запросов в фазе")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Веса маршрутов (по умолчанию {DEFAULT_MIX})")
+    parser.add_argument("--items", default="1,10", help="Изделий в расчёте: N или диапазон MIN,MAX")
+    parser.add_argument("--seed", type=int, default=None, help="Seed генератора запросов")
+    parser.add_argument("--no-baseline", action="store_true", help="Не выполнять базовую фазу без PDF")
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
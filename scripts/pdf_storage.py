@@ -0,0 +1,48 @@
+"""
+Обслуживание хранилища PDF (app/core/storage.py).
+
+Usage:
+    python scripts/pdf_storage.py stats
+    python scripts/pdf_storage.py migrate            # плоские файлы из PDF_DIR → шарды + индекс
+    python scripts/pdf_storage.py archive [--days N] # старше N дней (по умолчанию PDF_RETENTION_DAYS) → zip-бандлы
+    python scripts/pdf_storage.py compact            # чистка бандлов от устаревших членов, удаление пустых каталогов
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+# Добавляем корень проекта в PYTHONPATH
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(BASE_DIR))
+
+from app.core import storage
+from app.db import SessionLocal
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Хранилище PDF: миграция, ретенция, компакция")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("stats", help="Статистика хранилища")
+    sub.add_parser("migrate", help="Перенести плоские PDF в шарды")
+    archive = sub.add_parser("archive", help="Архивировать старые PDF в бандлы")
+    archive.add_argument("--days", type=int, default=None, help="Возраст в днях (по умолчанию PDF_RETENTION_DAYS)")
+    sub.add_parser("compact", help="Компакция бандлов и каталогов")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        if args.command == "migrate":
+            print(f"Перенесено файлов: {storage.migrate_flat(db)}")
+        elif args.command == "archive":
+            print(f"Архивировано файлов: {storage.archive_older_than(db, args.days)}")
+        elif args.command == "compact":
+            print(json.dumps(storage.compact(db), ensure_ascii=False, indent=2))
+        print(json.dumps(storage.storage_stats(db), ensure_ascii=False, indent=2))
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Публикация данных каталога (core.data_version): проверка products.txt, prices_*.json, texts.json,
+company_info.json и атомарный переход всех воркеров на новую версию (штамп data/.data_version).
+
+Usage:
+    python scripts/publish_data.py                        # проверить и опубликовать правки прямо в data/
+    python scripts/publish_data.py --source data/staging  # взять файлы из каталога подготовки
+    python scripts/publish_data.py --check --source data/staging   # только проверка
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+# Добавляем корень проекта в PYTHONPATH
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(BASE_DIR))
+
+from app.config import settings
+from app.core import data_version
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Проверка и публикация данных каталога")
+    parser.add_argument("--source", type=Path, default=None, help="Каталог с новыми файлами (по умолчанию DATA_DIR)")
+    parser.add_argument("--check", action="store_true", help="Только проверить, не публиковать")
+    args = parser.parse_args()
+
+    source = args.source or settings.DATA_DIR
+    if args.check:
+        errors, warnings = data_version.validate(source)
+    else:
+        try:
+            version, warnings = data_version.publish(source)
+            errors = []
+        except data_version.PublishError as e:
+            errors, warnings = e.errors, []
+
+    for w in warnings:
+        print(f"предупреждение: {w}")
+    for e in errors:
+        print(f"ошибка: {e}")
+    if errors:
+        print(f"Данные не прошли проверку ({len(errors)} ошибок), версия не изменилась.")
+        sys.exit(1)
+    if args.check:
+        print(f"Проверка пройдена: {source}")
+    else:
+        print(f"Опубликована версия {version} (воркеры перейдут на неё в течение {settings.DATA_VERSION_CHECK_S} с)")
+
+
+if __name__ == "__main__":
+    main()
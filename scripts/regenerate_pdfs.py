@@ -0,0 +1,221 @@
+"""
+Перегенерация PDF сохранённых КП после правки шаблона commercial_blue.html, реквизитов или ассетов.
+
+КП читаются из БД пачками (по id), раздаются пулу процессов; каждый процесс один раз загружает шаблон
+и ассеты (app/core/regeneration.py), рендерит КП с исходными номером и датой и атомарно подменяет файл
+в хранилище (core.storage). Прогресс и скорость печатаются в stderr, состояние периодически пишется
+в checkpoint — прерванный запуск продолжается с --resume.
+
+Подтверждённые и отменённые КП (FINAL_STATUSES) не перегенерируются никогда: их PDF уже отправлены клиенту
+и отдаются как неизменяемые (Cache-Control immutable на год, web.http_cache) — браузер, скачавший файл,
+не перепроверит его и новый PDF не увидит. --status с финальным статусом — ошибка.
+
+Usage:
+    python scripts/regenerate_pdfs.py
+    python scripts/regenerate_pdfs.py --since 2025-01-01 --status draft --workers 8
+    python scripts/regenerate_pdfs.py --ids 15,16,42
+    python scripts/regenerate_pdfs.py --resume
+    python scripts/regenerate_pdfs.py --dry-run --manager Иванов
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Добавляем корень проекта в PYTHONPATH
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(BASE_DIR))
+
+from app import models
+from app.config import settings
+from app.core import regeneration, templates
+from app.db import SessionLocal
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Перегенерация PDF сохранённых КП")
+    parser.add_argument("--since", type=datetime.fromisoformat, help="Создано не раньше (YYYY-MM-DD)")
+    parser.add_argument("--until", type=datetime.fromisoformat, help="Создано не позже (YYYY-MM-DD, включительно)")
+    parser.add_argument("--status", action="append",
+                        help="Статус КП (можно несколько раз; confirmed/cancelled не перегенерируются)")
+    parser.add_argument("--manager", help="Только КП менеджера")
+    parser.add_argument("--ids", help="id КП через запятую")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--chunk", type=int, default=50, help="КП в одной пачке")
+    parser.add_argument("--checkpoint", type=Path, default=settings.DATA_DIR / "regenerate.checkpoint.json")
+    parser.add_argument("--resume", action="store_true", help="Продолжить с checkpoint")
+    parser.add_argument("--dry-run", action="store_true", help="Только посчитать КП под фильтр")
+    args = parser.parse_args()
+    final = sorted(set(args.status or ()) & set(models.FINAL_STATUSES))
+    if final:
+        parser.error(f"КП со статусом {', '.join(final)} не перегенерируются: их PDF клиенты кэшируют "
+                     f"как неизменяемые, уже скачанные копии не обновятся")
+    return args
+
+
+def filters_of(args) -> dict:
+    """Фильтры в виде, который сохраняется в checkpoint (продолжать можно только с теми же)."""
+    return {
+        "since": args.since.isoformat() if args.since else None,
+        "until": args.until.isoformat() if args.until else None,
+        "status": sorted(args.status) if args.status else None,
+        "manager": args.manager,
+        "ids": sorted(int(x) for x in args.ids.split(",") if x.strip()) if args.ids else None,
+    }
+
+
+def filtered_query(db, filters: dict, *columns):
+    P = models.Proposal
+    q = db.query(*columns).filter(P.pdf_path.isnot(None), P.pdf_path != "")
+    if filters["since"]:
+        q = q.filter(P.created_at >= datetime.fromisoformat(filters["since"]))
+    if filters["until"]:
+        until = datetime.fromisoformat(filters["until"])
+        if until.time() == datetime.min.time():
+            until += timedelta(days=1)      # дата без времени — весь день включительно
+        q = q.filter(P.created_at < until)
+    # Финальные КП отдаются как immutable — их файл не меняем ни при каких фильтрах
+    q = q.filter(P.status.notin_(models.FINAL_STATUSES))
+    if filters["status"]:
+        q = q.filter(P.status.in_(filters["status"]))
+    if filters["manager"]:
+        q = q.filter(P.manager == filters["manager"])
+    if filters["ids"]:
+        q = q.filter(P.id.in_(filters["ids"]))
+    return q
+
+
+def iter_chunks(filters: dict, after_id: int, chunk: int):
+    """Пачки строк для regeneration.render_rows по возрастанию id — без OFFSET, по ключу."""
+    P = models.Proposal
+    db = SessionLocal()
+    try:
+        last = after_id
+        while True:
+            rows = (
+                filtered_query(db, filters, P.id, P.proposal_number, P.created_at, P.total, P.pdf_path,
+                               P.items_json, P.deliveries_json, P.waste_json)
+                .filter(P.id > last)
+                .order_by(P.id)
+                .limit(chunk)
+                .all()
+            )
+            if not rows:
+                return
+            last = rows[-1][0]
+            yield [tuple(r) for r in rows]
+    finally:
+        db.close()
+
+
+def count_remaining(filters: dict, after_id: int) -> int:
+    db = SessionLocal()
+    try:
+        return filtered_query(db, filters, models.Proposal.id).filter(models.Proposal.id > after_id).count()
+    finally:
+        db.close()
+
+
+def save_checkpoint(path: Path, state: dict) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def main():
+    args = parse_args()
+    filters = filters_of(args)
+    state = {"filters": filters, "last_id": 0, "done": 0, "bytes": 0, "failed": []}
+    if args.resume and args.checkpoint.exists():
+        with open(args.checkpoint, encoding="utf-8") as f:
+            saved = json.load(f)
+        if saved.get("filters") != filters:
+            raise SystemExit("Checkpoint сделан с другими фильтрами — запустите без --resume")
+        state = saved
+        print(f"Продолжение с id > {state['last_id']} ({state['done']} PDF уже перегенерировано)", file=sys.stderr)
+
+    total = count_remaining(filters, state["last_id"])
+    print(f"КП к перегенерации: {total} | воркеров: {args.workers}", file=sys.stderr)
+    if args.dry_run or not total:
+        return
+
+    # Байткод шаблонов — в общем кэше на диске: воркеры читают готовый код, а не компилируют каждый сам
+    templates.precompile()
+    started = time.perf_counter()
+    done = failed = 0
+    last_print = last_save = 0.0
+
+    # Пачки завершаются в произвольном порядке; в checkpoint попадает только непрерывный префикс,
+    # поэтому после прерывания продолжение начинается с первой незавершённой пачки.
+    pending = {}        # future -> (seq, last_id_in_chunk)
+    finished = {}       # seq -> (last_id_in_chunk, result)
+    next_commit = 0
+    seq = 0
+    chunks = iter_chunks(filters, state["last_id"], args.chunk)
+    exhausted = False
+
+    pool = ProcessPoolExecutor(max_workers=args.workers, initializer=regeneration.init_worker)
+    try:
+        while True:
+            # Ограниченное число пачек «в полёте» — память не растёт на больших таблицах
+            while not exhausted and len(pending) < args.workers * 2:
+                rows = next(chunks, None)
+                if rows is None:
+                    exhausted = True
+                    break
+                pending[pool.submit(regeneration.render_rows, rows)] = (seq, rows[-1][0])
+                seq += 1
+            if not pending:
+                break
+            completed, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in completed:
+                s, last_id = pending.pop(fut)
+                result = fut.result()
+                finished[s] = (last_id, result)
+                done += result["done"]
+                failed += len(result["errors"])
+            while next_commit in finished:
+                last_id, result = finished.pop(next_commit)
+                state["last_id"] = last_id
+                state["done"] += result["done"]
+                state["bytes"] += result["bytes"]
+                state["failed"].extend(proposal_id for proposal_id, _ in result["errors"])
+                next_commit += 1
+
+            now = time.perf_counter()
+            if now - last_print >= 1.0 or not pending:
+                rate = (done + failed) / (now - started) if now > started else 0.0
+                eta = (total - done - failed) / rate if rate else 0.0
+                print(f"\r{done + failed}/{total} КП | ошибок {failed} | {rate:,.1f} PDF/с | "
+                      f"осталось ~{eta:,.0f} с   ", end="", file=sys.stderr)
+                last_print = now
+            if now - last_save >= 5.0:
+                save_checkpoint(args.checkpoint, state)
+                last_save = now
+    except KeyboardInterrupt:
+        # Очередь пачек сбрасывается, в checkpoint — завершённый префикс: --resume начнёт с первой недоделанной
+        pool.shutdown(wait=False, cancel_futures=True)
+        save_checkpoint(args.checkpoint, state)
+        print(f"\nПрервано: checkpoint сохранён (id > {state['last_id']}), продолжение — --resume", file=sys.stderr)
+        sys.exit(130)
+    pool.shutdown()
+
+    save_checkpoint(args.checkpoint, state)
+    elapsed = time.perf_counter() - started
+    print(f"\nГотово: {done} PDF за {elapsed:.1f} с ({done / elapsed if elapsed else 0:,.1f} PDF/с, "
+          f"{state['bytes'] / 1024 / 1024:,.1f} МБ всего)", file=sys.stderr)
+    if state["failed"]:
+        ids = ",".join(str(i) for i in state["failed"][:20])
+        print(f"Ошибки рендера: {len(state['failed'])} КП (подробности в логе), "
+              f"повтор: --ids {ids}{',…' if len(state['failed']) > 20 else ''}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
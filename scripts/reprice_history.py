@@ -0,0 +1,212 @@
+"""
+Массовый пересчёт истории КП по кандидатному прайсу («what-if»): разница выручки по товарам и зонам.
+
+КП читаются из БД пачками (по id), раздаются пулу процессов, каждый процесс пересчитывает пачку
+через calc() по кандидатному снимку цен (app/core/repricing.py). Прогресс и скорость печатаются
+в stderr, состояние периодически пишется в checkpoint — прерванный запуск продолжается с --resume.
+
+Usage:
+    python scripts/reprice_history.py --candidate-dir path/to/new_prices
+    python scripts/reprice_history.py --snapshot 870204aa... --workers 8 --chunk 500
+    python scripts/reprice_history.py --candidate-dir new_prices --resume
+
+--candidate-dir — каталог с prices_materials.json, prices_services.json и delivery_zones.json
+(отсутствующий файл берётся из data/).
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+
+# Добавляем корень проекта в PYTHONPATH
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(BASE_DIR))
+
+from app import models
+from app.config import settings
+from app.core import prices, repricing
+from app.core.calculator import load_json
+from app.core.delivery_zones import ZONES_FILE, ZoneIndex, load_config
+from app.db import SessionLocal
+
+
+def load_candidate(args) -> prices.PriceSnapshot:
+    if args.snapshot:
+        db = SessionLocal()
+        try:
+            snapshot = prices.get_snapshot(db, args.snapshot)
+        finally:
+            db.close()
+        if snapshot is None:
+            raise SystemExit(f"Снимок цен не найден: {args.snapshot}")
+        return snapshot
+    src = Path(args.candidate_dir)
+
+    def read(name: str) -> dict:
+        path = src / name
+        if path.exists():
+            with open(path, encoding="utf-8") as f:
+                return json.load(f)
+        return load_json(name)
+
+    return prices.PriceSnapshot(read("prices_materials.json"), read("prices_services.json"))
+
+
+def load_candidate_zones(args, candidate: prices.PriceSnapshot) -> dict | None:
+    """Кандидатные зоны доставки из --candidate-dir; None — зоны из data/ (как у рабочего калькулятора)."""
+    if not args.candidate_dir:
+        return None
+    zones = load_config(Path(args.candidate_dir) / ZONES_FILE)
+    if zones is not None:
+        try:
+            index = ZoneIndex(zones)
+        except (ValueError, TypeError, AttributeError) as e:
+            raise SystemExit(f"{ZONES_FILE}: {e}")
+        missing = sorted(index.zone_keys() - set(candidate.services["delivery"]))
+        if missing:
+            raise SystemExit(f"{ZONES_FILE}: нет цены доставки для зон {', '.join(missing)}")
+    return zones
+
+
+def iter_chunks(after_id: int, chunk: int):
+    """Пачки строк (id, items_json, deliveries_json, total, waste_json) по возрастанию id — без OFFSET, по ключу."""
+    db = SessionLocal()
+    try:
+        last = after_id
+        while True:
+            rows = (
+                db.query(models.Proposal.id, models.Proposal.items_json,
+                         models.Proposal.deliveries_json, models.Proposal.total, models.Proposal.waste_json)
+                .filter(models.Proposal.id > last)
+                .order_by(models.Proposal.id)
+                .limit(chunk)
+                .all()
+            )
+            if not rows:
+                return
+            last = rows[-1][0]
+            yield [tuple(r) for r in rows]
+    finally:
+        db.close()
+
+
+def count_remaining(after_id: int) -> int:
+    db = SessionLocal()
+    try:
+        return db.query(models.Proposal.id).filter(models.Proposal.id > after_id).count()
+    finally:
+        db.close()
+
+
+def save_checkpoint(path: Path, state: dict) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="What-if пересчёт истории КП по кандидатному прайсу")
+    src = parser.add_mutually_exclusive_group(required=True)
+    src.add_argument("--candidate-dir", help="Каталог с кандидатными prices_*.json")
+    src.add_argument("--snapshot", help="id сохранённого снимка цен")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--chunk", type=int, default=500, help="КП в одной пачке")
+    parser.add_argument("--checkpoint", type=Path, default=settings.DATA_DIR / "reprice.checkpoint.json")
+    parser.add_argument("--report", type=Path, default=settings.DATA_DIR / "reprice_report.json")
+    parser.add_argument("--resume", action="store_true", help="Продолжить с checkpoint")
+    args = parser.parse_args()
+
+    candidate = load_candidate(args)
+    zones = load_candidate_zones(args, candidate)
+    zones_hash = (hashlib.sha256(json.dumps(zones, sort_keys=True).encode("utf-8")).hexdigest()
+                  if zones is not None else None)
+    state = {"candidate_snapshot_id": candidate.id, "candidate_zones_hash": zones_hash, "last_id": 0,
+             "aggregate": repricing.empty_aggregate()}
+    if args.resume and args.checkpoint.exists():
+        with open(args.checkpoint, encoding="utf-8") as f:
+            saved = json.load(f)
+        if saved.get("candidate_snapshot_id") != candidate.id or saved.get("candidate_zones_hash") != zones_hash:
+            raise SystemExit("Checkpoint сделан для другого прайса или зон доставки — запустите без --resume")
+        state = saved
+        print(f"Продолжение с id > {state['last_id']} ({state['aggregate']['proposals']} КП уже учтено)", file=sys.stderr)
+
+    total = count_remaining(state["last_id"])
+    print(f"Кандидатный снимок {candidate.id} | КП к пересчёту: {total} | воркеров: {args.workers}", file=sys.stderr)
+
+    materials, services = candidate.as_dicts()
+    started = time.perf_counter()
+    done = 0
+    last_print = last_save = 0.0
+
+    # Пачки завершаются в произвольном порядке; в checkpoint попадает только непрерывный префикс,
+    # поэтому после прерывания ни одна КП не будет учтена дважды или пропущена.
+    pending = {}        # future -> (seq, last_id_in_chunk, rows_count)
+    finished = {}       # seq -> (last_id_in_chunk, aggregate)
+    next_commit = 0
+    seq = 0
+    chunks = iter_chunks(state["last_id"], args.chunk)
+    exhausted = False
+
+    with ProcessPoolExecutor(
+        max_workers=args.workers,
+        initializer=repricing.init_worker,
+        initargs=(materials, services, zones),
+    ) as pool:
+        while True:
+            # Ограниченное число пачек «в полёте» — память не растёт на больших таблицах
+            while not exhausted and len(pending) < args.workers * 2:
+                rows = next(chunks, None)
+                if rows is None:
+                    exhausted = True
+                    break
+                pending[pool.submit(repricing.reprice_rows, rows)] = (seq, rows[-1][0], len(rows))
+                seq += 1
+            if not pending:
+                break
+            completed, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in completed:
+                s, last_id, n = pending.pop(fut)
+                finished[s] = (last_id, fut.result())
+                done += n
+            while next_commit in finished:
+                last_id, agg = finished.pop(next_commit)
+                repricing.merge_aggregates(state["aggregate"], agg)
+                state["last_id"] = last_id
+                next_commit += 1
+
+            now = time.perf_counter()
+            if now - last_print >= 1.0 or not pending:
+                rate = done / (now - started) if now > started else 0.0
+                eta = (total - done) / rate if rate else 0.0
+                print(f"\r{done}/{total} КП | {rate:,.0f} КП/с | осталось ~{eta:,.0f} с   ", end="", file=sys.stderr)
+                last_print = now
+            if now - last_save >= 5.0:
+                save_checkpoint(args.checkpoint, state)
+                last_save = now
+
+    save_checkpoint(args.checkpoint, state)
+    elapsed = time.perf_counter() - started
+    print(f"\nГотово: {done} КП за {elapsed:.1f} с ({done / elapsed if elapsed else 0:,.0f} КП/с)", file=sys.stderr)
+
+    report = repricing.format_report(state["aggregate"], candidate.id)
+    with open(args.report, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    print(f"Отчёт: {args.report}")
+    print(f"Итого: {report['old_total']:,.2f} → {report['new_total']:,.2f} (Δ {report['delta']:+,.2f})")
+    print(f"Пересчитано {report['repriced']}, приблизительно {report['approximate']}, пропущено {report['skipped']}")
+    for section, title in (("by_product", "Товары"), ("by_zone", "Зоны")):
+        print(f"\n{title} (топ-10 по |Δ|):")
+        for r in report[section][:10]:
+            pct = f"{r['delta_pct']:+.1f}%" if r["delta_pct"] is not None else "—"
+            print(f"  {r['key']:<30} {r['count']:>7} {r['old']:>14,.2f} → {r['new']:>14,.2f}  Δ {r['delta']:+,.2f} ({pct})")
+
+
+if __name__ == "__main__":
+    main()